@@ -4,18 +4,41 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
-from plotly.subplots import make_subplots
+import json
+import os
 import warnings
+import alerts
+import analyses
+import charts
+import dataset_store
+import debt
+import embed
+import extracts
+import geo
+import incremental
+import memprof
+import ofgl_data
+import peers
+import scenarios
+import sections
+import similarity
+import tables
 warnings.filterwarnings('ignore')
 
+# Mode intégration (?section=kpis|capacite|epci) : une seule section, rendue sans le reste de la page
+embed_section = embed.requested(st.query_params)
+
 # Configuration de la page
 st.set_page_config(
     page_title="Dashboard Financier Communal - La Réunion",
     page_icon="📊",
     layout="wide",
-    initial_sidebar_state="expanded"
+    initial_sidebar_state="collapsed" if embed_section else "expanded"
 )
 
+# Profilage mémoire optionnel (OFGL_MEMPROF=1, réservé à l'exploitant)
+memory = memprof.MemoryProfiler(memprof.is_enabled())
+
 # CSS personnalisé
 st.markdown("""
 <style>
@@ -94,121 +117,103 @@ def format_population(value):
     return f"{value:,.0f}"
 
 # Titre principal
-st.markdown('<h1 class="main-header">📊 Dashboard Financier des Communes de La Réunion</h1>', unsafe_allow_html=True)
-st.markdown("***Analyse budgétaire 2017 - Données OFGL***")
+if not embed_section:
+    st.markdown('<h1 class="main-header">📊 Dashboard Financier des Communes de La Réunion</h1>', unsafe_allow_html=True)
+    st.markdown("***Analyse budgétaire 2017 - Données OFGL***")
+
+def search_select(label, index, key):
+    """
+    Sélecteur piloté par une recherche : seules les entités trouvées (et la sélection
+    en cours) sont proposées au navigateur. Une sélection vide signifie « tous ».
+    """
+    query = st.text_input(f"Rechercher : {label}", key=f"{key}_recherche", placeholder="Nom ou code")
+    selection = st.session_state.get(key, [])
+    options = list(dict.fromkeys(selection + index.search(query)))
+    return st.multiselect(
+        f"{label} ({len(index):,})",
+        options=options,
+        key=key,
+        placeholder="Tous",
+        help="Sélection vide : aucun filtre"
+    )
+
+
+# Jeu de données versionné : le fichier source est surveillé, chaque nouvelle version
+# (et ses index dérivés) est reconstruite en arrière-plan puis publiée atomiquement.
+# En mode partagé, un seul fichier Arrow est mappé en mémoire par tous les processus serveur.
+@st.cache_resource
+def get_dataset_store(arrow_path):
+    return dataset_store.DatasetStore(arrow_path=arrow_path).start()
+
+
+def optional_index(name, description):
+    """
+    Index facultatif de la version affichée (extraits, pairs, carte...) : None si sa
+    construction a échoué, avec un avertissement ; le reste de l'onglet s'affiche sans lui
+    """
+    index = dataset.optional(name)
+    if name in dataset.errors:
+        st.warning(f"{description} : indisponible pour cette version des données ({dataset.errors[name]})")
+    return index
 
-# Fonction pour charger et nettoyer les données
-@st.cache_data
-def load_data():
-    try:
-        df = pd.read_csv('ofgl-base-communes.csv', sep=';', low_memory=False, encoding='utf-8')
-    except:
-        # Essayer d'autres encodages
-        try:
-            df = pd.read_csv('ofgl-base-communes.csv', sep=';', low_memory=False, encoding='latin-1')
-        except:
-            st.error("Impossible de lire le fichier CSV. Vérifiez le format et l'encodage.")
-            return pd.DataFrame()
-    
-    # Nettoyage des colonnes
-    df.columns = df.columns.str.strip()
-    
-    # Standardisation des noms de colonnes
-    column_mapping = {
-        'Exercice': 'Exercice',
-        'Outre-mer': 'Outre_mer',
-        'Code Insee 2024 Région': 'Code_Region',
-        'Nom 2024 Région': 'Nom_Region',
-        'Code Insee 2024 Département': 'Code_Departement',
-        'Nom 2024 Département': 'Nom_Departement',
-        'Code Siren 2024 EPCI': 'Code_EPCI',
-        'Nom 2024 EPCI': 'Nom_EPCI',
-        'Strate population 2024': 'Strate_population',
-        'Commune rurale': 'Commune_rurale',
-        'Commune de montagne': 'Commune_montagne',
-        'Commune touristique': 'Commune_touristique',
-        'Tranche revenu par habitant': 'Tranche_revenu',
-        'Présence QPV': 'Presence_QPV',
-        'Code Insee 2024 Commune': 'Code_Commune',
-        'Nom 2024 Commune': 'Commune',
-        'Catégorie': 'Categorie',
-        'Code Siren Collectivité': 'Code_Siren_Collectivite',
-        'Code Insee Collectivité': 'Code_Insee_Collectivite',
-        'Siret Budget': 'Siret_Budget',
-        'Libellé Budget': 'Libelle_Budget',
-        'Type de budget': 'Type_budget',
-        'Nomenclature': 'Nomenclature',
-        'Agrégat': 'Agregat',
-        'Montant': 'Montant',
-        'Montant en millions': 'Montant_millions',
-        'Population totale': 'Population',
-        'Montant en € par habitant': 'Montant_par_habitant',
-        'Compte 2024 Disponible': 'Compte_disponible',
-        'code_type_budget': 'code_type_budget',
-        'ordre_analyse1_section1': 'ordre_analyse1_section1',
-        'Population totale du dernier exercice': 'Population_dernier_exercice'
-    }
-    
-    # Renommer les colonnes existantes
-    existing_columns = {}
-    for old_name, new_name in column_mapping.items():
-        if old_name in df.columns:
-            existing_columns[old_name] = new_name
-    
-    df = df.rename(columns=existing_columns)
-    
-    # Conversion des colonnes numériques avec gestion des erreurs
-    numeric_cols = ['Montant', 'Montant_millions', 'Population', 
-                    'Montant_par_habitant', 'Population_dernier_exercice',
-                    'Strate_population', 'Tranche_revenu']
-    
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Nettoyage des colonnes texte
-    text_cols = ['Commune_rurale', 'Commune_montagne', 'Commune_touristique', 'Presence_QPV']
-    for col in text_cols:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip().str.upper()
-    
-    # Filtre pour La Réunion
-    if 'Code_Departement' in df.columns:
-        df = df[df['Code_Departement'] == 974]
-    
-    return df
+
+# Pool de threads partagé par les sessions pour les calculs des sections (OFGL_SECTION_WORKERS)
+@st.cache_resource
+def get_section_executor():
+    return sections.executor_from_env()
 
 # Chargement des données
-df = load_data()
+arrow_path = os.environ.get(ofgl_data.ARROW_ENV_VAR)
+try:
+    store = get_dataset_store(arrow_path)
+    dataset = store.current
+    df = dataset.df
+except Exception:
+    st.error("Impossible de lire le fichier CSV. Vérifiez le format et l'encodage.")
+    store, dataset = None, None
+    df = pd.DataFrame()
 
 if df.empty:
     st.error("Aucune donnée chargée. Vérifiez votre fichier CSV.")
     st.stop()
 
+# Mode intégration : calcul et figure de la seule section demandée, puis fin du script
+if embed_section:
+    embed.render(dataset, embed_section, st.query_params)
+    st.stop()
+
+# Périmètre budgétaire : budget principal seul, ou tous les budgets de chaque commune additionnés.
+# La vue consolidée et ses index sont construits au chargement : changer de périmètre ne fait que
+# choisir l'un des deux jeux.
+PERIMETRE_PRINCIPAL = "Budget principal"
+PERIMETRE_CONSOLIDE = "Consolidé (tous budgets)"
+
+with st.sidebar:
+    perimetre = st.radio("Périmètre budgétaire", [PERIMETRE_PRINCIPAL, PERIMETRE_CONSOLIDE],
+                         key='perimetre', horizontal=True)
+    if perimetre == PERIMETRE_CONSOLIDE:
+        budget_index = dataset.derived('budgets')
+        st.caption(f"{len(budget_index.table)} budgets (principaux et annexes) de {len(budget_index)} communes additionnés")
+        dataset = dataset.derived('consolidated')
+        df = dataset.df
+
+data_cube = dataset.derived('cube')
+memory.checkpoint("Chargement")
+
 # Sidebar - Filtres
 with st.sidebar:
     st.markdown("## 🔧 Filtres")
     
     # Filtre par EPCI
     if 'Nom_EPCI' in df.columns:
-        epci_list = df['Nom_EPCI'].dropna().unique().tolist()
-        selected_epci = st.multiselect(
-            "EPCI (Intercommunalités)",
-            options=epci_list,
-            default=epci_list
-        )
+        selected_epci = search_select("EPCI (Intercommunalités)", dataset.derived('search_epci'), 'filtre_epci')
     else:
         selected_epci = []
         st.warning("Colonne 'Nom_EPCI' non trouvée")
     
     # Filtre par commune
     if 'Commune' in df.columns:
-        commune_list = sorted(df['Commune'].dropna().unique().tolist())
-        selected_communes = st.multiselect(
-            "Communes (24 communes)",
-            options=commune_list,
-            default=commune_list
-        )
+        selected_communes = search_select("Communes", dataset.derived('search_communes'), 'filtre_communes')
     else:
         selected_communes = []
     
@@ -242,36 +247,49 @@ with st.sidebar:
             st.write(f"**Nombre de communes :** {df['Commune'].nunique()}")
         if 'Agregat' in df.columns:
             st.write(f"**Indicateurs disponibles :** {', '.join(df['Agregat'].unique()[:5])}...")
+        st.caption(f"Version du fichier source : {dataset.version or 'inconnue'}")
+        if dataset.errors:
+            st.warning(f"Index non disponibles pour cette version : {', '.join(dataset.errors)}")
+        elif store.last_error is not None:
+            st.warning(f"Le rechargement du fichier a échoué, la version précédente reste affichée : {store.last_error}")
 
 # Application des filtres
-filtered_df = df.copy()
-
-if selected_epci:
-    filtered_df = filtered_df[filtered_df['Nom_EPCI'].isin(selected_epci)]
-
-if selected_communes:
-    filtered_df = filtered_df[filtered_df['Commune'].isin(selected_communes)]
-
-if selected_budget_types:
-    filtered_df = filtered_df[filtered_df['Type_budget'].isin(selected_budget_types)]
+filters = dict(
+    epci=selected_epci,
+    communes=selected_communes,
+    budget_types=selected_budget_types,
+    agregats=selected_agregats
+)
+filtered_df = analyses.apply_filters(df, **filters)
 
-if selected_agregats:
-    filtered_df = filtered_df[filtered_df['Agregat'].isin(selected_agregats)]
+# Totaux de la sélection, mis à jour par différence avec la sélection précédente de la session
+selection_totals = incremental.session_totals(st.session_state, dataset.derived('partials'),
+                                                key=f'totaux_incrementaux_{perimetre}')
+memory.checkpoint("Sidebar et filtres")
 
 # Section 1: KPI Principaux
 st.markdown('<h2 class="sub-header">📈 Vue d\'ensemble - Santé Financière</h2>', unsafe_allow_html=True)
 
 # Calcul des KPI avec vérifications
 try:
-    df_principal = filtered_df[filtered_df['Type_budget'] == 'Budget principal']
+    df_principal = analyses.budget_principal(filtered_df)
+    
+    # Calculs des sections : soumis au pool dès maintenant en mode parallèle, le rendu
+    # ci-dessous ne fait que récupérer les résultats
+    section_results = sections.SectionResults(
+        sections.SectionContext(dataset, filters, filtered_df, df_principal, selection_totals),
+        get_section_executor()
+    )
     
     if not df_principal.empty:
+        kpis = section_results['kpis']['kpis']
+        
         # KPI en colonnes
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            if 'Agregat' in df_principal.columns and 'Montant' in df_principal.columns:
-                total_epargne = df_principal[df_principal['Agregat'] == 'Epargne brute']['Montant'].sum() / 1_000_000
+            if 'epargne_brute' in kpis:
+                total_epargne = kpis['epargne_brute'] / 1_000_000
                 st.markdown(f"""
                 <div class="kpi-card">
                     <div class="kpi-value">{total_epargne:.1f} M€</div>
@@ -287,8 +305,8 @@ try:
                 """, unsafe_allow_html=True)
         
         with col2:
-            if 'Commune' in df_principal.columns:
-                communes_count = df_principal['Commune'].nunique()
+            if 'communes' in kpis:
+                communes_count = kpis['communes']
                 st.markdown(f"""
                 <div class="kpi-card">
                     <div class="kpi-value">{communes_count}</div>
@@ -297,8 +315,8 @@ try:
                 """, unsafe_allow_html=True)
         
         with col3:
-            if 'Population' in df_principal.columns:
-                total_population = df_principal['Population'].sum()
+            if 'population' in kpis:
+                total_population = kpis['population']
                 st.markdown(f"""
                 <div class="kpi-card">
                     <div class="kpi-value">{total_population:,.0f}</div>
@@ -307,28 +325,50 @@ try:
                 """, unsafe_allow_html=True)
         
         with col4:
-            if 'Agregat' in df_principal.columns and 'Montant' in df_principal.columns:
-                df_recettes = df_principal[df_principal['Agregat'] == 'Recettes totales hors emprunts']
-                total_recettes = df_recettes['Montant'].sum() / 1_000_000 if not df_recettes.empty else 0
+            if 'recettes' in kpis:
+                total_recettes = kpis['recettes'] / 1_000_000
                 st.markdown(f"""
                 <div class="kpi-card">
                     <div class="kpi-value">{total_recettes:.1f} M€</div>
                     <div class="kpi-label">Recettes totales</div>
                 </div>
                 """, unsafe_allow_html=True)
+
+        # Évolution du dernier exercice par rapport au précédent (si plusieurs exercices)
+        evolution = section_results['kpis']['evolution']
+        if not evolution.empty:
+            dernier = evolution['Exercice'].iloc[0]
+            precedent = evolution['Exercice_precedent'].iloc[0]
+            st.markdown(f"**Évolution {dernier} / {precedent}** (budget principal)")
+            evolution_cols = st.columns(len(evolution))
+            for col, (agregat, row) in zip(evolution_cols, evolution.iterrows()):
+                with col:
+                    st.metric(
+                        agregat,
+                        f"{row['Montant'] / 1_000_000:,.1f} M€",
+                        delta=f"{row['Montant_evol_pct']:+.1f}% vs N-1" if pd.notnull(row['Montant_evol_pct']) else None,
+                        help=f"Taux de croissance annuel moyen : {row['Montant_tcam']:+.1f}%"
+                        if pd.notnull(row['Montant_tcam']) else None
+                    )
     else:
         st.warning("Aucune donnée de budget principal disponible avec les filtres actuels.")
         
 except Exception as e:
     st.error(f"Erreur dans le calcul des KPI : {str(e)}")
 
+memory.checkpoint("KPI")
+
 # Onglets pour les différentes analyses
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
+tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs([
     "🏛️ Santé Financière",
     "📊 Comparaison EPCI",
     "💧 Budgets Annexes",
     "💰 Focus Épargne",
-    "📈 Analyse Dépenses/Recettes"
+    "📈 Analyse Dépenses/Recettes",
+    "🏦 Endettement",
+    "👥 Groupes de pairs",
+    "🚨 Alertes",
+    "🗺️ Carte"
 ])
 
 # TAB 1: Santé Financière des Communes
@@ -342,27 +382,18 @@ with tab1:
             st.warning(f"Colonnes manquantes pour l'analyse : {', '.join(missing_cols)}")
         else:
             # Données de capacité de financement
-            df_financement = df_principal[df_principal['Agregat'] == 'Capacité ou besoin de financement']
+            resultats_sante = section_results['sante']
+            df_financement = resultats_sante['financement']
             
             if not df_financement.empty:
                 col1, col2 = st.columns([2, 1])
                 
                 with col1:
-                    # Nettoyage des données pour le graphique
-                    df_financement_clean = df_financement.dropna(subset=['Montant_par_habitant', 'Commune'])
-                    df_financement_clean = df_financement_clean.sort_values('Montant_par_habitant', ascending=False)
+                    # Nettoyage et classement des données pour le graphique
+                    df_financement_clean = resultats_sante['classement']
                     
                     if not df_financement_clean.empty:
-                        fig = px.bar(
-                            df_financement_clean,
-                            x='Commune',
-                            y='Montant_par_habitant',
-                            color='Montant_par_habitant',
-                            color_continuous_scale=['#EF4444', '#FBBF24', '#10B981'],
-                            title="Capacité (+) ou Besoin (-) de Financement par Habitant",
-                            labels={'Montant_par_habitant': '€ par habitant', 'Commune': 'Commune'}
-                        )
-                        fig.update_layout(height=500, xaxis_tickangle=45)
+                        fig = charts.capacite_bar(df_financement_clean)
                         st.plotly_chart(fig, use_container_width=True)
                     else:
                         st.info("Aucune donnée valide pour le graphique de capacité de financement")
@@ -373,24 +404,30 @@ with tab1:
                     if not df_financement_clean.empty:
                         # Top 5
                         st.markdown("**Top 5 - Meilleure santé**")
-                        top_5 = df_financement_clean.nlargest(5, 'Montant_par_habitant')
+                        top_5 = resultats_sante['top_5']
+                        top_5_evol = resultats_sante['top_5_evol']
                         for idx, row in top_5.iterrows():
                             value = row['Montant_par_habitant']
+                            evol = top_5_evol[idx]
                             st.metric(
                                 label=row['Commune'][:20],
-                                value=f"{value:,.0f} €/hab" if pd.notnull(value) else "N/A"
+                                value=f"{value:,.0f} €/hab" if pd.notnull(value) else "N/A",
+                                delta=f"{evol:+,.0f} €/hab vs N-1" if pd.notnull(evol) else None
                             )
                         
                         st.markdown("---")
                         
                         # Bottom 5
                         st.markdown("**Bottom 5**")
-                        bottom_5 = df_financement_clean.nsmallest(5, 'Montant_par_habitant')
+                        bottom_5 = resultats_sante['bottom_5']
+                        bottom_5_evol = resultats_sante['bottom_5_evol']
                         for idx, row in bottom_5.iterrows():
                             value = row['Montant_par_habitant']
+                            evol = bottom_5_evol[idx]
                             st.metric(
                                 label=row['Commune'][:20],
-                                value=f"{value:,.0f} €/hab" if pd.notnull(value) else "N/A"
+                                value=f"{value:,.0f} €/hab" if pd.notnull(value) else "N/A",
+                                delta=f"{evol:+,.0f} €/hab vs N-1" if pd.notnull(evol) else None
                             )
                 
                 # Statistiques de santé financière
@@ -422,6 +459,8 @@ with tab1:
     except Exception as e:
         st.error(f"Erreur dans l'analyse de santé financière : {str(e)}")
 
+memory.checkpoint("Santé financière")
+
 # TAB 2: Comparaison Intercommunalités
 with tab2:
     try:
@@ -429,33 +468,9 @@ with tab2:
         
         if 'Nom_EPCI' in df_principal.columns and 'Agregat' in df_principal.columns:
             # Préparation des données par EPCI
-            epci_data = []
-            
-            for epci in df_principal['Nom_EPCI'].dropna().unique():
-                df_epci = df_principal[df_epci['Nom_EPCI'] == epci]
-                
-                # Calcul des métriques de base
-                metrics = {
-                    'EPCI': epci,
-                    'Nombre_communes': df_epci['Commune'].nunique() if 'Commune' in df_epci.columns else 0,
-                    'Population_totale': df_epci['Population'].sum() if 'Population' in df_epci.columns else 0
-                }
-                
-                # Ajout des indicateurs financiers
-                for agregat in ['Epargne brute', 'Capacité ou besoin de financement', 'Impôts et taxes']:
-                    df_agregat = df_epci[df_epci['Agregat'] == agregat]
-                    if not df_agregat.empty and 'Montant' in df_agregat.columns:
-                        # Utiliser des nombres bruts pour les graphiques
-                        metrics[f'{agregat}_M€'] = df_agregat['Montant'].sum() / 1_000_000
-                        metrics[f'{agregat}_€'] = df_agregat['Montant'].sum()
-                    else:
-                        metrics[f'{agregat}_M€'] = 0
-                        metrics[f'{agregat}_€'] = 0
-                
-                epci_data.append(metrics)
+            epci_df = section_results['epci']['epci']
             
-            if epci_data:
-                epci_df = pd.DataFrame(epci_data)
+            if not epci_df.empty:
                 
                 # Graphique 1: Épargne brute par EPCI
                 st.markdown("#### Épargne brute par EPCI")
@@ -525,9 +540,6 @@ with tab2:
                 # Tableau de synthèse
                 st.markdown("#### Tableau comparatif")
                 
-                # Créer un DataFrame pour l'affichage (formaté pour l'utilisateur)
-                display_df = epci_df.copy()
-                
                 # Renommer les colonnes pour l'affichage
                 column_display_names = {
                     'EPCI': 'EPCI',
@@ -537,47 +549,21 @@ with tab2:
                     'Capacité ou besoin de financement_M€': 'Capacité/Besoin (M€)',
                     'Impôts et taxes_M€': 'Impôts/Taxes (M€)'
                 }
+                available_cols = [col for col in column_display_names if col in epci_df.columns]
                 
-                # Sélectionner et renommer les colonnes disponibles
-                available_cols = {}
-                for internal_name, display_name in column_display_names.items():
-                    if internal_name in display_df.columns:
-                        available_cols[internal_name] = display_name
-                
-                display_df = display_df[list(available_cols.keys())].copy()
-                display_df = display_df.rename(columns=available_cols)
-                
-                # Formater les nombres pour l'affichage
-                if 'Population' in display_df.columns:
-                    display_df['Population'] = display_df['Population'].apply(format_population)
-                
-                for col in ['Épargne brute (M€)', 'Capacité/Besoin (M€)', 'Impôts/Taxes (M€)']:
-                    if col in display_df.columns:
-                        display_df[col] = display_df[col].apply(
-                            lambda x: format_number_for_display(x, 1, True)
-                        )
-                
-                # Trier par épargne brute
-                if 'Épargne brute (M€)' in display_df.columns:
-                    # Extraire les valeurs numériques pour le tri
-                    try:
-                        display_df['_sort_key'] = display_df['Épargne brute (M€)'].str.replace('€', '').str.replace('M', '').str.replace('K', '').astype(float)
-                        # Ajuster pour les suffixes
-                        display_df['_sort_key'] = display_df.apply(
-                            lambda row: row['_sort_key'] * 1_000_000 if 'M' in str(row['Épargne brute (M€)']) else 
-                            (row['_sort_key'] * 1_000 if 'K' in str(row['Épargne brute (M€)']) else row['_sort_key']),
-                            axis=1
-                        )
-                        display_df = display_df.sort_values('_sort_key', ascending=False)
-                        display_df = display_df.drop('_sort_key', axis=1)
-                    except:
-                        # Si le tri échoue, trier alphabétiquement
-                        display_df = display_df.sort_values('EPCI')
-                
-                # Afficher le tableau
-                st.dataframe(
-                    display_df,
-                    use_container_width=True,
+                # Tri sur les valeurs brutes, formatage de la seule page affichée
+                format_montant = lambda x: format_number_for_display(x, 1, True)
+                tables.paged_table(
+                    epci_df[available_cols],
+                    key="table_epci",
+                    formatters={
+                        'Population_totale': format_population,
+                        'Epargne brute_M€': format_montant,
+                        'Capacité ou besoin de financement_M€': format_montant,
+                        'Impôts et taxes_M€': format_montant
+                    },
+                    column_names=column_display_names,
+                    sort_by='Epargne brute_M€',
                     height=400
                 )
                 
@@ -616,7 +602,37 @@ with tab2:
                             f"{avg_pop:,.0f}",
                             delta=None
                         )
-                        
+
+                # Exploration EPCI → commune → budget, servie par les niveaux pré-agrégés du cube
+                st.markdown("#### 🔎 Exploration EPCI → commune → budget")
+
+                col_drill1, col_drill2 = st.columns(2)
+                with col_drill1:
+                    drill_epci = st.selectbox("EPCI", epci_df['EPCI'].tolist(), key="drill_epci")
+                with col_drill2:
+                    drill_communes = data_cube.drilldown(filters, epci=drill_epci)
+                    drill_commune = st.selectbox(
+                        "Commune",
+                        ["Toutes les communes"] + drill_communes['Commune'].dropna().tolist(),
+                        key="drill_commune"
+                    )
+
+                if drill_commune == "Toutes les communes":
+                    drill_df = drill_communes
+                else:
+                    drill_df = data_cube.drilldown(filters, commune=drill_commune)
+
+                montant_cols = [col for col in drill_df.columns
+                                if col not in ('Commune', 'Siret_Budget', 'Libelle_Budget', 'Type_budget')]
+                tables.paged_table(
+                    drill_df,
+                    key="table_drilldown",
+                    formatters={col: (lambda x: format_number_for_display(x, 1, True)) for col in montant_cols},
+                    column_names={'Siret_Budget': 'SIRET', 'Libelle_Budget': 'Budget', 'Type_budget': 'Type de budget'},
+                    sort_by=montant_cols[0] if montant_cols else None,
+                    height=300
+                )
+
             else:
                 st.info("Aucune donnée EPCI disponible")
         else:
@@ -625,41 +641,25 @@ with tab2:
     except Exception as e:
         st.error(f"Erreur dans l'analyse comparative EPCI : {str(e)}")
 
+memory.checkpoint("Comparaison EPCI")
+
 # TAB 3: Analyse des Budgets Annexes
 with tab3:
     try:
         st.markdown("### Analyse des Budgets Annexes")
         
         # Filtrer pour budgets annexes
-        df_annexes = filtered_df[filtered_df['Type_budget'] == 'Budget annexe']
+        resultats_annexes = section_results['annexes']
+        df_annexes = resultats_annexes['annexes']
         
         if not df_annexes.empty:
             # Analyse par type de service
             if 'Libelle_Budget' in df_annexes.columns:
-                # Classification simplifiée des budgets annexes
-                def classify_service(libelle):
-                    if isinstance(libelle, str):
-                        libelle_lower = libelle.lower()
-                        if 'eau' in libelle_lower:
-                            return 'Eau'
-                        elif 'assain' in libelle_lower:
-                            return 'Assainissement'
-                        elif 'pompe' in libelle_lower and ('funebre' in libelle_lower or 'funèbre' in libelle_lower):
-                            return 'Pompes funèbres'
-                        elif 'spanc' in libelle_lower:
-                            return 'SPANC'
-                        elif 'touris' in libelle_lower:
-                            return 'Tourisme'
-                    return 'Autres services'
-                
-                df_annexes['Type_service'] = df_annexes['Libelle_Budget'].apply(classify_service)
-                
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     # Distribution des types de service
-                    service_counts = df_annexes['Type_service'].value_counts().reset_index()
-                    service_counts.columns = ['Service', 'Nombre']
+                    service_counts = resultats_annexes['service_counts']
                     
                     fig1 = px.pie(
                         service_counts,
@@ -673,8 +673,7 @@ with tab3:
                 with col2:
                     # Montant total par service
                     if 'Montant' in df_annexes.columns:
-                        service_amounts = df_annexes.groupby('Type_service')['Montant'].sum().reset_index()
-                        service_amounts = service_amounts.sort_values('Montant', ascending=False)
+                        service_amounts = resultats_annexes['service_amounts']
                         
                         fig2 = px.bar(
                             service_amounts,
@@ -690,25 +689,12 @@ with tab3:
                 # Analyse détaillée pour eau et assainissement
                 st.markdown("#### Analyse Eau et Assainissement")
                 
-                services_focus = ['Eau', 'Assainissement']
-                df_focus = df_annexes[df_annexes['Type_service'].isin(services_focus)]
+                services_focus = sections.SERVICES_FOCUS
+                df_focus = resultats_annexes['focus']
                 
                 if not df_focus.empty and 'Commune' in df_focus.columns:
-                    # Pivot table pour comparaison
-                    pivot_data = []
-                    communes = df_focus['Commune'].unique()
-                    
-                    for commune in communes:
-                        df_commune = df_focus[df_focus['Commune'] == commune]
-                        
-                        row = {'Commune': commune}
-                        for service in services_focus:
-                            service_data = df_commune[df_commune['Type_service'] == service]
-                            row[service] = service_data['Montant'].sum() if not service_data.empty else 0
-                        
-                        pivot_data.append(row)
-                    
-                    pivot_df = pd.DataFrame(pivot_data)
+                    # Pivot table pour comparaison (une ligne par commune)
+                    pivot_df = resultats_annexes['pivot']
                     
                     if not pivot_df.empty:
                         # Graphique comparatif
@@ -759,12 +745,17 @@ with tab3:
                                     st.metric("Ratio Eau/Assain moyen", "N/A")
             else:
                 st.info("Libellé des budgets annexes non disponible")
+        elif perimetre == PERIMETRE_CONSOLIDE:
+            st.info("Vue consolidée : les budgets annexes sont inclus dans les totaux des communes. "
+                    "Choisissez le périmètre « Budget principal » pour les analyser séparément.")
         else:
             st.info("Aucun budget annexe disponible avec les filtres actuels")
             
     except Exception as e:
         st.error(f"Erreur dans l'analyse des budgets annexes : {str(e)}")
 
+memory.checkpoint("Budgets annexes")
+
 # TAB 4: Focus sur l'Épargne Brute
 with tab4:
     try:
@@ -772,7 +763,8 @@ with tab4:
         
         # Données d'épargne brute
         if 'Agregat' in df_principal.columns:
-            df_epargne = df_principal[df_principal['Agregat'] == 'Epargne brute']
+            resultats_epargne = section_results['epargne']
+            df_epargne = resultats_epargne['epargne']
             
             if not df_epargne.empty:
                 col1, col2 = st.columns(2)
@@ -780,16 +772,16 @@ with tab4:
                 with col1:
                     # Histogramme de distribution
                     if 'Montant_par_habitant' in df_epargne.columns:
-                        df_hist = df_epargne.dropna(subset=['Montant_par_habitant'])
+                        df_hist = resultats_epargne['histogramme']
                         
                         if not df_hist.empty:
-                            fig1 = px.histogram(
+                            fig1 = charts.histogram(
                                 df_hist,
                                 x='Montant_par_habitant',
                                 nbins=20,
                                 title="Distribution de l'épargne brute par habitant",
                                 labels={'Montant_par_habitant': 'Épargne brute par habitant (€)'},
-                                color_discrete_sequence=['#3B82F6']
+                                color='#3B82F6'
                             )
                             fig1.update_layout(
                                 xaxis_title="€ par habitant",
@@ -802,7 +794,7 @@ with tab4:
                 with col2:
                     # Top 10 des communes
                     if 'Commune' in df_epargne.columns and 'Montant' in df_epargne.columns:
-                        df_top = df_epargne.sort_values('Montant', ascending=False).head(10)
+                        df_top = resultats_epargne['top']
                         
                         fig2 = px.bar(
                             df_top,
@@ -825,17 +817,15 @@ with tab4:
                 
                 if 'Strate_population' in df_epargne.columns:
                     # Nettoyage de la strate
-                    df_epargne_clean = df_epargne.dropna(subset=['Strate_population', 'Montant_par_habitant'])
-                    df_epargne_clean['Strate'] = df_epargne_clean['Strate_population'].astype(str)
+                    df_epargne_clean = resultats_epargne['strates']
                     
                     if not df_epargne_clean.empty:
-                        fig3 = px.box(
+                        fig3 = charts.box(
                             df_epargne_clean,
                             x='Strate',
                             y='Montant_par_habitant',
                             title="Épargne brute par habitant selon la strate de population",
-                            points="all",
-                            color='Strate'
+                            points="all"
                         )
                         fig3.update_layout(
                             xaxis_title="Strate de population",
@@ -847,44 +837,27 @@ with tab4:
                 # Tableau des données d'épargne
                 st.markdown("#### Données détaillées")
                 
-                display_cols = ['Commune', 'Nom_EPCI', 'Montant', 'Montant_par_habitant', 'Population']
+                display_cols = ['Commune', 'Nom_EPCI', 'Exercice', 'Montant', 'Montant_par_habitant', 'Population']
                 available_cols = [col for col in display_cols if col in df_epargne.columns]
                 
                 if available_cols:
-                    display_df = df_epargne[available_cols].copy()
-                    
-                    # Formater les nombres pour l'affichage
-                    if 'Montant' in display_df.columns:
-                        display_df['Montant'] = display_df['Montant'].apply(
-                            lambda x: format_number_for_display(x, 1, True)
-                        )
-                    
-                    if 'Montant_par_habitant' in display_df.columns:
-                        display_df['Montant_par_habitant'] = display_df['Montant_par_habitant'].apply(
-                            lambda x: f"€{x:,.0f}" if pd.notnull(x) else "N/A"
-                        )
-                    
-                    if 'Population' in display_df.columns:
-                        display_df['Population'] = display_df['Population'].apply(
-                            lambda x: format_population(x)
-                        )
-                    
-                    # Trier
-                    sort_col = 'Montant_par_habitant' if 'Montant_par_habitant' in display_df.columns else 'Commune'
-                    try:
-                        if 'Montant_par_habitant' in display_df.columns:
-                            # Extraire les valeurs numériques pour le tri
-                            display_df['_sort_key'] = display_df['Montant_par_habitant'].str.replace('€', '').str.replace(',', '').astype(float)
-                            display_df = display_df.sort_values('_sort_key', ascending=False)
-                            display_df = display_df.drop('_sort_key', axis=1)
-                        else:
-                            display_df = display_df.sort_values('Commune')
-                    except:
-                        display_df = display_df.sort_values('Commune')
-                    
-                    st.dataframe(
-                        display_df,
-                        use_container_width=True,
+                    # Tri sur les valeurs brutes, formatage de la seule page affichée
+                    tri_par_habitant = 'Montant_par_habitant' in available_cols
+                    df_epargne_table = resultats_epargne['table']
+                    format_pct = lambda x: f"{x:+.1f}%" if pd.notnull(x) else "-"
+                    tables.paged_table(
+                        df_epargne_table,
+                        key="table_epargne",
+                        formatters={
+                            'Montant': lambda x: format_number_for_display(x, 1, True),
+                            'Montant_par_habitant': lambda x: f"€{x:,.0f}" if pd.notnull(x) else "N/A",
+                            'Population': format_population,
+                            'Montant_evol_pct': format_pct,
+                            'Montant_tcam': format_pct
+                        },
+                        column_names={'Montant_evol_pct': 'Évol. N-1', 'Montant_tcam': 'TCAM'},
+                        sort_by='Montant_par_habitant' if tri_par_habitant else 'Commune',
+                        descending=tri_par_habitant,
                         height=400
                     )
             else:
@@ -895,6 +868,8 @@ with tab4:
     except Exception as e:
         st.error(f"Erreur dans l'analyse de l'épargne brute : {str(e)}")
 
+memory.checkpoint("Focus épargne")
+
 # TAB 5: NOUVELLE ANALYSE DÉPENSES/RECETTES
 with tab5:
     try:
@@ -908,14 +883,15 @@ with tab5:
             st.markdown("#### 1. Analyse des Recettes")
             
             # Récupérer les données de recettes
-            df_recettes = df_principal[df_principal['Agregat'] == 'Recettes totales hors emprunts']
+            resultats_depenses = section_results['depenses']
+            df_recettes = resultats_depenses['recettes']
             
             if not df_recettes.empty:
                 # A. Top 10 des communes par recettes
                 col_rec1, col_rec2 = st.columns(2)
                 
                 with col_rec1:
-                    df_top_recettes = df_recettes.sort_values('Montant', ascending=False).head(10)
+                    df_top_recettes = resultats_depenses['top_recettes']
                     
                     fig_rec1 = px.bar(
                         df_top_recettes,
@@ -935,8 +911,7 @@ with tab5:
                 
                 with col_rec2:
                     # B. Recettes par habitant
-                    df_recettes_hab = df_recettes.dropna(subset=['Montant_par_habitant'])
-                    df_recettes_hab = df_recettes_hab.sort_values('Montant_par_habitant', ascending=False).head(10)
+                    df_recettes_hab = resultats_depenses['top_recettes_hab']
                     
                     fig_rec2 = px.bar(
                         df_recettes_hab,
@@ -979,44 +954,19 @@ with tab5:
             st.markdown("#### 2. Analyse des Dépenses")
             
             # Calcul approximatif des dépenses : Recettes - Épargne brute
-            df_epargne = df_principal[df_principal['Agregat'] == 'Epargne brute']
+            df_epargne = resultats_depenses['epargne']
             
             if not df_recettes.empty and not df_epargne.empty:
-                # Créer un DataFrame combiné
-                depenses_data = []
+                # Panel Dépenses/Recettes précalculé pour tout le jeu, restreint aux lignes filtrées
+                df_depenses = resultats_depenses['depenses']
                 
-                for commune in df_principal['Commune'].unique():
-                    recettes_commune = df_recettes[df_recettes['Commune'] == commune]
-                    epargne_commune = df_epargne[df_epargne['Commune'] == commune]
-                    
-                    if not recettes_commune.empty and not epargne_commune.empty:
-                        recettes = recettes_commune['Montant'].iloc[0]
-                        epargne = epargne_commune['Montant'].iloc[0]
-                        
-                        # Dépenses = Recettes - Épargne (approximation)
-                        depenses = recettes - epargne
-                        
-                        # Population pour calcul par habitant
-                        population = recettes_commune['Population'].iloc[0] if pd.notnull(recettes_commune['Population'].iloc[0]) else 0
-                        
-                        depenses_data.append({
-                            'Commune': commune,
-                            'Recettes': recettes,
-                            'Épargne': epargne,
-                            'Dépenses': depenses,
-                            'Population': population,
-                            'Dépenses_par_habitant': depenses / population if population > 0 else 0,
-                            'Taux_depenses_recettes': (depenses / recettes * 100) if recettes > 0 else 0
-                        })
-                
-                if depenses_data:
-                    df_depenses = pd.DataFrame(depenses_data)
+                if not df_depenses.empty:
                     
                     # A. Top 10 des communes par dépenses
                     col_dep1, col_dep2 = st.columns(2)
                     
                     with col_dep1:
-                        df_top_depenses = df_depenses.sort_values('Dépenses', ascending=False).head(10)
+                        df_top_depenses = resultats_depenses['top_depenses']
                         
                         fig_dep1 = px.bar(
                             df_top_depenses,
@@ -1036,7 +986,7 @@ with tab5:
                     
                     with col_dep2:
                         # B. Dépenses par habitant
-                        df_depenses_hab = df_depenses.sort_values('Dépenses_par_habitant', ascending=False).head(10)
+                        df_depenses_hab = resultats_depenses['top_depenses_hab']
                         
                         fig_dep2 = px.bar(
                             df_depenses_hab,
@@ -1075,7 +1025,7 @@ with tab5:
                     st.markdown("#### 3. Comparaison Dépenses vs Recettes")
                     
                     # Sélectionner les 15 communes avec les plus gros budgets
-                    df_comparison = df_depenses.sort_values('Recettes', ascending=False).head(15)
+                    df_comparison = resultats_depenses['comparaison']
                     
                     # Graphique comparatif
                     fig_comparison = go.Figure()
@@ -1112,15 +1062,13 @@ with tab5:
                     # 4. ANALYSE DU SOLDE (RECETTES - DÉPENSES)
                     st.markdown("#### 4. Analyse du Solde (Recettes - Dépenses)")
                     
-                    # Calcul du solde
-                    df_depenses['Solde'] = df_depenses['Recettes'] - df_depenses['Dépenses']
-                    df_depenses['Solde_par_habitant'] = df_depenses['Solde'] / df_depenses['Population']
-                    
+                    # Solde et solde par habitant précalculés dans le panel
                     col_solde1, col_solde2 = st.columns(2)
                     
                     with col_solde1:
                         # Communes avec solde positif
-                        df_solde_positif = df_depenses[df_depenses['Solde'] > 0].sort_values('Solde', ascending=False)
+                        df_solde_positif = resultats_depenses['solde_positif']
+                        df_solde_positif = df_solde_positif[df_solde_positif['Solde'] > 0]
                         
                         if not df_solde_positif.empty:
                             fig_solde1 = px.bar(
@@ -1141,7 +1089,8 @@ with tab5:
                     
                     with col_solde2:
                         # Communes avec solde négatif
-                        df_solde_negatif = df_depenses[df_depenses['Solde'] < 0].sort_values('Solde', ascending=True)
+                        df_solde_negatif = resultats_depenses['solde_negatif']
+                        df_solde_negatif = df_solde_negatif[df_solde_negatif['Solde'] < 0]
                         
                         if not df_solde_negatif.empty:
                             fig_solde2 = px.bar(
@@ -1163,38 +1112,22 @@ with tab5:
                     # 5. TABLEAU SYNTHÈSE DÉPENSES/RECETTES
                     st.markdown("#### 5. Tableau synthèse - Toutes les communes")
                     
-                    # Créer un tableau formaté
-                    df_synthese = df_depenses.copy()
-                    
-                    # Formater les colonnes
-                    df_synthese['Recettes'] = df_synthese['Recettes'].apply(
-                        lambda x: format_number_for_display(x, 1, True)
-                    )
-                    df_synthese['Dépenses'] = df_synthese['Dépenses'].apply(
-                        lambda x: format_number_for_display(x, 1, True)
-                    )
-                    df_synthese['Épargne'] = df_synthese['Épargne'].apply(
-                        lambda x: format_number_for_display(x, 1, True)
-                    )
-                    df_synthese['Solde'] = df_synthese['Solde'].apply(
-                        lambda x: format_number_for_display(x, 1, True)
-                    )
-                    df_synthese['Dépenses_par_habitant'] = df_synthese['Dépenses_par_habitant'].apply(
-                        lambda x: f"€{x:,.0f}"
-                    )
-                    df_synthese['Taux_depenses_recettes'] = df_synthese['Taux_depenses_recettes'].apply(
-                        lambda x: f"{x:.1f}%"
-                    )
-                    df_synthese['Population'] = df_synthese['Population'].apply(format_population)
-                    
-                    # Trier par recettes
-                    df_synthese = df_synthese.sort_values('Recettes', ascending=False)
-                    
-                    # Afficher le tableau
-                    st.dataframe(
-                        df_synthese[['Commune', 'Population', 'Recettes', 'Dépenses', 
-                                    'Épargne', 'Solde', 'Dépenses_par_habitant', 'Taux_depenses_recettes']],
-                        use_container_width=True,
+                    # Tri par recettes sur les valeurs brutes, formatage de la seule page affichée
+                    format_montant = lambda x: format_number_for_display(x, 1, True)
+                    tables.paged_table(
+                        df_depenses[['Commune', 'Population', 'Recettes', 'Dépenses',
+                                     'Épargne', 'Solde', 'Dépenses_par_habitant', 'Taux_depenses_recettes']],
+                        key="table_synthese",
+                        formatters={
+                            'Recettes': format_montant,
+                            'Dépenses': format_montant,
+                            'Épargne': format_montant,
+                            'Solde': format_montant,
+                            'Dépenses_par_habitant': lambda x: f"€{x:,.0f}",
+                            'Taux_depenses_recettes': lambda x: f"{x:.1f}%",
+                            'Population': format_population
+                        },
+                        sort_by='Recettes',
                         height=500
                     )
                     
@@ -1205,7 +1138,7 @@ with tab5:
                     
                     with col_hab1:
                         # Recettes vs Dépenses par habitant
-                        df_hab_comparison = df_depenses.sort_values('Dépenses_par_habitant', ascending=False).head(15)
+                        df_hab_comparison = resultats_depenses['comparaison_hab']
                         
                         fig_hab1 = go.Figure()
                         
@@ -1236,7 +1169,7 @@ with tab5:
                     
                     with col_hab2:
                         # Nuage de points : Population vs Dépenses par habitant
-                        fig_hab2 = px.scatter(
+                        fig_hab2 = charts.scatter(
                             df_depenses,
                             x='Population',
                             y='Dépenses_par_habitant',
@@ -1265,6 +1198,470 @@ with tab5:
         with st.expander("Détails de l'erreur"):
             st.write(f"Erreur : {str(e)}")
 
+memory.checkpoint("Dépenses/Recettes")
+
+# TAB 6: Soutenabilité de la dette
+with tab6:
+    try:
+        st.markdown("### 🏦 Soutenabilité de la dette")
+        
+        debt_panel = dataset.derived('debt')
+        
+        if debt_panel.empty:
+            st.info("Agrégats de dette (Encours de dette, Annuité de la dette) absents du fichier")
+        else:
+            communes_selection = df_principal['Commune'].dropna().unique()
+            
+            exercices = sorted(debt_panel['Exercice'].dropna().unique().tolist(), reverse=True) if 'Exercice' in debt_panel.columns else []
+            exercice_dette = st.selectbox("Exercice", exercices, key="exercice_dette") if exercices else None
+            
+            df_dette = debt.debt_view(debt_panel, communes_selection, exercice_dette)
+            
+            # Extraits EPCI et syndicats (jointures sur codes entiers partagés)
+            extract_store = optional_index('extracts', "Extraits EPCI et syndicats")
+            if extract_store is not None and extracts.EPCI in extract_store:
+                df_dette = df_dette.assign(
+                    Dette_hab_EPCI=extract_store.epci_values(df_dette, debt.AGREGAT_ENCOURS)
+                )
+            
+            if df_dette.empty:
+                st.info("Aucune donnée de dette disponible avec les filtres actuels")
+            else:
+                # KPI de dette
+                col_dette1, col_dette2, col_dette3, col_dette4 = st.columns(4)
+                
+                total_encours = df_dette['Encours'].sum()
+                total_epargne = df_dette['Epargne_brute'].sum()
+                total_population = df_dette['Population'].sum()
+                total_recettes = df_dette['Recettes'].sum()
+                encours_evol = df_dette['Encours_evol'].sum(min_count=1) if 'Encours_evol' in df_dette.columns else np.nan
+                
+                with col_dette1:
+                    st.metric(
+                        "Encours de dette total",
+                        f"{total_encours / 1_000_000:,.1f} M€",
+                        delta=f"{encours_evol / 1_000_000:+,.1f} M€ vs N-1" if pd.notnull(encours_evol) else None,
+                        delta_color="inverse"
+                    )
+                
+                with col_dette2:
+                    dette_hab = total_encours / total_population if total_population > 0 else np.nan
+                    st.metric("Dette par habitant", f"{dette_hab:,.0f} €" if pd.notnull(dette_hab) else "N/A")
+                
+                with col_dette3:
+                    capacite = total_encours / total_epargne if total_epargne > 0 else np.nan
+                    st.metric("Capacité de désendettement", f"{capacite:.1f} ans" if pd.notnull(capacite) else "N/A")
+                
+                with col_dette4:
+                    poids = df_dette['Annuite'].sum() / total_recettes * 100 if total_recettes > 0 else np.nan
+                    st.metric("Annuité / recettes", f"{poids:.1f}%" if pd.notnull(poids) else "N/A")
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    df_capacite = df_dette.dropna(subset=['Capacite_desendettement'])
+                    df_capacite = df_capacite.sort_values('Capacite_desendettement', ascending=False)
+                    
+                    if not df_capacite.empty:
+                        fig_dette1 = px.bar(
+                            df_capacite,
+                            x='Commune',
+                            y='Capacite_desendettement',
+                            color='Capacite_desendettement',
+                            color_continuous_scale=['#10B981', '#FBBF24', '#EF4444'],
+                            title="Capacité de désendettement (encours / épargne brute)",
+                            labels={'Capacite_desendettement': 'Années'}
+                        )
+                        fig_dette1.add_hline(
+                            y=debt.SEUIL_DESENDETTEMENT,
+                            line_dash="dash",
+                            line_color="#EF4444",
+                            annotation_text=f"Seuil d'alerte {debt.SEUIL_DESENDETTEMENT} ans"
+                        )
+                        fig_dette1.update_layout(height=450, xaxis_tickangle=45)
+                        st.plotly_chart(fig_dette1, use_container_width=True)
+                    else:
+                        st.info("Épargne brute nulle ou négative : capacité de désendettement non calculable")
+                
+                with col2:
+                    df_dette_hab = df_dette.dropna(subset=['Dette_par_habitant'])
+                    df_dette_hab = df_dette_hab.sort_values('Dette_par_habitant', ascending=False)
+                    
+                    fig_dette2 = px.bar(
+                        df_dette_hab,
+                        x='Commune',
+                        y='Dette_par_habitant',
+                        color='Poids_annuite',
+                        color_continuous_scale='Oranges',
+                        title="Dette par habitant (couleur : annuité en % des recettes)",
+                        labels={'Dette_par_habitant': '€ par habitant', 'Poids_annuite': 'Annuité (%)'}
+                    )
+                    fig_dette2.update_layout(height=450, xaxis_tickangle=45)
+                    st.plotly_chart(fig_dette2, use_container_width=True)
+                
+                # Tableau des indicateurs de dette
+                st.markdown("#### Indicateurs de dette par commune")
+                
+                dette_cols = ['Commune', 'Encours', 'Dette_par_habitant', 'Dette_hab_EPCI', 'Capacite_desendettement',
+                              'Poids_annuite', 'Capacite_desendettement_evol', 'Dette_par_habitant_evol']
+                tables.paged_table(
+                    df_dette[[col for col in dette_cols if col in df_dette.columns]],
+                    key="table_dette",
+                    formatters={
+                        'Encours': lambda x: format_number_for_display(x, 1, True),
+                        'Dette_par_habitant': lambda x: f"€{x:,.0f}" if pd.notnull(x) else "N/A",
+                        'Dette_hab_EPCI': lambda x: f"€{x:,.0f}" if pd.notnull(x) else "N/A",
+                        'Capacite_desendettement': lambda x: f"{x:.1f}" if pd.notnull(x) else "N/A",
+                        'Poids_annuite': lambda x: f"{x:.1f}%" if pd.notnull(x) else "N/A",
+                        'Capacite_desendettement_evol': lambda x: f"{x:+.1f} an(s)" if pd.notnull(x) else "-",
+                        'Dette_par_habitant_evol': lambda x: f"{x:+,.0f} €" if pd.notnull(x) else "-"
+                    },
+                    column_names={
+                        'Dette_par_habitant': 'Dette/hab',
+                        'Dette_hab_EPCI': 'Dette/hab EPCI',
+                        'Capacite_desendettement': 'Désendettement (ans)',
+                        'Poids_annuite': 'Annuité / recettes',
+                        'Capacite_desendettement_evol': 'Évol. désendettement',
+                        'Dette_par_habitant_evol': 'Évol. dette/hab'
+                    },
+                    sort_by='Capacite_desendettement',
+                    height=400
+                )
+                
+                communes_alerte = (df_dette['Capacite_desendettement'] > debt.SEUIL_DESENDETTEMENT).sum()
+                if communes_alerte:
+                    st.warning(f"{communes_alerte} commune(s) au-delà du seuil de {debt.SEUIL_DESENDETTEMENT} ans de capacité de désendettement")
+                
+                # Dette des syndicats qui portent une partie des services des communes
+                if extract_store is not None and extracts.SYNDICATS in extract_store:
+                    df_syndicats = extract_store.entities(extracts.SYNDICATS, debt.AGREGAT_ENCOURS, exercice_dette)
+                    if not df_syndicats.empty:
+                        st.markdown("#### Encours de dette des syndicats")
+                        st.metric("Encours total des syndicats", f"{df_syndicats['Montant'].sum() / 1_000_000:,.1f} M€")
+                        st.dataframe(
+                            df_syndicats.rename(columns={'Code_Siren_Collectivite': 'SIREN', 'Libelle_Budget': 'Syndicat',
+                                                         'Montant': 'Encours'}),
+                            use_container_width=True,
+                            hide_index=True,
+                            column_config={'Encours': st.column_config.NumberColumn(format="%.0f €")}
+                        )
+                
+                # Simulation d'un nouvel emprunt, projetée pour toutes les communes sélectionnées
+                st.markdown("#### 🧮 Simulation d'emprunt")
+                scenario_base = dataset.derived('scenarios')
+                
+                col_sim1, col_sim2, col_sim3 = st.columns(3)
+                with col_sim1:
+                    montant_emprunt = st.slider("Emprunt (€ par habitant)", 0, 2000, 300, step=50, key="montant_emprunt")
+                with col_sim2:
+                    taux_emprunt = st.slider("Taux (%)", 0.0, 8.0, 3.0, step=0.1, key="taux_emprunt")
+                with col_sim3:
+                    duree_emprunt = st.slider("Durée (années)", 5, 40, 20, key="duree_emprunt")
+                
+                # Scénario retenu, sensibilité au taux (± 1 point) et référence sans emprunt
+                taux_scenarios = np.array([taux_emprunt, max(taux_emprunt - 1, 0.0), taux_emprunt + 1, taux_emprunt]) / 100
+                montants_scenarios = np.array([montant_emprunt, montant_emprunt, montant_emprunt, 0])
+                libelles_scenarios = [
+                    f"Emprunt à {taux_emprunt:.1f}%",
+                    f"Taux {max(taux_emprunt - 1, 0.0):.1f}%",
+                    f"Taux {taux_emprunt + 1:.1f}%",
+                    "Sans nouvel emprunt",
+                ]
+                
+                simulation = scenario_base.simulate(
+                    montants_scenarios, taux_scenarios, duree_emprunt,
+                    rows=scenario_base.rows(communes_selection, exercice_dette)
+                )
+                
+                trajectoire = simulation.trajectory()
+                trajectoire['Scénario'] = np.repeat(libelles_scenarios, len(simulation.years))
+                
+                fig_simulation = px.line(
+                    trajectoire,
+                    x='Exercice',
+                    y='Capacite_desendettement',
+                    color='Scénario',
+                    markers=True,
+                    title=f"Capacité de désendettement projetée (encours total / épargne brute totale, horizon {scenarios.HORIZON} ans)",
+                    labels={'Capacite_desendettement': 'Années'}
+                )
+                fig_simulation.add_hline(
+                    y=debt.SEUIL_DESENDETTEMENT,
+                    line_dash="dash",
+                    line_color="#EF4444",
+                    annotation_text=f"Seuil d'alerte {debt.SEUIL_DESENDETTEMENT} ans"
+                )
+                fig_simulation.update_layout(height=450)
+                st.plotly_chart(fig_simulation, use_container_width=True)
+                st.caption(f"Hypothèses : annuités constantes, dette existante amortie à annuité constante au taux de "
+                           f"{scenarios.TAUX_DETTE_EXISTANTE:.0%}, épargne brute de départ modifiée par les seuls intérêts")
+                
+                tables.paged_table(
+                    simulation.summary(0),
+                    key="table_simulation",
+                    formatters={
+                        'Emprunt': lambda x: format_number_for_display(x, 1, True),
+                        'Annuite_supplementaire': lambda x: format_number_for_display(x, 1, True),
+                        'Capacite_initiale': lambda x: f"{x:.1f}" if pd.notnull(x) else "N/A",
+                        'Capacite_max': lambda x: f"{x:.1f}" if pd.notnull(x) else "N/A",
+                        'Annee_max': lambda x: f"{x:.0f}" if pd.notnull(x) else "-",
+                        'Encours_final': lambda x: format_number_for_display(x, 1, True)
+                    },
+                    column_names={
+                        'Annuite_supplementaire': 'Annuité supplémentaire',
+                        'Capacite_initiale': 'Désendettement initial (ans)',
+                        'Capacite_max': 'Désendettement max (ans)',
+                        'Annee_max': 'Année du pic',
+                        'Annees_au_dela_seuil': f"Années > {debt.SEUIL_DESENDETTEMENT} ans",
+                        'Encours_final': f"Encours {simulation.years[-1]}"
+                    },
+                    sort_by='Capacite_max',
+                    height=400
+                )
+    
+    except Exception as e:
+        st.error(f"Erreur dans l'analyse de la dette : {str(e)}")
+
+memory.checkpoint("Endettement")
+
+# TAB 7: Positionnement dans les groupes de pairs nationaux
+with tab7:
+    try:
+        st.markdown("### 👥 Positionnement national par groupe de pairs")
+        st.caption("Rang centile de chaque commune parmi les communes françaises de même profil (budget principal, montant par habitant)")
+        
+        peer_index = optional_index('peers', "Groupes de pairs nationaux")
+        peer_agregats = peer_index.agregats if peer_index is not None else []
+        
+        if not peer_agregats:
+            st.info("Aucune donnée nationale disponible pour les groupes de pairs")
+        else:
+            col_pair1, col_pair2, col_pair3 = st.columns(3)
+            
+            with col_pair1:
+                groupe_pairs = st.selectbox("Groupe de pairs", list(peers.PEER_GROUPS), key="groupe_pairs")
+            with col_pair2:
+                agregat_pairs = st.selectbox(
+                    "Indicateur",
+                    peer_agregats,
+                    index=peer_agregats.index('Epargne brute') if 'Epargne brute' in peer_agregats else 0,
+                    key="agregat_pairs"
+                )
+            with col_pair3:
+                exercices_pairs = peer_index.exercices(agregat_pairs)
+                exercice_pairs = st.selectbox("Exercice", exercices_pairs[::-1], key="exercice_pairs")
+            
+            communes_codes = df_principal['Code_Commune'].dropna().unique() if 'Code_Commune' in df_principal.columns else None
+            df_pairs = peer_index.positions(groupe_pairs, agregat_pairs, exercice_pairs, communes_codes)
+            
+            if df_pairs.empty:
+                st.info("Aucune commune sélectionnée dans ce groupe de pairs")
+            else:
+                df_pairs = df_pairs.sort_values('Percentile', ascending=False)
+                
+                fig_pairs = px.bar(
+                    df_pairs,
+                    x='Commune',
+                    y='Percentile',
+                    color='Percentile',
+                    color_continuous_scale=['#EF4444', '#FBBF24', '#10B981'],
+                    range_color=[0, 100],
+                    hover_data={'Cle_pairs': True, 'Montant_par_habitant': ':,.0f', 'Mediane': ':,.0f', 'Nb_pairs': True},
+                    title=f"{agregat_pairs} par habitant : rang centile dans le groupe « {groupe_pairs} »",
+                    labels={'Percentile': 'Rang centile', 'Cle_pairs': 'Groupe', 'Montant_par_habitant': '€/hab',
+                            'Mediane': 'Médiane des pairs (€/hab)', 'Nb_pairs': 'Communes du groupe'}
+                )
+                fig_pairs.add_hline(y=50, line_dash="dash", line_color="#6B7280", annotation_text="Médiane nationale des pairs")
+                fig_pairs.update_layout(height=450, xaxis_tickangle=45, yaxis_range=[0, 100])
+                st.plotly_chart(fig_pairs, use_container_width=True)
+                
+                display_pairs = pd.DataFrame({
+                    'Commune': df_pairs['Commune'],
+                    'Groupe': df_pairs['Cle_pairs'],
+                    'Commune (€/hab)': df_pairs['Montant_par_habitant'].apply(lambda x: f"€{x:,.0f}"),
+                    'Médiane pairs': df_pairs['Mediane'].apply(lambda x: f"€{x:,.0f}"),
+                    'Intervalle P25-P75': [f"€{p25:,.0f} - €{p75:,.0f}" for p25, p75 in zip(df_pairs['P25'], df_pairs['P75'])],
+                    'Rang centile': df_pairs['Percentile'].apply(lambda x: f"{x:.0f}e"),
+                    'Nb pairs': df_pairs['Nb_pairs'].astype(int)
+                })
+                st.dataframe(display_pairs, use_container_width=True, height=400, hide_index=True)
+        
+        # Plus proches voisins sur le profil financier complet
+        st.markdown("#### 🔎 Communes au profil financier le plus proche")
+        similarity_index = optional_index('similarity', "Profils financiers nationaux")
+        communes_similaires = df_principal.dropna(subset=['Code_Commune']).drop_duplicates('Commune')
+        if similarity_index is None:
+            communes_similaires = communes_similaires.iloc[0:0]
+        else:
+            communes_similaires = communes_similaires[[code in similarity_index for code in communes_similaires['Code_Commune']]]
+        
+        if communes_similaires.empty:
+            st.info("Aucun profil financier national disponible pour les communes sélectionnées")
+        else:
+            col_sim1, col_sim2, col_sim3 = st.columns([2, 1, 1])
+            with col_sim1:
+                commune_reference = st.selectbox("Commune de référence", sorted(communes_similaires['Commune']),
+                                                 key="commune_similaire")
+            with col_sim2:
+                k_similaires = st.slider("Nombre de communes", 5, 30, similarity.DEFAULT_K, key="k_similaires")
+            with col_sim3:
+                meme_departement = st.checkbox("Même département uniquement", key="similaires_departement")
+            
+            code_reference = communes_similaires.loc[communes_similaires['Commune'] == commune_reference, 'Code_Commune'].iloc[0]
+            voisins = similarity_index.neighbours(
+                code_reference, k_similaires,
+                departement=ofgl_data.CODE_DEPARTEMENT if meme_departement else None
+            )
+            reference = similarity_index.profile(code_reference).to_frame().T.assign(Distance=0.0)
+            st.caption(f"Profil de l'exercice {reference['Exercice'].iloc[0]} : montants par habitant du budget principal, "
+                       "strate et tranche de revenu, normalisés sur l'ensemble des communes (médiane et écart interquartile)")
+            
+            display_voisins = pd.concat([reference, voisins], ignore_index=True)
+            display_voisins = display_voisins[['Commune', 'Code_Departement', 'Distance'] + similarity_index.features]
+            st.dataframe(
+                display_voisins.rename(columns=dict(similarity.FEATURE_LABELS, Code_Departement='Département')),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    label: st.column_config.NumberColumn(format="%.0f €")
+                    for col, label in similarity.FEATURE_LABELS.items() if col.endswith('_hab')
+                } | {'Distance': st.column_config.NumberColumn(format="%.2f")}
+            )
+    
+    except Exception as e:
+        st.error(f"Erreur dans l'analyse des groupes de pairs : {str(e)}")
+
+memory.checkpoint("Groupes de pairs")
+
+# TAB 8: Alertes financières (règles évaluées une fois par version des données)
+with tab8:
+    try:
+        st.markdown("### 🚨 Alertes financières")
+        
+        alert_table = dataset.derived('alerts')
+        communes_selection = df_principal['Commune'].dropna().unique()
+        exercices_alertes = sorted(alert_table['Exercice'].dropna().unique().tolist(), reverse=True)
+        
+        if not exercices_alertes:
+            st.success("Aucune alerte sur l'ensemble des exercices")
+        else:
+            exercice_alertes = st.selectbox("Exercice", exercices_alertes, key="exercice_alertes")
+            df_alertes = alerts.alert_view(alert_table, communes_selection, exercice_alertes)
+            
+            col_alerte1, col_alerte2, col_alerte3 = st.columns(3)
+            with col_alerte1:
+                st.metric("Communes en alerte", df_alertes['Commune'].nunique())
+            with col_alerte2:
+                st.metric("Alertes critiques", int((df_alertes['Niveau'] == alerts.NIVEAU_CRITIQUE).sum()))
+            with col_alerte3:
+                st.metric("Alertes de vigilance", int((df_alertes['Niveau'] == alerts.NIVEAU_VIGILANCE).sum()))
+            
+            if df_alertes.empty:
+                st.success("Aucune alerte pour les communes sélectionnées")
+            else:
+                col1, col2 = st.columns([1, 2])
+                
+                with col1:
+                    alert_counts = df_alertes.groupby(['Alerte', 'Niveau']).size().reset_index(name='Communes')
+                    fig_alertes = px.bar(
+                        alert_counts,
+                        x='Communes',
+                        y='Alerte',
+                        color='Niveau',
+                        orientation='h',
+                        color_discrete_map={alerts.NIVEAU_CRITIQUE: '#EF4444', alerts.NIVEAU_VIGILANCE: '#FBBF24'},
+                        title="Communes concernées par règle"
+                    )
+                    fig_alertes.update_layout(height=400, yaxis_title=None)
+                    st.plotly_chart(fig_alertes, use_container_width=True)
+                
+                with col2:
+                    tables.paged_table(
+                        df_alertes[['Commune', 'Nom_EPCI', 'Alerte', 'Niveau', 'Valeur', 'Seuil']],
+                        key="table_alertes",
+                        formatters={
+                            'Valeur': lambda x: f"{x:,.1f}" if pd.notnull(x) else "N/A",
+                            'Seuil': lambda x: f"{x:,.0f}"
+                        },
+                        column_names={'Nom_EPCI': 'EPCI'},
+                        sort_by='Niveau',
+                        descending=False,
+                        height=400
+                    )
+            
+            with st.expander("Règles appliquées"):
+                st.dataframe(
+                    pd.DataFrame(alerts.RULES).rename(columns={
+                        'libelle': 'Règle', 'indicateur': 'Indicateur', 'operateur': 'Comparaison',
+                        'seuil': 'Seuil', 'exercices_consecutifs': 'Exercices consécutifs', 'niveau': 'Niveau'
+                    }).drop(columns=['code']),
+                    use_container_width=True,
+                    hide_index=True
+                )
+    
+    except Exception as e:
+        st.error(f"Erreur dans l'analyse des alertes : {str(e)}")
+
+memory.checkpoint("Alertes")
+
+# TAB 9: Carte des communes et des EPCI (géométries simplifiées précalculées)
+with tab9:
+    try:
+        st.markdown("### 🗺️ Carte des montants par habitant")
+        
+        geo_index = optional_index('geo', "Carte")
+        
+        if geo_index is None:
+            if 'geo' not in dataset.errors:
+                st.info(f"Carte indisponible : placer le GeoJSON des communes dans `{geo.GEOJSON_PATH}` "
+                        f"(ou indiquer son chemin dans la variable d'environnement {geo.GEOJSON_ENV_VAR})")
+        else:
+            col_carte1, col_carte2, col_carte3, col_carte4 = st.columns(4)
+            with col_carte1:
+                niveau_carte = st.radio("Niveau", [geo.NIVEAU_COMMUNES, geo.NIVEAU_EPCI], horizontal=True, key="niveau_carte")
+            with col_carte2:
+                agregats_carte = df_principal['Agregat'].dropna().unique().tolist()
+                agregat_carte = st.selectbox("Indicateur", agregats_carte, key="agregat_carte")
+            with col_carte3:
+                exercices_carte = sorted(df_principal['Exercice'].dropna().unique().tolist(), reverse=True)
+                exercice_carte = st.selectbox("Exercice", exercices_carte, key="exercice_carte")
+            with col_carte4:
+                resolution_carte = st.selectbox("Résolution", list(geo.TOLERANCES),
+                                                index=list(geo.TOLERANCES).index(geo.DEFAULT_RESOLUTION),
+                                                key="resolution_carte")
+            
+            valeurs_carte = geo.map_values(data_cube, filters, agregat_carte, exercice_carte, niveau_carte)
+            
+            if valeurs_carte.empty:
+                st.info("Aucune donnée à cartographier avec les filtres actuels")
+            else:
+                fig_carte = go.Figure(go.Choropleth(
+                    locations=valeurs_carte['Cle'],
+                    z=valeurs_carte['Montant_par_habitant'],
+                    colorscale='RdYlGn',
+                    marker_line_color='white',
+                    marker_line_width=0.8,
+                    colorbar_title="€/hab",
+                    hovertemplate="%{location}<br>%{z:,.0f} €/hab<extra></extra>"
+                ))
+                # Géométrie précalculée et partagée, affectée après construction (le constructeur
+                # en ferait une copie profonde) : seules les valeurs de couleur dépendent des filtres
+                fig_carte.data[0].geojson = geo_index.layer(niveau_carte, resolution_carte)
+                fig_carte.update_geos(fitbounds="locations", visible=False)
+                fig_carte.update_layout(height=600, margin=dict(t=30, b=0, l=0, r=0),
+                                        title=f"{agregat_carte} par habitant ({exercice_carte})")
+                st.plotly_chart(fig_carte, use_container_width=True)
+                
+                stats_carte = next(row for row in geo_index.stats
+                                   if row['niveau'] == niveau_carte and row['resolution'] == resolution_carte)
+                st.caption(f"Géométrie {resolution_carte.lower()} : {stats_carte['sommets']:,} sommets, "
+                           f"{stats_carte['octets'] / 1000:,.0f} Ko")
+    
+    except Exception as e:
+        st.error(f"Erreur dans l'affichage de la carte : {str(e)}")
+
+memory.checkpoint("Carte")
+
 # Section d'export
 st.markdown("---")
 st.markdown("### 📥 Export des données")
@@ -1287,25 +1684,7 @@ try:
         # Export synthèse
         if st.button("📊 Exporter synthèse statistique"):
             # Créer une synthèse
-            synthèse_data = {
-                'Métrique': ['Lignes de données', 'Communes uniques', 'EPCI représentés'],
-                'Valeur': [
-                    len(filtered_df),
-                    filtered_df['Commune'].nunique() if 'Commune' in filtered_df.columns else 0,
-                    filtered_df['Nom_EPCI'].nunique() if 'Nom_EPCI' in filtered_df.columns else 0
-                ]
-            }
-            
-            # Ajouter des métriques financières si disponibles
-            if 'Agregat' in filtered_df.columns and 'Montant' in filtered_df.columns:
-                for agregat in ['Epargne brute', 'Capacité ou besoin de financement', 'Recettes totales hors emprunts']:
-                    df_agregat = filtered_df[filtered_df['Agregat'] == agregat]
-                    if not df_agregat.empty:
-                        total = df_agregat['Montant'].sum() / 1_000_000
-                        synthèse_data['Métrique'].append(f"{agregat} (M€)")
-                        synthèse_data['Valeur'].append(f"{total:.2f}")
-            
-            synthèse_df = pd.DataFrame(synthèse_data)
+            synthèse_df = section_results['synthese']['synthese']
             csv_synthèse = synthèse_df.to_csv(index=False, encoding='utf-8-sig')
             
             st.download_button(
@@ -1318,6 +1697,8 @@ try:
 except Exception as e:
     st.warning(f"Export non disponible : {str(e)}")
 
+memory.checkpoint("Export")
+
 # Pied de page
 st.markdown("---")
 st.markdown("""
@@ -1326,3 +1707,31 @@ st.markdown("""
     <p>Analyse financière communale - Version 3.0 (avec analyse Dépenses/Recettes)</p>
 </div>
 """, unsafe_allow_html=True)
+
+# Rapport mémoire (mode debug)
+if memory.enabled:
+    memory.checkpoint("Pied de page")
+    memory.track_namespace(globals(), shared=[df, *dataset.built_derived().values()])
+    memory_report = memory.report(dataset)
+    st.session_state[memprof.SESSION_KEY] = memory_report
+
+    with st.sidebar.expander("🧠 Mémoire (debug)", expanded=False):
+        st.markdown("**Jeu partagé et index dérivés**")
+        st.dataframe(pd.DataFrame(memory_report['jeu_de_donnees']), hide_index=True, use_container_width=True)
+        if dataset.arrow_path:
+            st.caption("Mode Arrow : le jeu est mappé en mémoire et partagé entre processus.")
+        st.markdown("**Objets de la session**")
+        st.dataframe(pd.DataFrame(memory_report['session']), hide_index=True, use_container_width=True)
+        st.markdown("**Allocations par section (tracemalloc)**")
+        st.dataframe(pd.DataFrame(memory_report['sections']), hide_index=True, use_container_width=True)
+        st.markdown("**Principaux sites d'allocation de l'exécution**")
+        st.dataframe(pd.DataFrame(memory_report['sites']), hide_index=True, use_container_width=True)
+        rss = memory_report['processus']['rss_max_octets']
+        if rss:
+            st.caption(f"RSS maximal du processus : {rss / 1_000_000:,.1f} Mo")
+        st.download_button(
+            label="Télécharger le rapport (JSON)",
+            data=json.dumps(memory_report, ensure_ascii=False, indent=2),
+            file_name="rapport_memoire.json",
+            mime="application/json"
+        )
@@ -0,0 +1,161 @@
+# alerts.py - Règles d'alerte financière déclaratives évaluées sur tout le panel commune x exercice
+import operator
+
+import numpy as np
+import pandas as pd
+
+import analyses
+import debt
+
+NIVEAU_CRITIQUE = 'Critique'
+NIVEAU_VIGILANCE = 'Vigilance'
+
+# Règles : indicateur du panel, comparaison au seuil et nombre d'exercices consécutifs requis
+RULES = [
+    {
+        'code': 'epargne_negative',
+        'libelle': "Épargne brute négative",
+        'indicateur': 'Epargne_brute',
+        'operateur': '<',
+        'seuil': 0,
+        'niveau': NIVEAU_CRITIQUE,
+    },
+    {
+        'code': 'taux_epargne_faible',
+        'libelle': "Épargne brute inférieure à 7 % des recettes",
+        'indicateur': 'Taux_epargne',
+        'operateur': '<',
+        'seuil': 7,
+        'niveau': NIVEAU_VIGILANCE,
+    },
+    {
+        'code': 'desendettement',
+        'libelle': f"Capacité de désendettement supérieure à {debt.SEUIL_DESENDETTEMENT} ans",
+        'indicateur': 'Capacite_desendettement',
+        'operateur': '>',
+        'seuil': debt.SEUIL_DESENDETTEMENT,
+        'niveau': NIVEAU_CRITIQUE,
+    },
+    {
+        'code': 'besoin_financement',
+        'libelle': "Besoin de financement",
+        'indicateur': 'Capacite_financement',
+        'operateur': '<',
+        'seuil': 0,
+        'niveau': NIVEAU_VIGILANCE,
+    },
+    {
+        'code': 'besoin_financement_2_ans',
+        'libelle': "Besoin de financement deux exercices de suite",
+        'indicateur': 'Capacite_financement',
+        'operateur': '<',
+        'seuil': 0,
+        'exercices_consecutifs': 2,
+        'niveau': NIVEAU_CRITIQUE,
+    },
+]
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+ALERT_COLUMNS = ['Code_Commune', 'Commune', 'Nom_EPCI', 'Exercice', 'Regle', 'Alerte', 'Niveau',
+                 'Indicateur', 'Valeur', 'Seuil']
+
+
+def build_alert_panel(df, debt_panel):
+    """
+    Panel commune x exercice (budget principal) des indicateurs d'alerte : le panel de
+    dette, complété de la capacité de financement et du taux d'épargne brute (% des recettes)
+    """
+    keys = [col for col in debt.PANEL_KEYS if col in df.columns and col in debt_panel.columns]
+    rows = df[df['Type_budget'].isin(analyses.BUDGETS_REFERENCE) & (df['Agregat'] == analyses.AGREGAT_CAPACITE)]
+    capacite = rows.groupby(keys, dropna=False)['Montant'].sum().rename('Capacite_financement')
+
+    panel = debt_panel.merge(capacite.reset_index(), on=keys, how='outer')
+    epargne = panel['Epargne_brute'].to_numpy(dtype=float)
+    recettes = panel['Recettes'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        panel['Taux_epargne'] = np.where(recettes > 0, epargne / recettes * 100, np.nan)
+
+    sort_cols = [col for col in ['Commune', 'Exercice'] if col in panel.columns]
+    return panel.sort_values(sort_cols, kind='stable').reset_index(drop=True)
+
+
+def _streaks(condition, previous):
+    """
+    Nombre d'exercices consécutifs (jusqu'à la ligne incluse) où la condition est vraie,
+    sur un panel trié par commune puis exercice ; previous indique que la ligne
+    précédente est l'exercice N-1 de la même commune
+    """
+    n = len(condition)
+    continues = np.zeros(n, dtype=bool)
+    continues[1:] = previous[1:] & condition[:-1]
+    starts = condition & ~continues
+    positions = np.arange(n)
+    run_start = np.maximum.accumulate(np.where(starts, positions, 0))
+    return np.where(condition, positions - run_start + 1, 0)
+
+
+def compile_rule(rule):
+    """
+    Règle -> fonction (panel, previous) renvoyant le masque des lignes en alerte
+    """
+    compare = OPERATORS[rule['operateur']]
+    consecutive = rule.get('exercices_consecutifs', 1)
+
+    def evaluate(panel, previous):
+        values = panel[rule['indicateur']].to_numpy(dtype=float)
+        # Comparaison NaN -> False : un indicateur manquant ne déclenche pas d'alerte
+        condition = compare(values, rule['seuil'])
+        if consecutive > 1:
+            condition = _streaks(condition, previous) >= consecutive
+        return condition
+
+    return evaluate
+
+
+def evaluate_rules(panel, rules=RULES):
+    """
+    Table des alertes : une ligne par commune, exercice et règle déclenchée.
+    Toutes les règles sont évaluées sur le panel entier (une passe vectorisée par règle).
+    """
+    rules = [rule for rule in rules if rule['indicateur'] in panel.columns]
+    if panel.empty or not rules:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    commune = panel['Commune'].to_numpy()
+    exercice = panel['Exercice'].to_numpy(dtype=float)
+    previous = np.zeros(len(panel), dtype=bool)
+    previous[1:] = (commune[1:] == commune[:-1]) & (exercice[1:] == exercice[:-1] + 1)
+
+    matrix = np.column_stack([compile_rule(rule)(panel, previous) for rule in rules])
+    values = np.column_stack([panel[rule['indicateur']].to_numpy(dtype=float) for rule in rules])
+    rows, rule_ids = np.nonzero(matrix)
+
+    keys = [col for col in ['Code_Commune', 'Commune', 'Nom_EPCI', 'Exercice'] if col in panel.columns]
+    table = panel[keys].iloc[rows].reset_index(drop=True)
+    table['Regle'] = np.array([rule['code'] for rule in rules], dtype=object)[rule_ids]
+    table['Alerte'] = np.array([rule['libelle'] for rule in rules], dtype=object)[rule_ids]
+    table['Niveau'] = np.array([rule['niveau'] for rule in rules], dtype=object)[rule_ids]
+    table['Indicateur'] = np.array([rule['indicateur'] for rule in rules], dtype=object)[rule_ids]
+    table['Valeur'] = values[rows, rule_ids]
+    table['Seuil'] = np.array([rule['seuil'] for rule in rules], dtype=float)[rule_ids]
+    return table
+
+
+def build_alert_table(df, debt_panel, rules=RULES):
+    return evaluate_rules(build_alert_panel(df, debt_panel), rules)
+
+
+def alert_view(table, communes, exercice=None):
+    """
+    Alertes des communes sélectionnées (et d'un exercice donné)
+    """
+    view = table[table['Commune'].isin(communes)]
+    if exercice is not None:
+        view = view[view['Exercice'] == exercice]
+    return view
@@ -0,0 +1,203 @@
+# analyses.py - Calculs d'analyse partagés par le dashboard
+import numpy as np
+import pandas as pd
+
+BUDGET_PRINCIPAL = 'Budget principal'
+BUDGET_ANNEXE = 'Budget annexe'
+BUDGET_CONSOLIDE = 'Budget consolidé'
+# Budget de référence d'une commune : le budget principal, ou dans la vue consolidée
+# la somme de tous ses budgets (une vue ne contient que l'un des deux)
+BUDGETS_REFERENCE = [BUDGET_PRINCIPAL, BUDGET_CONSOLIDE]
+AGREGAT_RECETTES = 'Recettes totales hors emprunts'
+AGREGAT_EPARGNE = 'Epargne brute'
+AGREGAT_CAPACITE = 'Capacité ou besoin de financement'
+AGREGAT_IMPOTS = 'Impôts et taxes'
+
+EPCI_AGREGATS = [AGREGAT_EPARGNE, AGREGAT_CAPACITE, AGREGAT_IMPOTS]
+SYNTHESE_AGREGATS = [AGREGAT_EPARGNE, AGREGAT_CAPACITE, AGREGAT_RECETTES]
+
+DEPENSES_METRICS = ['Recettes', 'Dépenses', 'Dépenses_par_habitant', 'Solde']
+
+
+def apply_filters(df, epci=None, communes=None, budget_types=None, agregats=None):
+    """
+    Filtres de la sidebar : une sélection vide ne filtre pas
+    """
+    filtered_df = df
+
+    if epci:
+        filtered_df = filtered_df[filtered_df['Nom_EPCI'].isin(epci)]
+
+    if communes:
+        filtered_df = filtered_df[filtered_df['Commune'].isin(communes)]
+
+    if budget_types:
+        filtered_df = filtered_df[filtered_df['Type_budget'].isin(budget_types)]
+
+    if agregats:
+        filtered_df = filtered_df[filtered_df['Agregat'].isin(agregats)]
+
+    return filtered_df
+
+
+def budget_principal(filtered_df):
+    return filtered_df[filtered_df['Type_budget'].isin(BUDGETS_REFERENCE)]
+
+
+def _principal_cells(cube, dims, filters):
+    cells = cube.cells(list(dims) + ['Type_budget'], **filters)
+    return cells[cells['Type_budget'].isin(BUDGETS_REFERENCE)]
+
+
+def compute_kpis(cube, filters):
+    """
+    KPI de la vue d'ensemble (montants en €), lus dans le cube pré-agrégé
+    """
+    cells = _principal_cells(cube, ['Agregat'], filters)
+    montants = cells.groupby('Agregat')['Montant'].sum()
+    return {
+        'epargne_brute': montants.get(AGREGAT_EPARGNE, 0),
+        'recettes': montants.get(AGREGAT_RECETTES, 0),
+        'communes': cube.commune_counts(type_budgets=BUDGETS_REFERENCE, **filters),
+        'population': cells['Population'].sum(),
+    }
+
+
+def epci_table(cube, filters):
+    """
+    Métriques par EPCI : nombre de communes, population et indicateurs financiers (M€ et €)
+    """
+    cells = _principal_cells(cube, ['Nom_EPCI', 'Agregat'], filters)
+    cells = cells[cells['Nom_EPCI'].notna()]
+    if cells.empty:
+        return pd.DataFrame()
+
+    population = cells.groupby('Nom_EPCI', sort=False)['Population'].sum()
+    nombre_communes = cube.commune_counts(['Nom_EPCI'], type_budgets=BUDGETS_REFERENCE, **filters)
+    epci_df = pd.DataFrame({
+        'EPCI': population.index.to_numpy(),
+        'Nombre_communes': nombre_communes.reindex(population.index).fillna(0).astype(int).to_numpy(),
+        'Population_totale': population.to_numpy()
+    })
+
+    # Ajout des indicateurs financiers
+    montants = cells[cells['Agregat'].isin(EPCI_AGREGATS)]
+    montants = montants.groupby(['Nom_EPCI', 'Agregat'], sort=False)['Montant'].sum().unstack('Agregat')
+    for agregat in EPCI_AGREGATS:
+        if agregat in montants.columns:
+            values = montants[agregat].reindex(epci_df['EPCI']).fillna(0).to_numpy()
+        else:
+            values = 0
+        epci_df[f'{agregat}_M€'] = values / 1_000_000
+        epci_df[f'{agregat}_€'] = values
+
+    return epci_df
+
+
+def capacite_ranking(df_principal, ranking_index):
+    """
+    Capacité (+) ou besoin (-) de financement par habitant, communes classées par ordre décroissant
+    """
+    df_financement = df_principal[df_principal['Agregat'] == AGREGAT_CAPACITE]
+    df_financement = df_financement.dropna(subset=['Montant_par_habitant', 'Commune'])
+    return ranking_index.order(df_financement, 'Montant_par_habitant', group=AGREGAT_CAPACITE)
+
+
+def capacite_classements(df, ranking_index):
+    """
+    Classement de capacité de financement par habitant de chaque exercice (budget de
+    référence, une ligne par commune, positions 0..n-1), calculé une fois pour tout le jeu
+    """
+    classement = capacite_ranking(budget_principal(df), ranking_index)
+    return {exercice: rows.drop_duplicates('Commune').reset_index(drop=True)
+            for exercice, rows in classement.groupby('Exercice', sort=False)}
+
+
+def export_synthese(cube, filters):
+    """
+    Synthèse statistique de l'export (Métrique, Valeur), lue dans le cube pré-agrégé
+    """
+    cells = cube.cells(['Nom_EPCI', 'Commune', 'Agregat'], **filters)
+    synthese_data = {
+        'Métrique': ['Lignes de données', 'Communes uniques', 'EPCI représentés'],
+        'Valeur': [
+            int(cells['Lignes'].sum()),
+            cells['Commune'].nunique(),
+            cells['Nom_EPCI'].nunique()
+        ]
+    }
+
+    # Ajouter des métriques financières si disponibles
+    montants = cells.groupby('Agregat')['Montant'].sum()
+    for agregat in SYNTHESE_AGREGATS:
+        if agregat in montants.index:
+            total = montants[agregat] / 1_000_000
+            synthese_data['Métrique'].append(f"{agregat} (M€)")
+            synthese_data['Valeur'].append(f"{total:.2f}")
+
+    return pd.DataFrame(synthese_data)
+
+
+def classify_service(libelle):
+    """
+    Classification simplifiée des budgets annexes à partir de leur libellé
+    """
+    if isinstance(libelle, str):
+        libelle_lower = libelle.lower()
+        if 'eau' in libelle_lower:
+            return 'Eau'
+        elif 'assain' in libelle_lower:
+            return 'Assainissement'
+        elif 'pompe' in libelle_lower and ('funebre' in libelle_lower or 'funèbre' in libelle_lower):
+            return 'Pompes funèbres'
+        elif 'spanc' in libelle_lower:
+            return 'SPANC'
+        elif 'touris' in libelle_lower:
+            return 'Tourisme'
+    return 'Autres services'
+
+
+def build_depenses_panel(df):
+    """
+    Panel Dépenses/Recettes (budget principal) par commune et exercice, calculé une fois
+    pour tout le jeu de données. Dépenses = Recettes - Épargne brute (approximation).
+    Les colonnes _ligne_recettes et _ligne_epargne gardent l'index des lignes sources
+    pour appliquer ensuite les filtres de la sidebar.
+    """
+    keys = ['Commune', 'Exercice'] if 'Exercice' in df.columns else ['Commune']
+    df_principal = df[df['Type_budget'].isin(BUDGETS_REFERENCE)]
+
+    recettes = df_principal[df_principal['Agregat'] == AGREGAT_RECETTES]
+    recettes = recettes.drop_duplicates(keys)[keys + ['Montant', 'Population']]
+    recettes = recettes.rename(columns={'Montant': 'Recettes'}).rename_axis('_ligne_recettes').reset_index()
+
+    epargne = df_principal[df_principal['Agregat'] == AGREGAT_EPARGNE]
+    epargne = epargne.drop_duplicates(keys)[keys + ['Montant']]
+    epargne = epargne.rename(columns={'Montant': 'Épargne'}).rename_axis('_ligne_epargne').reset_index()
+
+    panel = recettes.merge(epargne, on=keys, how='inner')
+
+    # Dépenses = Recettes - Épargne (approximation)
+    panel['Dépenses'] = panel['Recettes'] - panel['Épargne']
+    panel['Population'] = panel['Population'].fillna(0)
+    population = panel['Population'].to_numpy(dtype=float)
+    recettes_values = panel['Recettes'].to_numpy(dtype=float)
+    depenses_values = panel['Dépenses'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        panel['Dépenses_par_habitant'] = np.where(population > 0, depenses_values / population, 0)
+        panel['Taux_depenses_recettes'] = np.where(recettes_values > 0, depenses_values / recettes_values * 100, 0)
+        panel['Solde'] = panel['Recettes'] - panel['Dépenses']
+        panel['Solde_par_habitant'] = panel['Solde'] / panel['Population']
+
+    return panel
+
+
+def depenses_view(panel, df_principal):
+    """
+    Lignes du panel dont les lignes recettes et épargne sont toutes deux présentes
+    dans le budget principal filtré
+    """
+    selected = df_principal.index
+    mask = panel['_ligne_recettes'].isin(selected) & panel['_ligne_epargne'].isin(selected)
+    return panel[mask]
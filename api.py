@@ -0,0 +1,245 @@
+# api.py - API JSON locale exposant les agrégats du dashboard
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import alerts
+import analyses
+import dataset_store
+import ofgl_data
+import similarity
+
+# Paramètres de filtre acceptés (répétables : ?commune=Cilaos&commune=Salazie)
+FILTER_PARAMS = {
+    'epci': 'epci',
+    'commune': 'communes',
+    'type_budget': 'budget_types',
+    'agregat': 'agregats',
+}
+
+CACHE_SIZE = 256
+MAX_AGE = 60
+
+
+def _records(frame, columns):
+    """
+    Lignes d'un DataFrame en dictionnaires JSON (NaN -> null)
+    """
+    columns = [col for col in columns if col in frame.columns]
+    frame = frame[columns].astype(object).where(frame[columns].notna(), None)
+    return frame.to_dict('records')
+
+
+def _json_default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def _principal(dataset, filters):
+    return analyses.budget_principal(analyses.apply_filters(dataset.df, **filters))
+
+
+# Points d'accès : même logique de calcul que le dashboard
+def kpis_endpoint(dataset, filters):
+    return analyses.compute_kpis(dataset.derived('cube'), filters)
+
+
+def epargne_endpoint(dataset, filters):
+    df_principal = _principal(dataset, filters)
+    df_epargne = df_principal[df_principal['Agregat'] == analyses.AGREGAT_EPARGNE]
+    ranked = dataset.derived('rankings').order(df_epargne, 'Montant', group=analyses.AGREGAT_EPARGNE)
+    return {
+        'total': df_epargne['Montant'].sum(),
+        'communes': _records(ranked, ['Commune', 'Nom_EPCI', 'Exercice', 'Montant', 'Montant_par_habitant']),
+    }
+
+
+def epci_endpoint(dataset, filters):
+    epci_df = analyses.epci_table(dataset.derived('cube'), filters)
+    return _records(epci_df, list(epci_df.columns))
+
+
+def capacite_endpoint(dataset, filters):
+    ranked = analyses.capacite_ranking(_principal(dataset, filters), dataset.derived('rankings'))
+    return _records(ranked, ['Commune', 'Nom_EPCI', 'Exercice', 'Montant', 'Montant_par_habitant'])
+
+
+def synthese_endpoint(dataset, filters):
+    df_depenses = analyses.depenses_view(dataset.derived('depenses_panel'), _principal(dataset, filters))
+    df_depenses = dataset.derived('depenses_rankings').order(df_depenses, 'Recettes')
+    return _records(df_depenses, ['Commune', 'Exercice', 'Population', 'Recettes', 'Dépenses', 'Épargne', 'Solde',
+                                  'Dépenses_par_habitant', 'Taux_depenses_recettes'])
+
+
+def alertes_endpoint(dataset, filters):
+    communes = _principal(dataset, filters)['Commune'].dropna().unique()
+    table = alerts.alert_view(dataset.derived('alerts'), communes)
+    return _records(table, alerts.ALERT_COLUMNS)
+
+
+def similaires_endpoint(dataset, filters):
+    index = dataset.derived('similarity')
+    communes = _principal(dataset, filters).dropna(subset=['Code_Commune']).drop_duplicates('Code_Commune')
+    return {
+        commune: _records(index.neighbours(code), similarity.TABLE_KEYS + ['Distance'] + index.features)
+        for commune, code in zip(communes['Commune'], communes['Code_Commune'])
+        if code in index
+    }
+
+
+ENDPOINTS = {
+    '/api/kpis': kpis_endpoint,
+    '/api/epargne': epargne_endpoint,
+    '/api/epci': epci_endpoint,
+    '/api/capacite': capacite_endpoint,
+    '/api/synthese': synthese_endpoint,
+    '/api/alertes': alertes_endpoint,
+    '/api/similaires': similaires_endpoint,
+}
+
+
+class ResponseCache:
+    """
+    Cache LRU des réponses sérialisées, indexé par (version des données, chemin, filtres)
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _filters(query):
+    params = parse_qs(query)
+    return {name: sorted(params.get(param, [])) for param, name in FILTER_PARAMS.items()}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = 'OFGLDashboardAPI/1.0'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+
+        if path == '/api/version':
+            dataset = self.server.store.current
+            return self._send_json(200, json.dumps({'version': dataset.version}).encode())
+
+        endpoint = ENDPOINTS.get(path)
+        if endpoint is None:
+            body = json.dumps({'erreur': 'point d\'accès inconnu', 'points_acces': sorted(ENDPOINTS)}).encode()
+            return self._send_json(404, body)
+
+        dataset = self.server.store.current
+        filters = _filters(url.query)
+        key = (dataset.version, path, json.dumps(filters, sort_keys=True))
+
+        entry = self.server.cache.get(key)
+        cache_status = 'HIT'
+        if entry is None:
+            cache_status = 'MISS'
+            try:
+                payload = endpoint(dataset, filters)
+            except Exception as e:
+                return self._send_json(500, json.dumps({'erreur': str(e)}).encode())
+            body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode()
+            etag = '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+            entry = (body, etag, dataset.modified_at)
+            self.server.cache.put(key, entry)
+
+        body, etag, modified_at = entry
+        headers = {
+            'ETag': etag,
+            'Last-Modified': formatdate(modified_at, usegmt=True),
+            'Cache-Control': f'public, max-age={self.server.max_age}',
+            'X-Cache': cache_status,
+        }
+
+        if self._not_modified(etag, modified_at):
+            return self._send_json(304, b'', headers)
+        return self._send_json(200, body, headers)
+
+    def _not_modified(self, etag, modified_at):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(modified_at) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send_json(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=8600, store=None, cache_size=CACHE_SIZE, max_age=MAX_AGE):
+    """
+    Serveur HTTP de l'API (le jeu de données est surveillé et rechargé comme dans le dashboard)
+    """
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.store = store or dataset_store.DatasetStore(arrow_path=os.environ.get(ofgl_data.ARROW_ENV_VAR)).start()
+    server.cache = ResponseCache(cache_size)
+    server.max_age = max_age
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON locale des agrégats du dashboard")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="Nombre de réponses gardées en cache")
+    parser.add_argument('--max-age', type=int, default=MAX_AGE, help="Durée Cache-Control max-age (secondes)")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, cache_size=args.cache_size, max_age=args.max_age)
+    print(f"API disponible sur http://{args.host}:{args.port} : {', '.join(sorted(ENDPOINTS))}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# charts.py - Graphiques de distribution adaptés au volume de données
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Au-delà de ce nombre de lignes, les distributions sont résumées côté serveur
+ROW_THRESHOLD = 5_000
+
+# Nombre maximal de points envoyés au navigateur pour un nuage de points
+SCATTER_MAX_POINTS = 20_000
+
+
+def histogram(df, x, nbins=20, title=None, labels=None, color='#3B82F6'):
+    """
+    Histogramme : calcul des classes avec NumPy au-delà du seuil, seuls les effectifs
+    par classe sont envoyés au navigateur
+    """
+    if len(df) <= ROW_THRESHOLD:
+        return px.histogram(df, x=x, nbins=nbins, title=title, labels=labels,
+                            color_discrete_sequence=[color])
+
+    values = pd.to_numeric(df[x], errors='coerce').to_numpy(dtype=float)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=nbins)
+
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        marker_color=color,
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate="%{customdata[0]:,.0f} - %{customdata[1]:,.0f} : %{y}<extra></extra>"
+    ))
+    fig.update_layout(title=title, bargap=0, xaxis_title=(labels or {}).get(x, x))
+    return fig
+
+
+def _box_stats(values):
+    """
+    Quartiles et moustaches (1,5 x écart interquartile, bornées aux données)
+    """
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    lower = values[values >= q1 - 1.5 * iqr].min()
+    upper = values[values <= q3 + 1.5 * iqr].max()
+    return q1, median, q3, lower, upper, values.mean()
+
+
+def box(df, x, y, title=None, points="all"):
+    """
+    Boîtes à moustaches par catégorie : au-delà du seuil, les quartiles sont calculés
+    côté serveur et seules les statistiques sont envoyées (sans les points)
+    """
+    if len(df) <= ROW_THRESHOLD:
+        return px.box(df, x=x, y=y, title=title, points=points, color=x)
+
+    fig = go.Figure()
+    frame = df[[x, y]].copy()
+    frame[y] = pd.to_numeric(frame[y], errors='coerce')
+    frame = frame.dropna()
+
+    for category, values in frame.groupby(x, sort=True)[y]:
+        q1, median, q3, lower, upper, mean = _box_stats(values.to_numpy(dtype=float))
+        fig.add_trace(go.Box(
+            name=str(category),
+            x=[str(category)],
+            q1=[q1], median=[median], q3=[q3],
+            lowerfence=[lower], upperfence=[upper],
+            mean=[mean],
+            boxpoints=False
+        ))
+    fig.update_layout(title=title, showlegend=True)
+    return fig
+
+
+def sample_points(df, max_points=SCATTER_MAX_POINTS):
+    """
+    Échantillon aléatoire reproductible (graine fixe) pour limiter le nombre de points
+    """
+    if len(df) <= max_points:
+        return df
+    return df.sample(n=max_points, random_state=0)
+
+
+def scatter(df, x, y, max_points=SCATTER_MAX_POINTS, **kwargs):
+    """
+    Nuage de points : rendu WebGL au-delà du seuil et sous-échantillonnage au-delà de max_points
+    """
+    if len(df) <= ROW_THRESHOLD:
+        return px.scatter(df, x=x, y=y, **kwargs)
+
+    sampled = sample_points(df, max_points)
+    fig = px.scatter(sampled, x=x, y=y, render_mode='webgl', **kwargs)
+    if len(sampled) < len(df):
+        fig.add_annotation(
+            text=f"Échantillon de {len(sampled):,} points sur {len(df):,}",
+            xref='paper', yref='paper', x=1, y=1.08, showarrow=False
+        )
+    return fig
+
+
+def capacite_bar(classement, height=500):
+    """
+    Capacité (+) ou besoin (-) de financement par habitant, une barre par commune classée
+    """
+    fig = px.bar(
+        classement,
+        x='Commune',
+        y='Montant_par_habitant',
+        color='Montant_par_habitant',
+        color_continuous_scale=['#EF4444', '#FBBF24', '#10B981'],
+        title="Capacité (+) ou Besoin (-) de Financement par Habitant",
+        labels={'Montant_par_habitant': '€ par habitant', 'Commune': 'Commune'}
+    )
+    fig.update_layout(height=height, xaxis_tickangle=45)
+    return fig
@@ -0,0 +1,92 @@
+# consolidation.py - Vue consolidée : tous les budgets (principal et annexes) de chaque commune additionnés
+import numpy as np
+import pandas as pd
+
+import analyses
+
+# Colonnes propres à un budget, remplacées dans la vue consolidée
+BUDGET_COLUMNS = ['Siret_Budget', 'Libelle_Budget', 'Type_budget', 'code_type_budget', 'Nomenclature',
+                  'Categorie', 'Code_Siren_Collectivite', 'Code_Insee_Collectivite']
+SUMMED_COLUMNS = ['Montant', 'Montant_millions']
+
+LIBELLE_CONSOLIDE = 'BUDGET CONSOLIDÉ'
+
+
+def _commune_key(df):
+    return 'Code_Commune' if 'Code_Commune' in df.columns else 'Commune'
+
+
+class BudgetIndex:
+    """
+    Budgets de chaque commune (Siret, libellé, type), calculés une fois par version des données
+    """
+
+    def __init__(self, df):
+        self.key = _commune_key(df)
+        columns = [col for col in [self.key, 'Commune', 'Siret_Budget', 'Libelle_Budget', 'Type_budget']
+                   if col in df.columns]
+        budgets = df[columns].dropna(subset=[self.key]).drop_duplicates(subset=[self.key, 'Siret_Budget'])
+        # Budget principal en tête, puis budgets annexes par libellé
+        budgets = budgets.assign(_annexe=budgets['Type_budget'] != analyses.BUDGET_PRINCIPAL)
+        budgets = budgets.sort_values([self.key, '_annexe', 'Libelle_Budget'], kind='stable')
+        self.table = budgets.drop(columns='_annexe').reset_index(drop=True)
+
+        codes = self.table[self.key].to_numpy()
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(codes)]
+        self._ranges = {code: (start, stop) for code, start, stop in zip(codes[starts], starts, stops)}
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def budgets(self, code):
+        """
+        Budgets d'une commune (tableau vide si inconnue)
+        """
+        start, stop = self._ranges.get(code, (0, 0))
+        return self.table.iloc[start:stop]
+
+    def counts(self):
+        """
+        Nombre de budgets par commune
+        """
+        return pd.Series({code: stop - start for code, (start, stop) in self._ranges.items()}, name='Nombre_budgets')
+
+
+def build_consolidated(df, budget_index):
+    """
+    Une ligne par commune, exercice et agrégat : montants additionnés sur tous les budgets
+    de la commune (Type_budget = Budget consolidé), caractéristiques et population tirées
+    du budget principal, montant par habitant recalculé
+    """
+    key = budget_index.key
+    keys = [col for col in [key, 'Exercice', 'Agregat'] if col in df.columns]
+    rows = df.dropna(subset=[key])
+    if rows.empty:
+        return df.iloc[0:0].assign(Nombre_budgets=pd.Series(dtype=int))
+
+    # Caractéristiques de la commune : ligne du budget principal en priorité
+    annexe = (rows['Type_budget'] != analyses.BUDGET_PRINCIPAL).to_numpy()
+    order = np.argsort(annexe, kind='stable')
+    attributes = rows.iloc[order].drop_duplicates(subset=keys)
+    attributes = attributes.drop(columns=[col for col in BUDGET_COLUMNS + SUMMED_COLUMNS if col in attributes.columns])
+
+    summed = [col for col in SUMMED_COLUMNS if col in rows.columns]
+    sums = rows.groupby(keys, dropna=False, sort=False)[summed].sum(min_count=1)
+    consolidated = attributes.join(sums, on=keys)
+
+    # Un budget fictif par commune (sans SIRET) pour les niveaux budget du cube et le détail
+    consolidated['Type_budget'] = analyses.BUDGET_CONSOLIDE
+    consolidated['Libelle_Budget'] = LIBELLE_CONSOLIDE
+    if 'Siret_Budget' in df.columns:
+        consolidated['Siret_Budget'] = None
+    if 'Montant_par_habitant' in consolidated.columns and 'Population' in consolidated.columns:
+        population = consolidated['Population'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            consolidated['Montant_par_habitant'] = np.where(
+                population > 0, consolidated['Montant'].to_numpy(dtype=float) / population, np.nan
+            ).round(2)
+    consolidated['Nombre_budgets'] = consolidated[key].map(budget_index.counts()).fillna(0).astype(int)
+
+    columns = [col for col in df.columns if col in consolidated.columns] + ['Nombre_budgets']
+    return consolidated[columns].sort_values(keys, kind='stable').reset_index(drop=True)
@@ -0,0 +1,118 @@
+# cube.py - Cube pré-agrégé : EPCI → commune → budget, par type de budget, agrégat et exercice
+import numpy as np
+
+# Niveaux de consolidation, du plus agrégé au plus fin. Type_budget, Agregat et Exercice
+# sont conservés à tous les niveaux pour servir les filtres de la sidebar.
+LEVELS = {
+    'total': [],
+    'epci': ['Nom_EPCI'],
+    'commune': ['Nom_EPCI', 'Commune'],
+    'budget': ['Nom_EPCI', 'Commune', 'Siret_Budget', 'Libelle_Budget'],
+}
+CROSS_KEYS = ['Type_budget', 'Agregat', 'Exercice']
+MEASURES = ['Montant', 'Population', 'Lignes']
+
+# Paramètres de filtre (mêmes noms que analyses.apply_filters) -> dimension du cube
+FILTER_DIMENSIONS = {
+    'epci': 'Nom_EPCI',
+    'communes': 'Commune',
+    'budget_types': 'Type_budget',
+    'agregats': 'Agregat',
+    'exercices': 'Exercice',
+}
+
+
+class Cube:
+    """
+    Sommes de Montant et Population (et nombre de lignes) pré-calculées à chaque niveau
+    de la hiérarchie. Le niveau le plus fin est agrégé une fois depuis les lignes brutes,
+    chaque niveau supérieur depuis le précédent. Un total ne parcourt que les cellules
+    du niveau le plus agrégé qui porte les dimensions demandées.
+    """
+
+    def __init__(self, df):
+        levels = {}
+        finer = df.assign(Lignes=1)
+        for name in reversed(list(LEVELS)):
+            keys = [col for col in LEVELS[name] + CROSS_KEYS if col in df.columns]
+            finer = finer.groupby(keys, dropna=False, sort=False)[MEASURES].sum().reset_index()
+            levels[name] = finer
+        self.levels = {name: levels[name] for name in LEVELS}
+
+        # Valeurs présentes par dimension : une sélection complète ne filtre rien
+        self._values = {}
+        for dim in FILTER_DIMENSIONS.values():
+            if dim in df.columns:
+                self._values[dim] = (set(df[dim].dropna().unique()), bool(df[dim].isna().any()))
+
+    def _active_filters(self, filters):
+        active = {}
+        for name, values in filters.items():
+            dim = FILTER_DIMENSIONS[name]
+            if not values or dim not in self._values:
+                continue
+            present, has_na = self._values[dim]
+            # isin() écarte les valeurs manquantes : la sélection complète ne filtre rien
+            # seulement si la dimension n'en contient pas
+            if not has_na and present <= set(values):
+                continue
+            active[dim] = values
+        return active
+
+    def cells(self, dims=(), **filters):
+        """
+        Cellules du niveau le plus agrégé portant `dims` et les dimensions filtrées,
+        restreintes aux filtres (sélection vide = pas de filtre, comme dans la sidebar)
+        """
+        active = self._active_filters(filters)
+        needed = set(dims) | set(active)
+        for name, level in self.levels.items():
+            if needed <= set(level.columns):
+                break
+        else:
+            raise KeyError(f"Dimensions absentes du cube : {sorted(needed - set(level.columns))}")
+
+        if not active:
+            return level
+        mask = np.ones(len(level), dtype=bool)
+        for dim, values in active.items():
+            mask &= level[dim].isin(values).to_numpy()
+        return level[mask]
+
+    def totals(self, by, measures=('Montant',), **filters):
+        """
+        Totaux des mesures par `by` (liste de dimensions)
+        """
+        cells = self.cells(by, **filters)
+        return cells.groupby(by, dropna=False, sort=False)[list(measures)].sum()
+
+    def commune_counts(self, by=(), type_budgets=None, **filters):
+        """
+        Nombre de communes distinctes dans les cellules filtrées (et des types de budget donnés),
+        au total ou par `by`
+        """
+        cells = self.cells(list(by) + ['Commune', 'Type_budget'], **filters)
+        if type_budgets is not None:
+            cells = cells[cells['Type_budget'].isin(type_budgets)]
+        if by:
+            return cells.groupby(list(by), sort=False)['Commune'].nunique()
+        return cells['Commune'].nunique()
+
+    def drilldown(self, filters=None, epci=None, commune=None):
+        """
+        Détail d'un niveau : communes d'un EPCI, budgets d'une commune, ou EPCI si rien n'est choisi.
+        Une ligne par enfant, une colonne de montant par agrégat.
+        """
+        filters = filters or {}
+        if commune is not None:
+            keys, filters = ['Commune', 'Siret_Budget', 'Libelle_Budget', 'Type_budget'], dict(filters, communes=[commune])
+        elif epci is not None:
+            keys, filters = ['Commune'], dict(filters, epci=[epci])
+        else:
+            keys = ['Nom_EPCI']
+
+        cells = self.cells(keys + ['Agregat'], **filters)
+        if cells.empty:
+            return cells[keys]
+        table = cells.groupby(keys + ['Agregat'], dropna=False, sort=False)['Montant'].sum().unstack('Agregat')
+        return table.rename_axis(columns=None).reset_index()
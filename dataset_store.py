@@ -0,0 +1,288 @@
+# dataset_store.py - Jeu de données versionné, index dérivés et rechargement à chaud
+import os
+import threading
+import time
+
+import alerts
+import analyses
+import consolidation
+import cube
+import debt
+import deltas
+import extracts
+import geo
+import incremental
+import ofgl_data
+import peers
+import rankings
+import scenarios
+import search
+import similarity
+
+# Intervalle de surveillance du fichier source (secondes)
+POLL_INTERVAL = 5.0
+
+
+def _national_table(dataset, name, build):
+    """
+    Table construite sur le fichier national ; en mode Arrow partagé, matérialisée
+    une fois par version à côté du fichier principal
+    """
+    if dataset.arrow_path:
+        table_path = ofgl_data.shared_table_path(dataset.arrow_path, name)
+        return ofgl_data.load_shared_table(table_path, build, dataset.source_path)
+    return build()
+
+
+def _build_peer_index(dataset):
+    build = lambda: peers.build_peer_table(dataset.derived('national'))
+    return peers.PeerIndex(_national_table(dataset, 'peers', build))
+
+
+def _build_similarity_index(dataset):
+    build = lambda: similarity.build_feature_table(dataset.derived('national'))
+    return similarity.SimilarityIndex(_national_table(dataset, 'similarity', build))
+
+
+# Entrées intermédiaires : construites seulement quand un index en a besoin (le fichier national
+# n'est pas relu si les tables Arrow partagées sont à jour), libérées à la fin de warm()
+INTERMEDIATE_BUILDERS = ['national']
+
+
+# Index tirés de fichiers annexes (GeoJSON, extraits EPCI / syndicats, fichier national) : leur
+# échec est signalé mais n'empêche pas de publier une nouvelle version. L'échec de tout autre
+# index fait garder la version précédente.
+OPTIONAL_BUILDERS = ['geo', 'extracts', 'peers', 'similarity']
+
+
+def _index_error(errors):
+    """
+    Erreur résumant les index dérivés non construits (None si aucun)
+    """
+    if not errors:
+        return None
+    first = next(iter(errors.values()))
+    return RuntimeError(f"Index dérivés non construits ({', '.join(errors)}) : {first}")
+
+
+# Index de la vue consolidée repris de la vue par budget (sans rapport avec le regroupement des budgets)
+CONSOLIDATED_SHARED = ['budgets', 'geo', 'extracts', 'peers', 'similarity', 'search_communes', 'search_epci']
+
+
+def _build_consolidated(dataset):
+    """
+    Vue consolidée : un Dataset enfant sur les sommes de tous les budgets de chaque commune,
+    avec ses propres index (cube, classements, dette...), construits avec ceux du parent.
+    Passer d'un périmètre à l'autre ne fait que choisir l'un des deux jeux.
+    """
+    builders = {name: build for name, build in dataset._builders.items() if name != 'consolidated'}
+    builders.update({name: (lambda child, name=name: dataset.derived(name))
+                     for name in CONSOLIDATED_SHARED if name in builders})
+    builders['debt'] = lambda child: debt.build_debt_panel(child.df, type_budget=analyses.BUDGET_CONSOLIDE)
+
+    df = consolidation.build_consolidated(dataset.df, dataset.derived('budgets'))
+    child = Dataset(df, dataset.version, dataset.source_path, builders=builders)
+    required = child.warm(required_only=True)
+    if required:
+        raise _index_error(required) from next(iter(required.values()))
+    return child
+
+
+# Index dérivés du jeu de données, construits une fois par version
+DERIVED_BUILDERS = {
+    'rankings': lambda dataset: rankings.RankingIndex(
+        dataset.df, ['Montant', 'Montant_par_habitant'], group_col='Agregat'
+    ),
+    'capacite_classements': lambda dataset: analyses.capacite_classements(dataset.df, dataset.derived('rankings')),
+    'depenses_panel': lambda dataset: analyses.build_depenses_panel(dataset.df),
+    'depenses_rankings': lambda dataset: rankings.RankingIndex(
+        dataset.derived('depenses_panel'), analyses.DEPENSES_METRICS
+    ),
+    'cube': lambda dataset: cube.Cube(dataset.df),
+    'partials': lambda dataset: incremental.PartialAggregates(dataset.derived('cube')),
+    'deltas': lambda dataset: deltas.DeltaIndex(dataset.df),
+    'debt': lambda dataset: debt.build_debt_panel(dataset.df),
+    'scenarios': lambda dataset: scenarios.ScenarioBase(dataset.derived('debt')),
+    'alerts': lambda dataset: alerts.build_alert_table(dataset.df, dataset.derived('debt')),
+    'geo': lambda dataset: geo.load_geo_index(dataset.df),
+    'national': lambda dataset: peers.load_national(dataset.source_path),
+    'extracts': lambda dataset: extracts.load_extracts(dataset.df, dataset.source_path),
+    'peers': _build_peer_index,
+    'similarity': _build_similarity_index,
+    'search_communes': lambda dataset: search.SearchIndex(dataset.df, 'Commune', 'Code_Commune'),
+    'search_epci': lambda dataset: search.SearchIndex(dataset.df, 'Nom_EPCI', 'Code_EPCI'),
+    'budgets': lambda dataset: consolidation.BudgetIndex(dataset.df),
+    'consolidated': _build_consolidated,
+}
+
+
+class Dataset:
+    """
+    Une version du jeu de données nettoyé (identifiée par l'identité du fichier source)
+    et ses index dérivés, calculés à la première demande puis conservés
+    """
+
+    def __init__(self, df, version, source_path=ofgl_data.SOURCE_PATH, arrow_path=None,
+                 builders=DERIVED_BUILDERS):
+        self.df = df
+        self.version = version
+        self.source_path = source_path
+        self.arrow_path = arrow_path
+        # Date de dernière modification des données (fichier source, sinon date de chargement)
+        self.modified_at = os.path.getmtime(source_path) if os.path.exists(source_path) else time.time()
+        self._builders = builders
+        self._derived = {}
+        self._lock = threading.RLock()
+        # Erreurs de construction relevées par warm() ({nom: exception})
+        self.errors = {}
+
+    def derived(self, name):
+        """
+        Index dérivé `name` de cette version (construit au premier appel)
+        """
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = self._builders[name](self)
+            return self._derived[name]
+
+    def optional(self, name):
+        """
+        Index facultatif `name` : None si sa construction a échoué pour cette version.
+        L'échec est gardé dans errors, l'index n'est pas reconstruit à chaque demande.
+        """
+        with self._lock:
+            if name in self.errors:
+                return None
+            try:
+                return self.derived(name)
+            except Exception as e:
+                self.errors[name] = e
+                return None
+
+    def built_derived(self):
+        """
+        Index dérivés déjà construits (sans déclencher de construction)
+        """
+        with self._lock:
+            return dict(self._derived)
+
+    def warm(self, required_only=False):
+        """
+        Construit tous les index dérivés et renvoie les erreurs de construction
+        (seulement celles des index obligatoires avec required_only). Un index en
+        échec sera reconstruit (et son erreur remontée) à sa première utilisation.
+        """
+        errors = {}
+        for name in self._builders:
+            if name in INTERMEDIATE_BUILDERS:
+                continue
+            try:
+                self.derived(name)
+            except Exception as e:
+                errors[name] = e
+        with self._lock:
+            for name in INTERMEDIATE_BUILDERS:
+                self._derived.pop(name, None)
+        self.errors = errors
+        if required_only:
+            return {name: e for name, e in errors.items() if name not in OPTIONAL_BUILDERS}
+        return errors
+
+
+class DatasetStore:
+    """
+    Version courante du jeu de données, surveillée sur disque. Quand le fichier source
+    change, la nouvelle version et ses index sont construits sur un thread d'arrière-plan
+    puis publiés par simple échange de référence : les sessions en cours continuent
+    d'utiliser l'ancienne version jusqu'à ce que la nouvelle soit prête.
+    """
+
+    def __init__(self, source_path=ofgl_data.SOURCE_PATH, arrow_path=None,
+                 builders=DERIVED_BUILDERS, poll_interval=POLL_INTERVAL):
+        # Chemin demandé, résolu à chaque vérification (un .csv remplacé par un .csv.gz, ou l'inverse)
+        self.requested_path = source_path
+        self.source_path = ofgl_data.find_source(source_path)
+        self.arrow_path = arrow_path
+        self.poll_interval = poll_interval
+        self.last_error = None
+        self._builders = builders
+        self._pending_version = None
+        # Identité dont la construction a échoué : pas de nouvel essai tant qu'elle ne change pas
+        self._failed_version = None
+        self._stop = threading.Event()
+        self._watcher = None
+        # Au démarrage, il n'y a pas de version précédente à servir : on publie malgré les échecs
+        self._current = self._build(ofgl_data.source_version(self.source_path), self.source_path, required=False)
+        self.last_error = _index_error(self._current.errors)
+
+    @property
+    def current(self):
+        return self._current
+
+    def _load(self, source_path):
+        if self.arrow_path:
+            return ofgl_data.load_shared_dataset(self.arrow_path, source_path)
+        return ofgl_data.load_dataset(source_path)
+
+    def _build(self, version, source_path, required=True):
+        """
+        Charge une version et construit ses index. Avec required, l'échec d'un index
+        obligatoire lève une erreur (la version n'est pas publiée).
+        """
+        dataset = Dataset(self._load(source_path), version, source_path, self.arrow_path, self._builders)
+        errors = dataset.warm(required_only=required)
+        if required and errors:
+            raise _index_error(errors) from next(iter(errors.values()))
+        return dataset
+
+    def check(self):
+        """
+        Reconstruit le jeu si le fichier source a changé. Une nouvelle identité doit être
+        observée deux fois de suite (fichier en cours de copie). Renvoie True si une
+        nouvelle version a été publiée. Une identité en échec n'est pas reconstruite à chaque
+        vérification : on attend que le fichier change à nouveau.
+        """
+        source_path = ofgl_data.find_source(self.requested_path)
+        version = ofgl_data.source_version(source_path)
+        if version is None or version == self._current.version:
+            self._pending_version = None
+            return False
+        if version == self._failed_version:
+            return False
+
+        if version != self._pending_version:
+            self._pending_version = version
+            return False
+
+        try:
+            dataset = self._build(version, source_path)
+        except Exception as e:
+            # On continue à servir l'ancienne version
+            self.last_error = e
+            self._failed_version = version
+            self._pending_version = None
+            return False
+
+        self.source_path = source_path
+        self._current = dataset
+        self._pending_version = None
+        self._failed_version = None
+        # Index facultatifs en échec : version publiée, erreur signalée
+        self.last_error = _index_error(dataset.errors)
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.check()
+
+    def start(self):
+        """
+        Démarre la surveillance du fichier source
+        """
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name='ofgl-dataset-watcher', daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,87 @@
+# debt.py - Indicateurs de soutenabilité de la dette par commune et exercice
+import numpy as np
+import pandas as pd
+
+import analyses
+
+AGREGAT_ENCOURS = 'Encours de dette'
+AGREGAT_ANNUITE = 'Annuité de la dette'
+
+DEBT_AGREGATS = {
+    AGREGAT_ENCOURS: 'Encours',
+    AGREGAT_ANNUITE: 'Annuite',
+    analyses.AGREGAT_EPARGNE: 'Epargne_brute',
+    analyses.AGREGAT_RECETTES: 'Recettes',
+}
+
+# Seuil usuel d'alerte de la capacité de désendettement des communes (en années)
+SEUIL_DESENDETTEMENT = 12
+
+DEBT_METRICS = ['Capacite_desendettement', 'Dette_par_habitant', 'Poids_annuite']
+
+PANEL_KEYS = ['Code_Commune', 'Commune', 'Nom_EPCI', 'Exercice']
+
+
+def build_debt_panel(df, type_budget=analyses.BUDGET_PRINCIPAL):
+    """
+    Panel commune x exercice des indicateurs de dette, calculé en une passe vectorisée :
+    - Capacite_desendettement : encours / épargne brute (années, NaN si épargne <= 0)
+    - Dette_par_habitant : encours / population (€)
+    - Poids_annuite : annuité / recettes totales (%)
+    et leur évolution par rapport à l'exercice précédent (colonnes *_evol).
+    type_budget=None additionne tous les budgets de la commune.
+    """
+    keys = [col for col in PANEL_KEYS if col in df.columns]
+    rows = df[df['Agregat'].isin(list(DEBT_AGREGATS))]
+    if type_budget is not None:
+        rows = rows[rows['Type_budget'] == type_budget]
+
+    if rows.empty or not (rows['Agregat'] == AGREGAT_ENCOURS).any():
+        return pd.DataFrame(columns=keys + list(DEBT_AGREGATS.values()) + ['Population'] + DEBT_METRICS)
+
+    # Une colonne par agrégat (somme des budgets retenus)
+    panel = rows.groupby(keys + ['Agregat'], dropna=False)['Montant'].sum().unstack('Agregat')
+    panel = panel.rename(columns=DEBT_AGREGATS).reindex(columns=list(DEBT_AGREGATS.values()))
+
+    # Population de la commune (budget retenu, sinon principal : identique pour tous ses budgets)
+    population_rows = df[df['Type_budget'] == (type_budget or analyses.BUDGET_PRINCIPAL)]
+    population = population_rows.groupby(keys, dropna=False)['Population'].first()
+    panel['Population'] = population.reindex(panel.index)
+    panel = panel.reset_index()
+
+    encours = panel['Encours'].to_numpy(dtype=float)
+    epargne = panel['Epargne_brute'].to_numpy(dtype=float)
+    annuite = panel['Annuite'].to_numpy(dtype=float)
+    recettes = panel['Recettes'].to_numpy(dtype=float)
+    habitants = panel['Population'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        panel['Capacite_desendettement'] = np.where(epargne > 0, encours / epargne, np.nan)
+        panel['Dette_par_habitant'] = np.where(habitants > 0, encours / habitants, np.nan)
+        panel['Poids_annuite'] = np.where(recettes > 0, annuite / recettes * 100, np.nan)
+
+    # Évolution N / N-1 : différences décalées sur le panel trié par commune puis exercice
+    if 'Exercice' in panel.columns:
+        panel = panel.sort_values(['Commune', 'Exercice'], kind='stable').reset_index(drop=True)
+        commune = panel['Commune'].to_numpy()
+        exercice = panel['Exercice'].to_numpy(dtype=float)
+        previous = np.zeros(len(panel), dtype=bool)
+        previous[1:] = (commune[1:] == commune[:-1]) & (exercice[1:] == exercice[:-1] + 1)
+
+        for metric in ['Encours'] + DEBT_METRICS:
+            values = panel[metric].to_numpy(dtype=float)
+            evol = np.full(len(panel), np.nan)
+            evol[1:] = values[1:] - values[:-1]
+            panel[f'{metric}_evol'] = np.where(previous, evol, np.nan)
+
+    return panel
+
+
+def debt_view(panel, communes, exercice=None):
+    """
+    Lignes du panel pour les communes sélectionnées (et un exercice donné)
+    """
+    view = panel[panel['Commune'].isin(communes)]
+    if exercice is not None and 'Exercice' in view.columns:
+        view = view[view['Exercice'] == exercice]
+    return view
@@ -0,0 +1,113 @@
+# deltas.py - Évolutions N / N-1 et taux de croissance annuel moyen, calculés une fois par version
+import numpy as np
+import pandas as pd
+
+import analyses
+
+# Agrégats suivis dans les KPI d'évolution
+DELTA_AGREGATS = [analyses.AGREGAT_EPARGNE, analyses.AGREGAT_CAPACITE, analyses.AGREGAT_IMPOTS,
+                  analyses.AGREGAT_RECETTES]
+
+# Une série = un budget (SIRET) d'une commune pour un agrégat, suivie d'exercice en exercice
+SERIES_KEYS = ['Commune', 'Siret_Budget', 'Agregat']
+VALUE_COLS = ['Montant', 'Montant_par_habitant']
+
+
+def _growth(values, previous, first, has_previous, years):
+    """
+    Écart absolu et relatif (%) avec l'exercice précédent, taux de croissance annuel
+    moyen (%) depuis le premier exercice de la série (valeurs positives uniquement)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        evol = np.where(has_previous, values - previous, np.nan)
+        evol_pct = np.where(has_previous & (previous != 0), evol / np.abs(previous) * 100, np.nan)
+        tcam = np.where((years > 0) & (first > 0) & (values > 0),
+                        (np.power(values / first, 1 / np.maximum(years, 1)) - 1) * 100, np.nan)
+    return evol, evol_pct, tcam
+
+
+class DeltaIndex:
+    """
+    Évolutions de chaque ligne du jeu de données par rapport à l'exercice précédent
+    de la même série. Le jeu est trié une seule fois (commune, budget, agrégat, exercice) ;
+    les écarts sont des différences décalées sur ce tri. Une année manquante interrompt
+    l'écart N-1 (NaN) mais pas le taux de croissance annuel moyen.
+    Colonnes : {col}_evol, {col}_evol_pct, {col}_tcam pour Montant et Montant_par_habitant.
+    """
+
+    def __init__(self, df, value_cols=VALUE_COLS, series_keys=SERIES_KEYS):
+        keys = [col for col in series_keys if col in df.columns]
+        value_cols = [col for col in value_cols if col in df.columns]
+        n = len(df)
+
+        codes = [pd.factorize(df[key], use_na_sentinel=True)[0] for key in keys]
+        exercice = df['Exercice'].to_numpy(dtype=float)
+        order = np.lexsort([exercice] + codes[::-1])
+
+        sorted_exercice = exercice[order]
+        same_series = np.ones(max(n - 1, 0), dtype=bool)
+        for code in codes:
+            sorted_code = code[order]
+            same_series &= sorted_code[1:] == sorted_code[:-1]
+        new_series = np.ones(n, dtype=bool)
+        new_series[1:] = ~same_series
+
+        has_previous = np.zeros(n, dtype=bool)
+        has_previous[1:] = ~new_series[1:] & (sorted_exercice[1:] == sorted_exercice[:-1] + 1)
+
+        # Premier exercice de la série de chaque ligne
+        starts = np.flatnonzero(new_series)
+        first_position = starts[np.cumsum(new_series) - 1] if n else np.zeros(0, dtype=int)
+        years = sorted_exercice - sorted_exercice[first_position]
+
+        columns = {}
+        for col in value_cols:
+            values = df[col].to_numpy(dtype=float)[order]
+            previous = np.full(n, np.nan)
+            previous[1:] = values[:-1]
+            for name, result in zip(['evol', 'evol_pct', 'tcam'],
+                                    _growth(values, previous, values[first_position], has_previous, years)):
+                # Retour à l'ordre des lignes du jeu
+                aligned = np.empty(n)
+                aligned[order] = result
+                columns[f'{col}_{name}'] = aligned
+
+        self.table = pd.DataFrame(columns, index=df.index)
+
+    def for_rows(self, frame):
+        """
+        Évolutions alignées sur les lignes de `frame` (sous-ensemble du jeu de données)
+        """
+        return self.table.reindex(frame.index)
+
+
+def kpi_evolution(cube, filters, agregats=DELTA_AGREGATS):
+    """
+    Totaux du budget principal par agrégat pour le dernier exercice filtré, écarts avec
+    l'exercice précédent et taux de croissance annuel moyen depuis le premier exercice.
+    Vide si moins de deux exercices.
+    """
+    cells = cube.cells(['Agregat', 'Exercice', 'Type_budget'], **filters)
+    cells = cells[cells['Type_budget'].isin(analyses.BUDGETS_REFERENCE) & cells['Agregat'].isin(agregats)]
+    totals = cells.groupby(['Agregat', 'Exercice'])['Montant'].sum().unstack('Exercice')
+    exercices = sorted(totals.columns)
+    if len(exercices) < 2:
+        return pd.DataFrame()
+
+    last, previous, first = exercices[-1], exercices[-2], exercices[0]
+    values = totals[last].to_numpy(dtype=float)
+    evol, evol_pct, tcam = _growth(
+        values,
+        totals[previous].to_numpy(dtype=float),
+        totals[first].to_numpy(dtype=float),
+        np.full(len(totals), previous == last - 1),
+        np.full(len(totals), float(last - first))
+    )
+    return pd.DataFrame({
+        'Exercice': last,
+        'Exercice_precedent': previous,
+        'Montant': values,
+        'Montant_evol': evol,
+        'Montant_evol_pct': evol_pct,
+        'Montant_tcam': tcam,
+    }, index=totals.index).reindex([agregat for agregat in agregats if agregat in totals.index])
@@ -0,0 +1,126 @@
+# embed.py - Mode intégration : une seule section du dashboard, adressée par l'URL (iframe)
+import streamlit as st
+
+import analyses
+import api
+import charts
+import fiches
+import tables
+
+# Section demandée (?section=capacite). Le paramètre `embed` est réservé par Streamlit :
+# ?embed=true masque en plus l'en-tête et le menu de l'application.
+SECTION_PARAM = 'section'
+
+# Périmètre budgétaire (?perimetre=consolide pour la vue consolidée)
+PERIMETRE_PARAM = 'perimetre'
+PERIMETRE_CONSOLIDE = 'consolide'
+
+# Résultats calculés gardés par (version, périmètre, section, filtres), partagés entre sessions
+CACHE_SIZE = 256
+
+EPCI_COLUMNS = {
+    'EPCI': 'EPCI',
+    'Nombre_communes': 'Nb Communes',
+    'Population_totale': 'Population',
+    'Epargne brute_M€': 'Épargne brute (M€)',
+    'Capacité ou besoin de financement_M€': 'Capacité/Besoin (M€)',
+    'Impôts et taxes_M€': 'Impôts/Taxes (M€)'
+}
+
+_results = api.ResponseCache(CACHE_SIZE)
+
+
+def requested(query_params):
+    """
+    Section demandée par l'URL (None hors mode intégration)
+    """
+    return query_params.get(SECTION_PARAM) or None
+
+
+def filters_from_params(query_params):
+    """
+    Filtres de l'URL, mêmes paramètres répétables que l'API (?commune=Cilaos&commune=Salazie)
+    """
+    return {name: sorted(query_params.get_all(param)) for param, name in api.FILTER_PARAMS.items()}
+
+
+# Sections intégrables : calcul (depuis les index dérivés de la version) puis rendu
+def _kpis(dataset, filters):
+    return analyses.compute_kpis(dataset.derived('cube'), filters)
+
+
+def _draw_kpis(kpis):
+    cards = ''.join([
+        fiches.kpi_card(f"{kpis['epargne_brute'] / 1_000_000:.1f} M€", "Épargne brute totale"),
+        fiches.kpi_card(f"{kpis['communes']}", "Communes analysées"),
+        fiches.kpi_card(f"{kpis['population']:,.0f}", "Population totale"),
+        fiches.kpi_card(f"{kpis['recettes'] / 1_000_000:.1f} M€", "Recettes totales"),
+    ])
+    st.markdown(f'<div style="display: grid; grid-template-columns: repeat(4, 1fr); gap: 1rem;">{cards}</div>',
+                unsafe_allow_html=True)
+
+
+def _capacite(dataset, filters):
+    df_principal = analyses.budget_principal(analyses.apply_filters(dataset.df, **filters))
+    return analyses.capacite_ranking(df_principal, dataset.derived('rankings'))
+
+
+def _draw_capacite(classement):
+    if classement.empty:
+        st.info("Aucune donnée de capacité de financement disponible")
+        return
+    st.plotly_chart(charts.capacite_bar(classement), use_container_width=True)
+
+
+def _epci(dataset, filters):
+    return analyses.epci_table(dataset.derived('cube'), filters)
+
+
+def _draw_epci(epci_df):
+    if epci_df.empty:
+        st.info("Aucun EPCI avec les filtres actuels")
+        return
+    format_montant = lambda x: f"{x:,.1f} M€"
+    tables.paged_table(
+        epci_df[[col for col in EPCI_COLUMNS if col in epci_df.columns]],
+        key="embed_table_epci",
+        formatters={
+            'Population_totale': lambda x: f"{x:,.0f}",
+            'Epargne brute_M€': format_montant,
+            'Capacité ou besoin de financement_M€': format_montant,
+            'Impôts et taxes_M€': format_montant
+        },
+        column_names=EPCI_COLUMNS,
+        sort_by='Epargne brute_M€',
+        height=400
+    )
+
+
+EMBEDS = {
+    'kpis': (_kpis, _draw_kpis),
+    'capacite': (_capacite, _draw_capacite),
+    'epci': (_epci, _draw_epci),
+}
+
+
+def render(dataset, section, query_params):
+    """
+    Rend la seule section `section`, sans sidebar ni onglets : filtres et périmètre sont
+    lus dans l'URL, le résultat est calculé une fois par version et sélection
+    """
+    if section not in EMBEDS:
+        st.error(f"Section inconnue : {section} (sections disponibles : {', '.join(EMBEDS)})")
+        return
+
+    consolide = query_params.get(PERIMETRE_PARAM) == PERIMETRE_CONSOLIDE
+    if consolide:
+        dataset = dataset.derived('consolidated')
+    filters = filters_from_params(query_params)
+
+    compute, draw = EMBEDS[section]
+    key = (dataset.version, consolide, section, tuple((name, tuple(values)) for name, values in filters.items()))
+    result = _results.get(key)
+    if result is None:
+        result = compute(dataset, filters)
+        _results.put(key, result)
+    draw(result)
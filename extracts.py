@@ -0,0 +1,182 @@
+# extracts.py - Extraits OFGL communes, EPCI à fiscalité propre et syndicats, à dictionnaires partagés
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import analyses
+import ofgl_data
+
+COMMUNES = 'communes'
+EPCI = 'epci'
+SYNDICATS = 'syndicats'
+
+# Extraits complémentaires, cherchés à côté du fichier des communes (éventuellement compressés)
+EXTRACT_FILES = {
+    EPCI: 'ofgl-base-gfp.csv',
+    SYNDICATS: 'ofgl-base-syndicats.csv',
+}
+
+# Dimensions encodées une fois pour tous les extraits (dimension -> colonnes). Les SIREN des
+# collectivités et ceux des EPCI de rattachement partagent un dictionnaire : un code EPCI de
+# l'extrait communes désigne directement la collectivité de l'extrait EPCI.
+SHARED_DIMENSIONS = {
+    'siren': ['Code_Siren_Collectivite', 'Code_EPCI'],
+    'agregat': ['Agregat'],
+    'exercice': ['Exercice'],
+    'type_budget': ['Type_budget'],
+}
+
+ENTITY_COLUMNS = ['Code_Siren_Collectivite', 'Libelle_Budget', 'Exercice', 'Montant', 'Population',
+                  'Montant_par_habitant']
+
+
+class ExtractStore:
+    """
+    Extraits OFGL d'une version des données, chacun gardé tel quel, avec pour les dimensions
+    partagées un code entier par ligne (même dictionnaire pour tous les extraits). Les
+    indicateurs d'un extrait sont indexés une fois par clé entière (SIREN x exercice) :
+    une jointure entre extraits est une recherche d'entiers, sans fusion sur des chaînes.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.dictionaries = {}
+        self.codes = {name: {} for name in tables}
+        for dim, columns in SHARED_DIMENSIONS.items():
+            values = [table[col] for table in tables.values() for col in columns if col in table.columns]
+            if not values:
+                continue
+            dictionary = pd.Index(pd.unique(pd.concat(values, ignore_index=True).dropna()))
+            self.dictionaries[dim] = dictionary.sort_values()
+            for name, table in tables.items():
+                for col in columns:
+                    if col in table.columns:
+                        self.codes[name][col] = self.encode(dim, table[col])
+
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.tables
+
+    def encode(self, dim, values):
+        """
+        Codes entiers de `values` dans le dictionnaire partagé `dim` (-1 si inconnu)
+        """
+        return self.dictionaries[dim].get_indexer(pd.Index(values)).astype(np.int32)
+
+    def _keys(self, siren, exercice):
+        # Clé composite entière SIREN x exercice (-1 si l'un des deux est inconnu)
+        siren = np.asarray(siren, dtype=np.int64)
+        exercice = np.asarray(exercice, dtype=np.int64)
+        keys = siren * len(self.dictionaries['exercice']) + exercice
+        return np.where((siren < 0) | (exercice < 0), -1, keys)
+
+    def _rows(self, name, agregat, type_budget=None, exercice=None):
+        """
+        Masque des lignes de l'extrait pour un agrégat (et un type de budget, un exercice),
+        None si l'une des valeurs est absente du dictionnaire : son code -1 désignerait
+        sinon les lignes où la valeur manque
+        """
+        codes = self.codes[name]
+        if 'Agregat' not in codes:
+            return None
+        mask = np.ones(len(self.tables[name]), dtype=bool)
+        for dim, col, value in (('agregat', 'Agregat', agregat), ('type_budget', 'Type_budget', type_budget),
+                                ('exercice', 'Exercice', exercice)):
+            if value is None or col not in codes:
+                continue
+            code = self.encode(dim, [value])[0]
+            if code < 0:
+                return None
+            mask &= codes[col] == code
+        return mask
+
+    def indicator(self, name, agregat, measure='Montant_par_habitant', type_budget=analyses.BUDGET_PRINCIPAL):
+        """
+        Valeurs d'un agrégat de l'extrait `name` indexées par clé SIREN x exercice
+        (construites à la première demande, puis conservées)
+        """
+        cache_key = (name, agregat, measure, type_budget)
+        with self._lock:
+            if cache_key not in self._indexes:
+                self._indexes[cache_key] = self._build_indicator(name, agregat, measure, type_budget)
+            return self._indexes[cache_key]
+
+    def _build_indicator(self, name, agregat, measure, type_budget):
+        table, codes = self.tables[name], self.codes[name]
+        mask = self._rows(name, agregat, type_budget)
+        if mask is None or measure not in table.columns or 'Code_Siren_Collectivite' not in codes:
+            return pd.Series(dtype=float)
+
+        keys = self._keys(codes['Code_Siren_Collectivite'][mask], codes['Exercice'][mask])
+        values = table[measure].to_numpy(dtype=float)[mask]
+        valid = keys >= 0
+        return pd.Series(values[valid]).groupby(keys[valid]).sum(min_count=1)
+
+    def lookup(self, name, agregat, siren, exercice, measure='Montant_par_habitant', type_budget=analyses.BUDGET_PRINCIPAL):
+        """
+        Valeur de l'agrégat pour des paires (code SIREN, code exercice), NaN si absente
+        """
+        index = self.indicator(name, agregat, measure, type_budget)
+        positions = index.index.get_indexer(self._keys(siren, exercice))
+        values = index.to_numpy(dtype=float)
+        return np.where(positions >= 0, values[positions] if len(values) else np.nan, np.nan)
+
+    def commune_epci(self):
+        """
+        Code SIREN (dictionnaire partagé) de l'EPCI de chaque commune, indexé par code commune
+        """
+        with self._lock:
+            if 'commune_epci' not in self._indexes:
+                communes = self.tables[COMMUNES]
+                mapping = pd.Series(self.codes[COMMUNES].get('Code_EPCI', np.full(len(communes), -1, dtype=np.int32)),
+                                    index=communes['Code_Commune'].to_numpy())
+                self._indexes['commune_epci'] = mapping[~mapping.index.duplicated()]
+            return self._indexes['commune_epci']
+
+    def epci_values(self, frame, agregat, measure='Montant_par_habitant'):
+        """
+        Pour chaque ligne (commune, exercice) de `frame`, valeur de l'agrégat pour l'EPCI de la commune
+        """
+        if EPCI not in self.tables or frame.empty:
+            return np.full(len(frame), np.nan)
+        mapping = self.commune_epci()
+        positions = mapping.index.get_indexer(frame['Code_Commune'])
+        siren = np.where(positions >= 0, mapping.to_numpy()[positions], -1)
+        exercice = self.encode('exercice', frame['Exercice'])
+        return self.lookup(EPCI, agregat, siren, exercice, measure)
+
+    def entities(self, name, agregat, exercice=None, type_budget=analyses.BUDGET_PRINCIPAL):
+        """
+        Lignes d'un agrégat de l'extrait `name` (une par collectivité et exercice)
+        """
+        table = self.tables[name]
+        columns = [col for col in ENTITY_COLUMNS if col in table.columns]
+        mask = self._rows(name, agregat, type_budget, exercice)
+        if mask is None:
+            return table.loc[[], columns]
+        return table.loc[mask, columns]
+
+
+def extract_paths(source_path=ofgl_data.SOURCE_PATH):
+    """
+    Fichiers des extraits complémentaires présents à côté du fichier des communes
+    """
+    directory = os.path.dirname(source_path)
+    paths = {name: ofgl_data.find_source(os.path.join(directory, filename))
+             for name, filename in EXTRACT_FILES.items()}
+    return {name: path for name, path in paths.items() if os.path.exists(path)}
+
+
+def load_extracts(communes_df, source_path=ofgl_data.SOURCE_PATH, departement=ofgl_data.CODE_DEPARTEMENT):
+    """
+    Extrait communes déjà chargé et extraits EPCI / syndicats disponibles, nettoyés
+    et filtrés sur le même département
+    """
+    tables = {COMMUNES: communes_df}
+    for name, path in extract_paths(source_path).items():
+        tables[name] = ofgl_data.load_dataset(path, departement)
+    return ExtractStore(tables)
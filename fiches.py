@@ -0,0 +1,279 @@
+# fiches.py - Génération en lot des fiches financières communales (HTML autonomes)
+import argparse
+import html
+import os
+import re
+import tempfile
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import analyses
+import dataset_store
+import ofgl_data
+
+OUTPUT_DIR = 'fiches'
+
+# Index dérivés utiles aux fiches (pas de groupes de pairs nationaux)
+FICHE_BUILDERS = {name: dataset_store.DERIVED_BUILDERS[name] for name in ('rankings', 'capacite_classements', 'depenses_panel')}
+
+# Jeu de données du processus de travail, mappé en mémoire depuis le fichier Arrow partagé
+_WORKER_DATASET = None
+
+STYLE = """
+<style>
+    body { font-family: sans-serif; margin: 2rem auto; max-width: 1100px; color: #374151; }
+    h1 { color: #1E3A8A; }
+    h2 { color: #374151; border-bottom: 1px solid #E5E7EB; padding-bottom: .3rem; margin-top: 2rem; }
+    .kpis { display: flex; gap: 1rem; flex-wrap: wrap; }
+    .kpi-card { background-color: #F3F4F6; border-radius: 10px; padding: 15px; text-align: center; flex: 1; min-width: 180px; }
+    .kpi-value { font-size: 1.6rem; font-weight: bold; color: #1E3A8A; }
+    .kpi-label { font-size: 0.9rem; color: #6B7280; }
+    .positive { color: #10B981; }
+    .negative { color: #EF4444; }
+    table { border-collapse: collapse; width: 100%; }
+    th, td { border: 1px solid #E5E7EB; padding: 6px 10px; text-align: right; }
+    th:first-child, td:first-child { text-align: left; }
+    footer { margin-top: 2rem; font-size: .8rem; color: #6B7280; }
+</style>
+"""
+
+
+def slugify(value):
+    """
+    Nom de fichier ASCII à partir d'un nom de commune
+    """
+    value = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', value.lower()).strip('-')
+
+
+def fiche_filename(code_commune, commune):
+    return f"{code_commune}-{slugify(commune)}.html"
+
+
+def format_euros(value, decimals=0):
+    if pd.isna(value):
+        return "N/A"
+    return f"{value:,.{decimals}f} €"
+
+
+def kpi_card(value, label, css_class=''):
+    return (f'<div class="kpi-card"><div class="kpi-value {css_class}">{html.escape(value)}</div>'
+            f'<div class="kpi-label">{html.escape(label)}</div></div>')
+
+
+def html_table(frame):
+    return frame.to_html(index=False, border=0, na_rep='-', escape=True)
+
+
+def figure_html(fig, plotlyjs, div_id):
+    fig.update_layout(height=380, margin=dict(t=50, b=40, l=40, r=20))
+    return fig.to_html(full_html=False, include_plotlyjs=plotlyjs, div_id=div_id, config={'displaylogo': False})
+
+
+def render_fiche(dataset, commune, plotlyjs='inline', header=''):
+    """
+    Fiche HTML d'une commune : KPI du dernier exercice, rang de capacité de financement,
+    épargne brute, recettes/dépenses et budgets annexes. Avec plotlyjs='inline',
+    la bibliothèque graphique est embarquée et le fichier se suffit à lui-même ;
+    un chemin vers plotly.min.js la charge depuis ce fichier. header est inséré
+    en tête de page (navigation du site statique).
+    """
+    df = dataset.df
+    df_commune = df[df['Commune'] == commune]
+    commune_principal = analyses.budget_principal(df_commune)
+
+    exercice = df_commune['Exercice'].max()
+    dernier = commune_principal[commune_principal['Exercice'] == exercice]
+    epci = df_commune['Nom_EPCI'].dropna().iloc[0] if df_commune['Nom_EPCI'].notna().any() else '-'
+    code_commune = df_commune['Code_Commune'].iloc[0]
+    population = dernier['Population'].max()
+
+    def montant(agregat):
+        return dernier.loc[dernier['Agregat'] == agregat, 'Montant'].sum()
+
+    # Rang de capacité de financement par habitant parmi les communes du jeu, même exercice
+    # (classements calculés une fois par jeu, donc une fois par processus de travail)
+    classement = dataset.derived('capacite_classements').get(exercice, pd.DataFrame(columns=['Commune']))
+    positions = classement.index[classement['Commune'] == commune]
+    if len(positions):
+        capacite = classement.loc[positions[0], 'Montant_par_habitant']
+        rang = f"{positions[0] + 1} / {len(classement)}"
+    else:
+        capacite, rang = float('nan'), "N/A"
+
+    # Recettes et dépenses estimées (toutes années)
+    panel = dataset.derived('depenses_panel')
+    depenses = panel[panel['Commune'] == commune].sort_values('Exercice')
+    depenses_dernier = depenses[depenses['Exercice'] == exercice]
+    total_depenses = depenses_dernier['Dépenses'].sum() if not depenses_dernier.empty else float('nan')
+
+    kpis = ''.join([
+        kpi_card(f"{montant(analyses.AGREGAT_EPARGNE) / 1_000_000:,.1f} M€", "Épargne brute"),
+        kpi_card(f"{montant(analyses.AGREGAT_RECETTES) / 1_000_000:,.1f} M€", "Recettes totales"),
+        kpi_card(f"{total_depenses / 1_000_000:,.1f} M€" if pd.notna(total_depenses) else "N/A", "Dépenses estimées"),
+        kpi_card(f"{population:,.0f}" if pd.notna(population) else "N/A", "Population"),
+        kpi_card(format_euros(capacite) + "/hab" if pd.notna(capacite) else "N/A",
+             "Capacité (+) / besoin (-) de financement",
+             'positive' if pd.notna(capacite) and capacite > 0 else 'negative'),
+        kpi_card(rang, "Rang capacité de financement"),
+    ])
+
+    sections = []
+    include_js = plotlyjs
+
+    def figure(fig):
+        nonlocal include_js
+        # Identifiants stables : la même fiche est régénérée à l'identique
+        rendered = figure_html(fig, True if include_js == 'inline' else include_js, f"graphique-{len(sections) + 1}")
+        include_js = False
+        return rendered
+
+    # Épargne brute par exercice
+    epargne = commune_principal[commune_principal['Agregat'] == analyses.AGREGAT_EPARGNE]
+    epargne = epargne.groupby('Exercice', as_index=False)[['Montant', 'Montant_par_habitant']].sum()
+    if not epargne.empty:
+        fig = px.bar(epargne, x='Exercice', y='Montant', text='Montant',
+                     title="Épargne brute par exercice (€)", color_discrete_sequence=['#3B82F6'])
+        fig.update_traces(texttemplate='%{text:,.0f}', textposition='outside')
+        fig.update_xaxes(type='category')
+        sections.append("<h2>💰 Épargne brute</h2>" + figure(fig))
+
+    # Recettes vs dépenses
+    if not depenses.empty:
+        fig = go.Figure([
+            go.Bar(x=depenses['Exercice'].astype(str), y=depenses['Recettes'], name='Recettes', marker_color='#10B981'),
+            go.Bar(x=depenses['Exercice'].astype(str), y=depenses['Dépenses'], name='Dépenses', marker_color='#EF4444'),
+        ])
+        fig.update_layout(title="Recettes et dépenses estimées (€)", barmode='group')
+        table = depenses[['Exercice', 'Recettes', 'Dépenses', 'Solde', 'Dépenses_par_habitant', 'Taux_depenses_recettes']]
+        table = table.assign(
+            Recettes=table['Recettes'].map(format_euros),
+            Dépenses=table['Dépenses'].map(format_euros),
+            Solde=table['Solde'].map(format_euros),
+            Dépenses_par_habitant=table['Dépenses_par_habitant'].map(format_euros),
+            Taux_depenses_recettes=table['Taux_depenses_recettes'].map(lambda x: f"{x:.1f}%"),
+        ).rename(columns={'Dépenses_par_habitant': 'Dépenses/hab', 'Taux_depenses_recettes': 'Taux dépenses/recettes'})
+        sections.append("<h2>📈 Recettes et dépenses</h2>" + figure(fig) + html_table(table))
+
+    # Budgets annexes du dernier exercice
+    annexes = df_commune[(df_commune['Type_budget'] == analyses.BUDGET_ANNEXE) & (df_commune['Exercice'] == exercice)]
+    if not annexes.empty:
+        annexes = annexes.assign(Service=annexes['Libelle_Budget'].map(analyses.classify_service))
+        par_budget = annexes.pivot_table(index=['Service', 'Libelle_Budget'], columns='Agregat',
+                                         values='Montant', aggfunc='sum').reset_index()
+        par_budget = par_budget.rename(columns={'Libelle_Budget': 'Budget'}).rename_axis(columns=None)
+        for col in par_budget.columns[2:]:
+            par_budget[col] = par_budget[col].map(format_euros)
+        sections.append(f"<h2>💧 Budgets annexes ({exercice})</h2>" + html_table(par_budget))
+    else:
+        sections.append(f"<h2>💧 Budgets annexes ({exercice})</h2><p>Aucun budget annexe.</p>")
+
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>Fiche financière - {html.escape(commune)}</title>
+{STYLE}
+</head>
+<body>
+{header}<h1>📊 {html.escape(commune)}</h1>
+<p><strong>EPCI :</strong> {html.escape(str(epci))} &nbsp;|&nbsp; <strong>Code commune :</strong> {html.escape(str(code_commune))}
+&nbsp;|&nbsp; <strong>Exercice :</strong> {exercice}</p>
+<h2>📈 Indicateurs clés ({exercice})</h2>
+<div class="kpis">{kpis}</div>
+{''.join(sections)}
+<footer>Données OFGL - version du fichier source : {html.escape(str(dataset.version or 'inconnue'))}</footer>
+</body>
+</html>
+"""
+
+
+def _init_worker(arrow_path, version):
+    """
+    Chaque processus mappe le même fichier Arrow : les pages sont partagées en lecture seule
+    """
+    global _WORKER_DATASET
+    _WORKER_DATASET = dataset_store.Dataset(ofgl_data.read_arrow(arrow_path), version, builders=FICHE_BUILDERS)
+
+
+def _write_fiche(task):
+    commune, path, plotlyjs = task
+    content = render_fiche(_WORKER_DATASET, commune, plotlyjs)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return len(content)
+
+
+def generate_fiches(source_path=ofgl_data.SOURCE_PATH, output_dir=OUTPUT_DIR, departement=ofgl_data.CODE_DEPARTEMENT,
+                    communes=None, workers=None, plotlyjs='inline'):
+    """
+    Écrit une fiche par commune du département (ou des communes demandées) dans output_dir.
+    Le jeu nettoyé est matérialisé une fois en Arrow puis mappé par chaque processus de travail.
+    Renvoie les statistiques de génération (nombre de fiches, durée, débit).
+    """
+    start = time.perf_counter()
+    df = ofgl_data.load_dataset(source_path, departement)
+    version = ofgl_data.source_version(source_path)
+
+    codes = df.drop_duplicates('Commune').set_index('Commune')['Code_Commune']
+    if communes:
+        codes = codes[codes.index.isin(communes)]
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(commune, os.path.join(output_dir, fiche_filename(code, commune)), plotlyjs)
+             for commune, code in codes.items()]
+
+    # Pas plus de processus (chacun mappe le fichier Arrow) que de fiches à écrire
+    workers = workers or max(1, min(len(tasks), os.cpu_count() or 1))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        arrow_path = os.path.join(tmp_dir, 'fiches.arrow')
+        ofgl_data.write_arrow(df, arrow_path, version)
+        del df
+        load_seconds = time.perf_counter() - start
+
+        render_start = time.perf_counter()
+        if workers == 1:
+            _init_worker(arrow_path, version)
+            sizes = [_write_fiche(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(arrow_path, version)) as executor:
+                sizes = list(executor.map(_write_fiche, tasks))
+        render_seconds = time.perf_counter() - render_start
+
+    total_seconds = time.perf_counter() - start
+    return {
+        'fiches': len(tasks),
+        'workers': workers,
+        'octets': sum(sizes),
+        'chargement_s': load_seconds,
+        'rendu_s': render_seconds,
+        'total_s': total_seconds,
+        'fiches_par_s': len(tasks) / render_seconds if render_seconds > 0 else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère une fiche financière HTML autonome par commune")
+    parser.add_argument('--source', default=ofgl_data.SOURCE_PATH, help="Fichier CSV OFGL")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="Répertoire des fiches")
+    parser.add_argument('--departement', default=ofgl_data.CODE_DEPARTEMENT, help="Code du département")
+    parser.add_argument('--commune', action='append', help="Limiter à une commune (répétable)")
+    parser.add_argument('--workers', type=int, default=None, help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument('--plotlyjs', choices=['inline', 'cdn'], default='inline',
+                        help="Embarquer plotly.js (fichiers autonomes) ou le charger depuis le CDN")
+    args = parser.parse_args()
+
+    stats = generate_fiches(args.source, args.output, args.departement, args.commune, args.workers, args.plotlyjs)
+    print(f"{stats['fiches']} fiches écrites dans {args.output} ({stats['octets'] / 1_000_000:,.1f} Mo)")
+    print(f"Chargement : {stats['chargement_s']:.2f} s - rendu : {stats['rendu_s']:.2f} s "
+          f"avec {stats['workers']} processus - total : {stats['total_s']:.2f} s")
+    print(f"Débit : {stats['fiches_par_s']:.1f} fiches/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+# geo.py - Géométries des communes et des EPCI : topologie, simplification multi-résolution, dissolution
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import analyses
+import search
+
+# Fichier GeoJSON local des communes (propriété code INSEE ou nom)
+GEOJSON_ENV_VAR = 'OFGL_GEOJSON'
+GEOJSON_PATH = 'communes-974.geojson'
+
+CODE_PROPERTIES = ['code', 'code_insee', 'INSEE_COM', 'insee', 'codgeo', 'CODGEO']
+NAME_PROPERTIES = ['nom', 'NOM', 'NOM_COM', 'name', 'libgeo', 'LIBGEO']
+
+# Tolérances de simplification (degrés ; 0.001° ≈ 100 m à La Réunion)
+TOLERANCES = {
+    'Détaillée': 0.0002,
+    'Standard': 0.001,
+    'Légère': 0.005,
+}
+DEFAULT_RESOLUTION = 'Standard'
+
+NIVEAU_COMMUNES = 'Communes'
+NIVEAU_EPCI = 'EPCI'
+
+# Coordonnées entières (1e-7 degré) : égalité exacte des sommets partagés entre communes
+SCALE = 10 ** 7
+# Décimales conservées dans les géométries envoyées au navigateur (≈ 1 m)
+OUTPUT_DECIMALS = 5
+
+
+def geojson_path():
+    return os.environ.get(GEOJSON_ENV_VAR, GEOJSON_PATH)
+
+
+def simplify_line(points, tolerance):
+    """
+    Douglas-Peucker (itératif, distances calculées par NumPy sur chaque segment) :
+    les extrémités sont toujours conservées
+    """
+    n = len(points)
+    if n <= 2:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    coords = points.astype(float)
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        a, b = coords[start], coords[end]
+        segment = coords[start + 1:end] - a
+        direction = b - a
+        norm = np.hypot(direction[0], direction[1])
+        if norm == 0:
+            distances = np.hypot(segment[:, 0], segment[:, 1])
+        else:
+            distances = np.abs(direction[0] * segment[:, 1] - direction[1] * segment[:, 0]) / norm
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def _signed_area(ring):
+    x = ring[:, 0].astype(float)
+    y = ring[:, 1].astype(float)
+    return 0.5 * float(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]))
+
+
+def _contains(ring, point):
+    """
+    Point dans un anneau fermé (lancer de rayon)
+    """
+    x, y = ring[:-1, 0].astype(float), ring[:-1, 1].astype(float)
+    x2, y2 = ring[1:, 0].astype(float), ring[1:, 1].astype(float)
+    px, py = float(point[0]), float(point[1])
+    crosses = (y > py) != (y2 > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = (x2 - x) * (py - y) / (y2 - y) + x
+    return bool(np.count_nonzero(crosses & (px < x_cross)) % 2)
+
+
+def _polygons(geometry):
+    """
+    Anneaux entiers fermés de chaque polygone : extérieur dans le sens direct, trous en sens inverse
+    """
+    if geometry is None:
+        return []
+    coordinates = geometry.get('coordinates') or []
+    if geometry.get('type') == 'Polygon':
+        coordinates = [coordinates]
+    elif geometry.get('type') != 'MultiPolygon':
+        return []
+
+    polygons = []
+    for polygon in coordinates:
+        rings = []
+        for position, ring in enumerate(polygon):
+            ring = np.rint(np.asarray(ring, dtype=float)[:, :2] * SCALE).astype(np.int64)
+            if len(ring) and not np.array_equal(ring[0], ring[-1]):
+                ring = np.vstack([ring, ring[:1]])
+            if len(ring) < 4:
+                continue
+            exterior = position == 0
+            if (_signed_area(ring) > 0) != exterior:
+                ring = ring[::-1]
+            rings.append(ring)
+        if rings:
+            polygons.append(rings)
+    return polygons
+
+
+class _Topology:
+    """
+    Anneaux découpés en arcs aux sommets de jonction (où les voisins changent) : une
+    frontière commune à deux communes est un seul arc, simplifié une seule fois, ce qui
+    évite trous et chevauchements entre voisins quelle que soit la tolérance.
+    """
+
+    def __init__(self, rings):
+        neighbours = defaultdict(set)
+        for ring in rings:
+            points = [tuple(point) for point in ring[:-1].tolist()]
+            count = len(points)
+            for i, point in enumerate(points):
+                neighbours[point].add(frozenset((points[i - 1], points[(i + 1) % count])))
+        self._junctions = {point for point, pairs in neighbours.items() if len(pairs) > 1}
+        self.arcs = []
+        self._arc_ids = {}
+
+    def _arc(self, points):
+        forward, backward = tuple(points), tuple(reversed(points))
+        key = min(forward, backward)
+        arc_id = self._arc_ids.get(key)
+        if arc_id is None:
+            arc_id = self._arc_ids[key] = len(self.arcs)
+            self.arcs.append(np.array(key, dtype=np.int64))
+        return arc_id, forward != key
+
+    def split(self, ring):
+        """
+        Anneau -> liste d'arcs orientés (identifiant, inversé)
+        """
+        points = [tuple(point) for point in ring[:-1].tolist()]
+        cuts = [i for i, point in enumerate(points) if point in self._junctions]
+        if not cuts:
+            # Anneau isolé (île, enclave) : départ canonique au plus petit sommet
+            start = points.index(min(points))
+            points = points[start:] + points[:start]
+            return [self._arc(points + [points[0]])]
+        points = points[cuts[0]:] + points[:cuts[0]]
+        cuts = [cut - cuts[0] for cut in cuts] + [len(points)]
+        points.append(points[0])
+        return [self._arc(points[start:end + 1]) for start, end in zip(cuts[:-1], cuts[1:])]
+
+
+def _assemble(refs, arcs):
+    parts = []
+    for arc_id, reverse in refs:
+        arc = arcs[arc_id][::-1] if reverse else arcs[arc_id]
+        parts.append(arc if not parts else arc[1:])
+    return np.vstack(parts)
+
+
+def _dissolve(polygons_refs):
+    """
+    Contour d'un groupe de communes : les arcs utilisés deux fois dans le groupe sont
+    intérieurs et disparaissent, les autres sont chaînés en anneaux
+    """
+    usage = defaultdict(int)
+    for polygon in polygons_refs:
+        for ring in polygon:
+            for arc_id, _ in ring:
+                usage[arc_id] += 1
+    return [ref for polygon in polygons_refs for ring in polygon for ref in ring if usage[ref[0]] == 1]
+
+
+def _chain(refs, arcs):
+    """
+    Arcs orientés de frontière -> anneaux fermés (listes d'arcs)
+    """
+    def ends(ref):
+        arc = arcs[ref[0]]
+        first, last = (arc[-1], arc[0]) if ref[1] else (arc[0], arc[-1])
+        return tuple(first), tuple(last)
+
+    outgoing = defaultdict(list)
+    for ref in refs:
+        outgoing[ends(ref)[0]].append(ref)
+
+    rings = []
+    for ref in refs:
+        start = ends(ref)[0]
+        if ref not in outgoing[start]:
+            continue
+        outgoing[start].remove(ref)
+        ring, end = [ref], ends(ref)[1]
+        while end != start and outgoing[end]:
+            following = outgoing[end].pop()
+            ring.append(following)
+            end = ends(following)[1]
+        rings.append(ring)
+    return rings
+
+
+def _group_rings(rings):
+    """
+    Anneaux dissous -> polygones : extérieurs (sens direct) avec les trous qu'ils contiennent
+    """
+    exteriors = [ring for ring in rings if _signed_area(ring) > 0]
+    polygons = [[ring] for ring in exteriors]
+    for ring in rings:
+        if _signed_area(ring) > 0:
+            continue
+        for polygon in polygons:
+            if _contains(polygon[0], ring[0]):
+                polygon.append(ring)
+                break
+    return polygons
+
+
+class GeoIndex:
+    """
+    Géométries des communes et de leurs EPCI à plusieurs résolutions. Les frontières sont
+    découpées en arcs partagés, simplifiés une fois par tolérance ; les EPCI sont dissous
+    une fois à partir des arcs. Chaque couche (niveau, résolution) est un GeoJSON prêt à
+    l'emploi, identifiant = nom de la commune ou de l'EPCI : seules les couleurs changent
+    d'une exécution à l'autre.
+    """
+
+    def __init__(self, features, commune_epci, tolerances=TOLERANCES):
+        # features : [(commune, géométrie GeoJSON)], commune_epci : {commune: EPCI}
+        polygons_by_commune = {code: _polygons(geometry) for code, geometry in features}
+        polygons_by_commune = {code: polygons for code, polygons in polygons_by_commune.items() if polygons}
+        topology = _Topology([ring for polygons in polygons_by_commune.values() for polygon in polygons for ring in polygon])
+
+        commune_refs = {code: [[topology.split(ring) for ring in polygon] for polygon in polygons]
+                        for code, polygons in polygons_by_commune.items()}
+        by_epci = defaultdict(list)
+        for code, polygons in commune_refs.items():
+            if commune_epci.get(code) is not None:
+                by_epci[commune_epci[code]].extend(polygons)
+        epci_rings = {epci: _chain(_dissolve(polygons), topology.arcs) for epci, polygons in by_epci.items()}
+
+        self.communes = sorted(commune_refs)
+        self.epcis = sorted(epci_rings)
+        self.layers = {}
+        self.stats = []
+        for resolution, tolerance in tolerances.items():
+            arcs = [simplify_line(arc, tolerance * SCALE) for arc in topology.arcs]
+            communes = {code: self._polygons(polygons, arcs, polygons_by_commune[code])
+                        for code, polygons in commune_refs.items()}
+            epcis = {}
+            for epci, rings in epci_rings.items():
+                assembled = [_assemble(ring, arcs) for ring in rings]
+                epcis[epci] = _group_rings([ring for ring in assembled if len(ring) >= 4])
+            for niveau, geometries in ((NIVEAU_COMMUNES, communes), (NIVEAU_EPCI, epcis)):
+                layer = _feature_collection(geometries)
+                self.layers[(niveau, resolution)] = layer
+                self.stats.append({
+                    'niveau': niveau,
+                    'resolution': resolution,
+                    'sommets': sum(len(ring) for polygons in geometries.values() for polygon in polygons for ring in polygon),
+                    'octets': len(json.dumps(layer, separators=(',', ':'))),
+                })
+
+    @staticmethod
+    def _polygons(polygons_refs, arcs, original):
+        """
+        Polygones simplifiés d'une commune ; un anneau réduit à moins de 3 sommets distincts
+        est abandonné (trou, îlot), sauf si la commune perdait alors toute géométrie
+        """
+        polygons = []
+        for polygon in polygons_refs:
+            rings = [_assemble(ring, arcs) for ring in polygon]
+            if len(rings[0]) < 4:
+                continue
+            polygons.append([rings[0]] + [ring for ring in rings[1:] if len(ring) >= 4])
+        if not polygons:
+            polygons = [max(original, key=lambda polygon: abs(_signed_area(polygon[0])))[:1]]
+        return polygons
+
+    def layer(self, niveau=NIVEAU_COMMUNES, resolution=DEFAULT_RESOLUTION):
+        return self.layers[(niveau, resolution)]
+
+
+def _feature_collection(geometries):
+    features = []
+    for key, polygons in geometries.items():
+        coordinates = [[np.round(ring / SCALE, OUTPUT_DECIMALS).tolist() for ring in polygon] for polygon in polygons]
+        features.append({
+            'type': 'Feature',
+            'id': key,
+            'properties': {},
+            'geometry': {'type': 'MultiPolygon', 'coordinates': coordinates},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def _feature_commune(feature, communes_by_code, communes_by_name):
+    """
+    Commune du jeu de données correspondant à une entité GeoJSON : par code INSEE,
+    sinon par nom (sans accents ni casse)
+    """
+    properties = feature.get('properties') or {}
+    for key in CODE_PROPERTIES:
+        if properties.get(key) not in (None, ''):
+            return communes_by_code.get(search.code_key(properties[key]))
+    for key in NAME_PROPERTIES:
+        if properties.get(key):
+            return communes_by_name.get(search.normalize(properties[key]))
+    return None
+
+
+def load_geo_index(df, path=None):
+    """
+    Index géographique du jeu de données à partir du GeoJSON local, None s'il est absent
+    """
+    path = path or geojson_path()
+    if not os.path.exists(path) or 'Code_Commune' not in df.columns:
+        return None
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+
+    communes = df.dropna(subset=['Commune']).drop_duplicates('Commune')
+    communes_by_code = dict(zip(communes['Code_Commune'].map(search.code_key), communes['Commune']))
+    communes_by_name = dict(zip(communes['Commune'].map(search.normalize), communes['Commune']))
+    commune_epci = dict(zip(communes['Commune'], communes['Nom_EPCI'])) if 'Nom_EPCI' in communes.columns else {}
+
+    features = [(_feature_commune(feature, communes_by_code, communes_by_name), feature.get('geometry'))
+                for feature in collection.get('features', [])]
+    return GeoIndex([(commune, geometry) for commune, geometry in features if commune is not None], commune_epci)
+
+
+def map_values(cube, filters, agregat, exercice, niveau=NIVEAU_COMMUNES):
+    """
+    Montant par habitant de l'agrégat (budget principal, exercice donné) par commune
+    ou par EPCI (total du groupe / population du groupe), lu dans le cube pré-agrégé
+    """
+    cells = cube.cells(['Nom_EPCI', 'Commune', 'Agregat', 'Exercice', 'Type_budget'], **filters)
+    cells = cells[cells['Type_budget'].isin(analyses.BUDGETS_REFERENCE) & (cells['Agregat'] == agregat)
+                  & (cells['Exercice'] == exercice)]
+    key = 'Nom_EPCI' if niveau == NIVEAU_EPCI else 'Commune'
+    grouped = cells.dropna(subset=[key]).groupby(key)[['Montant', 'Population']].sum()
+    montant = grouped['Montant'].to_numpy(dtype=float)
+    population = grouped['Population'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_capita = np.where(population > 0, montant / population, np.nan)
+    return pd.DataFrame({'Cle': grouped.index.to_numpy(), 'Montant': montant, 'Population': population,
+                         'Montant_par_habitant': per_capita})
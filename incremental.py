@@ -0,0 +1,214 @@
+# incremental.py - Totaux de la sélection maintenus par différence entre deux sélections
+import threading
+
+import numpy as np
+import pandas as pd
+
+import cube
+
+CELL_KEYS = list(cube.CROSS_KEYS)
+UNIT_KEYS = ['Nom_EPCI', 'Commune']
+
+# Nombre de mises à jour par différence avant un recalcul complet (dérive des flottants)
+REBUILD_EVERY = 64
+
+# Nombre de filtres de cellules (types de budget, agrégats, exercices) dont on garde le comptage de communes
+COUNT_CACHE_SIZE = 8
+
+
+class PartialAggregates:
+    """
+    Sommes partielles par commune x cellule (type de budget, agrégat, exercice), tirées
+    du niveau commune du cube, une fois par version des données : un tableau dense
+    commune x cellule x mesure (Montant, Population, Lignes)
+    """
+
+    def __init__(self, data_cube):
+        level = data_cube.levels['commune']
+        unit_keys = [col for col in UNIT_KEYS if col in level.columns]
+        cell_keys = [col for col in CELL_KEYS if col in level.columns]
+        self.measures = list(cube.MEASURES)
+
+        units = level.groupby(unit_keys, dropna=False, sort=False).ngroup().to_numpy()
+        cells = level.groupby(cell_keys, dropna=False, sort=False).ngroup().to_numpy()
+        self.units = level[unit_keys].drop_duplicates().reset_index(drop=True) if len(level) else level[unit_keys]
+        self.cells = level[cell_keys].drop_duplicates().reset_index(drop=True) if len(level) else level[cell_keys]
+
+        self.values = np.zeros((len(self.units), len(self.cells), len(self.measures)))
+        np.add.at(self.values, (units, cells), level[self.measures].to_numpy(dtype=float))
+
+        # EPCI de chaque commune (groupe des communes sans EPCI compris)
+        epci = self.units['Nom_EPCI'] if 'Nom_EPCI' in self.units.columns else pd.Series(np.nan, index=self.units.index)
+        codes, self.epci = pd.factorize(epci, use_na_sentinel=False)
+        self.epci_of = codes.astype(np.int64)
+
+        # Positions par valeur de dimension : une sélection se résout en O(nombre de valeurs choisies)
+        self._positions = {dim: _positions(frame[dim])
+                           for frame in (self.units, self.cells) for dim in frame.columns}
+        self.cell_columns = {dim: self.cells[dim].to_numpy() for dim in self.cells.columns}
+
+    def _mask(self, size, dim, values, mask):
+        if not values or dim not in self._positions:
+            return mask
+        selected = np.zeros(size, dtype=bool)
+        positions = self._positions[dim]
+        for value in values:
+            selected[positions.get(value, [])] = True
+        return mask & selected
+
+    def selection(self, epci=None, communes=None, **cell_filters):
+        """
+        Communes retenues par les filtres EPCI et communes (sélection vide = pas de filtre)
+        """
+        mask = np.ones(len(self.units), dtype=bool)
+        mask = self._mask(len(self.units), 'Nom_EPCI', epci, mask)
+        return self._mask(len(self.units), 'Commune', communes, mask)
+
+    def cell_mask(self, budget_types=None, agregats=None, exercices=None, **unit_filters):
+        """
+        Cellules retenues par les filtres de type de budget, d'agrégat et d'exercice
+        """
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dim, values in (('Type_budget', budget_types), ('Agregat', agregats), ('Exercice', exercices)):
+            mask = self._mask(len(self.cells), dim, values, mask)
+        return mask
+
+
+def _positions(values):
+    """
+    Positions de chaque valeur non manquante d'une colonne ({valeur: [positions]})
+    """
+    positions = {}
+    for position, value in enumerate(values.tolist()):
+        if value == value and value is not None:
+            positions.setdefault(value, []).append(position)
+    return positions
+
+
+class IncrementalTotals:
+    """
+    Totaux par EPCI x cellule de la sélection courante d'une session. Quand la sélection
+    de communes ou d'EPCI change, seules les communes ajoutées ou retirées sont additionnées
+    ou soustraites : le coût d'une retouche de filtre est proportionnel à la retouche.
+    Même interface de lecture que le cube (cells) pour les dimensions EPCI, type de budget,
+    agrégat et exercice : les calculs de analyses et deltas s'appliquent aux deux.
+    """
+
+    def __init__(self, partials):
+        self.partials = partials
+        self.updates = 0
+        # Lectures concurrentes possibles depuis le pool des sections
+        self._lock = threading.RLock()
+        self._rebuild(np.zeros(len(partials.units), dtype=bool))
+
+    def _rebuild(self, selected):
+        partials = self.partials
+        self.selected = selected
+        self.totals = np.zeros((len(partials.epci), len(partials.cells), len(partials.measures)))
+        np.add.at(self.totals, partials.epci_of[selected], partials.values[selected])
+        self._counts = {}
+        self.updates = 0
+
+    def update(self, filters):
+        """
+        Aligne les totaux sur la sélection EPCI / communes de `filters`
+        """
+        with self._lock:
+            return self._update(self.partials.selection(**filters))
+
+    def _update(self, selected):
+        added = np.flatnonzero(selected & ~self.selected)
+        removed = np.flatnonzero(self.selected & ~selected)
+        changed = len(added) + len(removed)
+        if not changed:
+            return self
+
+        # Une grosse retouche (ou trop de retouches cumulées) coûte moins cher à recalculer
+        if changed >= selected.sum() or self.updates >= REBUILD_EVERY:
+            self._rebuild(selected)
+            return self
+
+        partials = self.partials
+        np.add.at(self.totals, partials.epci_of[added], partials.values[added])
+        np.subtract.at(self.totals, partials.epci_of[removed], partials.values[removed])
+        for mask, (present, counts) in self._counts.items():
+            np.add.at(counts, partials.epci_of[added], present[added])
+            np.subtract.at(counts, partials.epci_of[removed], present[removed])
+        self.selected = selected
+        self.updates += 1
+        return self
+
+    def cells(self, dims=(), **filters):
+        """
+        Totaux de la sélection par cellule (et par EPCI si demandé), au format de Cube.cells
+        """
+        available = set(self.partials.cells.columns) | {'Nom_EPCI'}
+        if not set(dims) <= available:
+            raise KeyError(f"Dimensions absentes des totaux incrémentaux : {sorted(set(dims) - available)}")
+        partials = self.partials
+        cells = np.flatnonzero(partials.cell_mask(**filters))
+        with self._lock:
+            self.update(filters)
+            totals = self.totals[:, cells, :]
+        columns = {}
+        if 'Nom_EPCI' in dims:
+            # Une ligne par EPCI x cellule
+            epci = np.repeat(np.arange(totals.shape[0]), len(cells))
+            cells = np.tile(cells, totals.shape[0])
+            columns['Nom_EPCI'] = np.asarray(partials.epci, dtype=object)[epci]
+            totals = totals.reshape(-1, totals.shape[2])
+        else:
+            totals = totals.sum(axis=0)
+
+        # Cellules sans ligne dans la sélection : absentes, comme dans le cube
+        lignes = totals[:, partials.measures.index('Lignes')]
+        keep = lignes > 0
+        columns = {dim: values[keep] for dim, values in columns.items()}
+        columns.update({dim: values[cells[keep]] for dim, values in partials.cell_columns.items()})
+        columns.update({measure: totals[keep, i] for i, measure in enumerate(partials.measures)})
+        columns['Lignes'] = np.rint(lignes[keep]).astype(np.int64)
+        return pd.DataFrame(columns)
+
+    def commune_counts(self, by=(), type_budgets=None, **filters):
+        """
+        Nombre de communes de la sélection ayant au moins une ligne dans les cellules
+        filtrées (et des types de budget donnés), au total ou par EPCI
+        """
+        mask = self.partials.cell_mask(**filters)
+        if type_budgets is not None and 'Type_budget' in self.partials.cells.columns:
+            mask &= self.partials.cells['Type_budget'].isin(type_budgets).to_numpy()
+
+        with self._lock:
+            self.update(filters)
+            counts = self._selected_counts(mask).copy()
+
+        if 'Nom_EPCI' in by:
+            series = pd.Series(counts, index=pd.Index(self.partials.epci, name='Nom_EPCI'), name='Commune')
+            return series[series.index.notna() & (series > 0)]
+        return int(counts.sum())
+
+    def _selected_counts(self, mask):
+        # Communes présentes par EPCI, maintenues par différence pour chaque masque de cellules
+        signature = mask.tobytes()
+        if signature not in self._counts:
+            if len(self._counts) >= COUNT_CACHE_SIZE:
+                self._counts.clear()
+            partials = self.partials
+            present = (partials.values[:, mask, partials.measures.index('Lignes')].sum(axis=1) > 0).astype(np.int64)
+            if 'Commune' in partials.units.columns:
+                present &= partials.units['Commune'].notna().to_numpy()
+            counts = np.bincount(partials.epci_of[self.selected], weights=present[self.selected],
+                                 minlength=len(partials.epci)).astype(np.int64)
+            self._counts[signature] = (present, counts)
+        return self._counts[signature][1]
+
+
+def session_totals(state, partials, key='totaux_incrementaux'):
+    """
+    Totaux incrémentaux de la session (st.session_state), recréés avec la version des données
+    """
+    totals = state.get(key)
+    if totals is None or totals.partials is not partials:
+        totals = IncrementalTotals(partials)
+        state[key] = totals
+    return totals
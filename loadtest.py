@@ -0,0 +1,207 @@
+# loadtest.py - Test de charge : sessions simultanées simulées avec l'API de test Streamlit
+import argparse
+import contextlib
+import gc
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+
+import geo
+import memprof
+import ofgl_data
+import synthetic_data
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Dashboard.py')
+
+# Filtres de la sidebar (libellés des multiselects)
+FILTER_LABELS = ['EPCI', 'Communes', 'Types de budget', 'Indicateurs financiers']
+
+# Widgets propres aux onglets (Streamlit rend tous les onglets à chaque exécution :
+# changer d'onglet côté navigateur ne relance pas le script, interagir avec un onglet si)
+TAB_WIDGETS = ['drill_epci', 'table_epci_sort', 'table_epargne_sort', 'table_synthese_sort',
+               'exercice_dette', 'groupe_pairs', 'agregat_pairs', 'exercice_alertes',
+               'agregat_carte', 'exercice_carte', 'resolution_carte', 'commune_similaire']
+
+FILTER_PROBABILITY = 0.6
+RESET_PROBABILITY = 0.2
+
+
+def _change_filter(app, rng):
+    widgets = [w for w in app.multiselect if any(w.label.startswith(label) for label in FILTER_LABELS)]
+    if not widgets:
+        return 'aucune'
+    widget = rng.choice(widgets)
+    if rng.random() < RESET_PROBABILITY:
+        # Sélection vide : aucun filtre
+        widget.set_value([])
+    else:
+        widget.set_value(rng.sample(list(widget.options), rng.randint(1, len(widget.options))))
+    return f"filtre {widget.label}"
+
+
+def _use_tab_widget(app, rng):
+    widgets = [w for w in app.selectbox if w.key in TAB_WIDGETS and len(w.options) > 1]
+    if not widgets:
+        return _change_filter(app, rng)
+    widget = rng.choice(widgets)
+    widget.set_value(rng.choice(list(widget.options)))
+    return f"onglet {widget.key}"
+
+
+@contextlib.contextmanager
+def shared_script_cache():
+    """
+    Le serveur compile le script une fois par processus, AppTest à chaque exécution.
+    Le temps du test, toutes les sessions partagent un même cache de bytecode, comme sur
+    le serveur (la compilation concurrente n'est par ailleurs pas sûre entre threads sous
+    CPython 3.11). S'appuie sur ScriptCache, interne à Streamlit (versions 1.28 à 1.66) :
+    absent, les sessions gardent chacune leur cache.
+    """
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    if not all(hasattr(module, 'ScriptCache') for module in (app_test, local_script_runner)):
+        yield
+        return
+
+    shared_cache = app_test.ScriptCache()
+    with mock.patch.object(app_test, 'ScriptCache', lambda: shared_cache), \
+            mock.patch.object(local_script_runner, 'ScriptCache', lambda: shared_cache):
+        yield
+
+
+def _run(app, action, errors):
+    try:
+        app.run()
+    except Exception as e:
+        errors.append(f"{action} : {e}")
+        return False
+    errors.extend(f"{action} : {exc.value}" for exc in app.exception)
+    return True
+
+
+def _session(script, actions, seed, timeout, latencies, errors, ready):
+    """
+    Une session : ouverture (exécution initiale) puis `actions` interactions aléatoires,
+    chacune suivie d'une réexécution chronométrée
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    opened = False
+    try:
+        app = AppTest.from_file(script, default_timeout=timeout)
+        opened = _run(app, 'ouverture', errors)
+    except Exception as e:
+        errors.append(f"ouverture : {e}")
+    finally:
+        # Toujours rejoindre la barrière : sinon run_load_test attendrait indéfiniment
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            opened = False
+    if not opened:
+        return
+
+    for _ in range(actions):
+        action = _change_filter(app, rng) if rng.random() < FILTER_PROBABILITY else _use_tab_widget(app, rng)
+        start = time.perf_counter()
+        if not _run(app, action, errors):
+            return
+        latencies.append(time.perf_counter() - start)
+
+
+def run_load_test(sessions, actions=10, script=SCRIPT, timeout=120, seed=0):
+    """
+    Lance `sessions` sessions simultanées dans ce processus (comme un serveur Streamlit)
+    et mesure la latence des réexécutions, le débit et l'évolution de la mémoire.
+    Les sessions sont d'abord toutes ouvertes, puis interagissent en même temps.
+    """
+    gc.collect()
+    rss_start = memprof.rss_bytes()
+    latencies, errors = [], []
+    ready = threading.Barrier(sessions + 1)
+    threads = [
+        threading.Thread(target=_session, args=(script, actions, seed + i, timeout, latencies, errors, ready),
+                         name=f'session-{i}')
+        for i in range(sessions)
+    ]
+
+    open_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    gc.collect()
+    rss_end = memprof.rss_bytes()
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (np.nan,) * 3
+    return {
+        'sessions': sessions,
+        'reexecutions': len(latencies),
+        'erreurs': errors,
+        'ouverture_s': start - open_start,
+        'duree_s': duration,
+        'debit_par_s': len(latencies) / duration if duration > 0 else np.nan,
+        'latence_p50_ms': p50,
+        'latence_p95_ms': p95,
+        'latence_p99_ms': p99,
+        'latence_moyenne_ms': values.mean() if len(values) else np.nan,
+        'latence_max_ms': values.max() if len(values) else np.nan,
+        'rss_debut_octets': rss_start,
+        'rss_fin_octets': rss_end,
+        'croissance_rss_octets': rss_end - rss_start if rss_start and rss_end else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du dashboard (sessions simultanées, hors ligne)")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Nombres de sessions simultanées à enchaîner")
+    parser.add_argument('--actions', type=int, default=10, help="Interactions par session")
+    parser.add_argument('--communes', type=int, default=60, help="Communes synthétiques par département hors Réunion")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=int, default=120, help="Délai maximal d'une réexécution (secondes)")
+    parser.add_argument('--output', help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    script = os.path.abspath(SCRIPT)
+    with shared_script_cache(), tempfile.TemporaryDirectory() as tmp_dir:
+        # Le dashboard lit le fichier source dans le répertoire courant
+        synthetic_data.write(os.path.join(tmp_dir, ofgl_data.SOURCE_PATH), args.communes, seed=args.seed)
+        synthetic_data.write_geojson(os.path.join(tmp_dir, geo.GEOJSON_PATH), seed=args.seed)
+        os.chdir(tmp_dir)
+
+        # Exécution à froid : chargement du jeu et construction des index partagés
+        warmup = run_load_test(1, 0, script, args.timeout, args.seed)
+        print(f"Démarrage à froid : {warmup['ouverture_s'] * 1000:,.0f} ms")
+
+        print(f"{'sessions':>8} {'réexéc.':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'débit/s':>8} {'RSS Mo':>8} {'Δ RSS Mo':>9} {'erreurs':>8}")
+        results = []
+        for sessions in args.sessions:
+            result = run_load_test(sessions, args.actions, script, args.timeout, args.seed)
+            results.append(result)
+            print(f"{sessions:>8} {result['reexecutions']:>8} {result['latence_p50_ms']:>8,.0f} "
+                  f"{result['latence_p95_ms']:>8,.0f} {result['latence_p99_ms']:>8,.0f} "
+                  f"{result['debit_par_s']:>8.2f} {(result['rss_fin_octets'] or 0) / 1e6:>8,.0f} "
+                  f"{(result['croissance_rss_octets'] or 0) / 1e6:>9,.1f} {len(result['erreurs']):>8}")
+            for error in result['erreurs'][:3]:
+                print(f"    {error}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'demarrage': warmup, 'resultats': results}, f, ensure_ascii=False, indent=2, default=float)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+# memprof.py - Mesure de la mémoire : jeu partagé, index dérivés et allocations par section
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Activation par l'exploitant seulement (variable d'environnement ou `python memprof.py`) :
+# tracemalloc trace tout le processus, un visiteur ne doit pas pouvoir l'allumer
+ENV_VAR = 'OFGL_MEMPROF'
+SESSION_KEY = 'memprof_report'
+
+TRACE_FRAMES = 1
+TOP_SITES = 5
+
+# Objets de session suivis dans le namespace du script
+TRACKED_TYPES = (pd.DataFrame, pd.Series, str, bytes)
+MIN_TRACKED_BYTES = 1024
+
+
+def is_enabled():
+    return os.environ.get(ENV_VAR, '').lower() in ('1', 'true', 'oui')
+
+
+def deep_size(obj, _seen=None):
+    """
+    Taille profonde approximative (octets) : memory_usage(deep=True) pour pandas,
+    nbytes pour NumPy, parcours des attributs et conteneurs pour le reste
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(deep_size(item, seen) for item in obj)
+    if callable(obj) or type(obj).__module__ in ('_thread', 'threading'):
+        return 0
+    if hasattr(obj, '__dict__'):
+        return sys.getsizeof(obj) + deep_size(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+def _rss_bytes():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def rss_bytes():
+    """
+    RSS courant du processus (Linux), sinon RSS maximal
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return _rss_bytes()
+
+
+def dataset_report(dataset):
+    """
+    Taille du jeu partagé et de chaque index dérivé déjà construit
+    """
+    rows = [{'objet': 'df', 'octets': deep_size(dataset.df), 'lignes': len(dataset.df)}]
+    for name, derived in dataset.built_derived().items():
+        rows.append({
+            'objet': f"derived['{name}']",
+            'octets': deep_size(derived),
+            'lignes': len(derived) if isinstance(derived, pd.DataFrame) else None
+        })
+    return rows
+
+
+class MemoryProfiler:
+    """
+    Allocations d'une exécution du script mesurées par tracemalloc entre points de
+    contrôle successifs (une section = ce qui s'est passé depuis le point précédent).
+    Les points de contrôle ne relèvent que les compteurs (net et pic) ; la comparaison
+    de snapshots, coûteuse sur un gros tas, n'est faite qu'une fois dans report().
+    Inactif, chaque appel est sans effet. Le traçage démarré par un profileur est arrêté
+    par son report() : il ne ralentit pas les exécutions suivantes.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.sections = []
+        self.objects = {}
+        self._owns_tracing = False
+        self._started = time.perf_counter()
+        if not enabled:
+            return
+        self._owns_tracing = not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        self._snapshot = tracemalloc.take_snapshot()
+        self._current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def checkpoint(self, name):
+        """
+        Clôt la section `name` : allocations nettes et pic depuis le point précédent
+        """
+        if not self.enabled:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        now = time.perf_counter()
+        self.sections.append({
+            'section': name,
+            'net_octets': current - self._current,
+            'pic_octets': max(peak - self._current, 0),
+            'duree_s': round(now - self._started, 4),
+        })
+        self._current = current
+        self._started = now
+        tracemalloc.reset_peak()
+
+    def top_sites(self, limit=TOP_SITES):
+        """
+        Principaux sites d'allocation encore vivants depuis le début de l'exécution
+        """
+        snapshot = tracemalloc.take_snapshot()
+        sites = []
+        for stat in snapshot.compare_to(self._snapshot, 'lineno'):
+            frame = stat.traceback[0]
+            if frame.filename in (tracemalloc.__file__, '<unknown>') or frame.filename.startswith('<frozen'):
+                continue
+            sites.append({'site': f"{frame.filename}:{frame.lineno}", 'octets': stat.size_diff, 'blocs': stat.count_diff})
+            if len(sites) == limit:
+                break
+        return sites
+
+    def track(self, name, obj):
+        if self.enabled:
+            self.objects[name] = obj
+
+    def track_namespace(self, namespace, shared=()):
+        """
+        Suit les DataFrames, séries et chaînes volumineuses du namespace du script,
+        hors objets partagés entre sessions (jeu de données, index dérivés)
+        """
+        if not self.enabled:
+            return
+        shared_ids = {id(obj) for obj in shared}
+        for name, obj in namespace.items():
+            if name.startswith('_') or id(obj) in shared_ids or not isinstance(obj, TRACKED_TYPES):
+                continue
+            if isinstance(obj, (str, bytes)) and sys.getsizeof(obj) < MIN_TRACKED_BYTES:
+                continue
+            self.track(name, obj)
+
+    def stop(self):
+        """
+        Arrête tracemalloc s'il a été démarré par ce profileur
+        """
+        if self._owns_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._owns_tracing = False
+
+    def report(self, dataset=None):
+        """
+        Rapport complet, sérialisable en JSON. Arrête ensuite le traçage démarré par ce profileur.
+        """
+        current, peak = tracemalloc.get_traced_memory() if self.enabled else (None, None)
+        session = [{'objet': name, 'type': type(obj).__name__, 'octets': deep_size(obj)}
+                   for name, obj in self.objects.items()]
+        session.sort(key=lambda row: row['octets'], reverse=True)
+        sites = self.top_sites() if self.enabled else []
+        self.stop()
+        return {
+            'processus': {
+                'rss_max_octets': _rss_bytes(),
+                'tracemalloc_courant_octets': current,
+                'tracemalloc_pic_octets': peak,
+            },
+            'jeu_de_donnees': dataset_report(dataset) if dataset is not None else [],
+            'version': getattr(dataset, 'version', None),
+            'session': session,
+            'sections': self.sections,
+            'sites': sites,
+        }
+
+
+def run_dashboard(script='Dashboard.py', timeout=300):
+    """
+    Exécute le dashboard une fois (AppTest, sans navigateur) avec le profilage activé
+    et renvoie le rapport mémoire de l'exécution
+    """
+    from streamlit.testing.v1 import AppTest
+
+    os.environ[ENV_VAR] = '1'
+    app = AppTest.from_file(script, default_timeout=timeout)
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return app.session_state[SESSION_KEY]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapport mémoire d'une exécution du dashboard (JSON)")
+    parser.add_argument('--script', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Dashboard.py'))
+    parser.add_argument('--output', default='-', help="Fichier JSON (défaut : sortie standard)")
+    args = parser.parse_args()
+
+    report = run_dashboard(args.script)
+    content = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(content)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(content)
+        total = sum(row['octets'] for row in report['jeu_de_donnees'])
+        print(f"Jeu partagé et index : {total / 1_000_000:,.1f} Mo - "
+              f"RSS max : {(report['processus']['rss_max_octets'] or 0) / 1_000_000:,.1f} Mo - rapport : {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+# ofgl_data.py - Chargement, nettoyage et matérialisation des données OFGL
+import argparse
+import os
+import zipfile
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+# Fichier source et département analysé
+SOURCE_PATH = 'ofgl-base-communes.csv'
+CODE_DEPARTEMENT = '974'
+
+# Extraits compressés acceptés à la place du CSV (lus en décompression à la volée)
+COMPRESSED_SUFFIXES = ['.gz', '.zst', '.bz2']
+
+# Lignes lues à la fois quand le filtre départemental s'applique pendant la lecture
+CHUNK_ROWS = 200_000
+
+# Variable d'environnement activant le mode Arrow partagé entre processus
+ARROW_ENV_VAR = 'OFGL_ARROW_PATH'
+ARROW_VERSION_KEY = b'ofgl_source_version'
+
+# Standardisation des noms de colonnes
+COLUMN_MAPPING = {
+    'Exercice': 'Exercice',
+    'Outre-mer': 'Outre_mer',
+    'Code Insee 2024 Région': 'Code_Region',
+    'Nom 2024 Région': 'Nom_Region',
+    'Code Insee 2024 Département': 'Code_Departement',
+    'Nom 2024 Département': 'Nom_Departement',
+    'Code Siren 2024 EPCI': 'Code_EPCI',
+    'Nom 2024 EPCI': 'Nom_EPCI',
+    'Strate population 2024': 'Strate_population',
+    'Commune rurale': 'Commune_rurale',
+    'Commune de montagne': 'Commune_montagne',
+    'Commune touristique': 'Commune_touristique',
+    'Tranche revenu par habitant': 'Tranche_revenu',
+    'Présence QPV': 'Presence_QPV',
+    'Code Insee 2024 Commune': 'Code_Commune',
+    'Nom 2024 Commune': 'Commune',
+    'Catégorie': 'Categorie',
+    'Code Siren Collectivité': 'Code_Siren_Collectivite',
+    'Code Insee Collectivité': 'Code_Insee_Collectivite',
+    'Siret Budget': 'Siret_Budget',
+    'Libellé Budget': 'Libelle_Budget',
+    'Type de budget': 'Type_budget',
+    'Nomenclature': 'Nomenclature',
+    'Agrégat': 'Agregat',
+    'Montant': 'Montant',
+    'Montant en millions': 'Montant_millions',
+    'Population totale': 'Population',
+    'Montant en € par habitant': 'Montant_par_habitant',
+    'Compte 2024 Disponible': 'Compte_disponible',
+    'code_type_budget': 'code_type_budget',
+    'ordre_analyse1_section1': 'ordre_analyse1_section1',
+    'Population totale du dernier exercice': 'Population_dernier_exercice'
+}
+
+NUMERIC_COLS = ['Montant', 'Montant_millions', 'Population',
+                'Montant_par_habitant', 'Population_dernier_exercice',
+                'Strate_population', 'Tranche_revenu']
+
+TEXT_COLS = ['Commune_rurale', 'Commune_montagne', 'Commune_touristique', 'Presence_QPV']
+
+# Identifiants lus comme texte : même type quel que soit le morceau lu ou le département
+# ('2A004', codes à zéro initial), et donc comparables entre jeu local et jeu national
+IDENTIFIER_COLS = ['Code_Region', 'Code_Departement', 'Code_EPCI', 'Code_Commune',
+                   'Code_Siren_Collectivite', 'Code_Insee_Collectivite', 'Siret_Budget']
+
+IDENTIFIER_DTYPES = {raw: str for raw, col in COLUMN_MAPPING.items() if col in IDENTIFIER_COLS}
+
+
+def find_source(path=SOURCE_PATH):
+    """
+    Fichier source effectif : `path` s'il existe, sinon sa version compressée
+    (ofgl-base-communes.csv.gz, .csv.zst, .csv.bz2 ou ofgl-base-communes.zip)
+    """
+    if os.path.exists(path):
+        return path
+    candidates = [path + suffix for suffix in COMPRESSED_SUFFIXES]
+    candidates.append(os.path.splitext(path)[0] + '.zip')
+    return next((candidate for candidate in candidates if os.path.exists(candidate)), path)
+
+
+@contextmanager
+def _open_source(path):
+    """
+    Chemin ou flux à passer à read_csv. gzip, zstd et bz2 sont décompressés à la volée
+    par pandas ; une archive zip est lue via son membre CSV (il peut y en avoir d'autres)
+    """
+    if not path.endswith('.zip'):
+        yield path
+        return
+    with zipfile.ZipFile(path) as archive:
+        members = [name for name in archive.namelist() if name.lower().endswith('.csv')]
+        if not members:
+            raise ValueError(f"Aucun fichier CSV dans l'archive {path}")
+        with archive.open(members[0]) as stream:
+            yield stream
+
+
+def _read_csv(path, encoding, usecols, departement):
+    with _open_source(path) as source:
+        if departement is None:
+            return pd.read_csv(source, sep=';', low_memory=False, encoding=encoding, usecols=usecols,
+                               dtype=IDENTIFIER_DTYPES)
+
+        # Filtre départemental morceau par morceau : seules les lignes retenues restent en mémoire
+        chunks = []
+        for chunk in pd.read_csv(source, sep=';', encoding=encoding, usecols=usecols,
+                                 dtype=IDENTIFIER_DTYPES, chunksize=CHUNK_ROWS):
+            code_col = next((col for col in chunk.columns
+                             if COLUMN_MAPPING.get(col.strip()) == 'Code_Departement'), None)
+            if code_col is not None:
+                chunk = chunk[departement_mask(chunk[code_col], departement)]
+            chunks.append(chunk)
+        return pd.concat(chunks, ignore_index=True)
+
+
+def read_source(path=SOURCE_PATH, columns=None, departement=None):
+    """
+    Lit le fichier OFGL brut, CSV ou compressé (UTF-8, puis latin-1 en secours).
+    columns restreint la lecture à ces colonnes (noms standardisés) : les autres
+    ne sont jamais converties ni gardées en mémoire. departement filtre les lignes
+    pendant la lecture, par morceaux, sans jamais charger le fichier entier.
+    """
+    path = find_source(path)
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        if departement is not None:
+            wanted.add('Code_Departement')
+        usecols = lambda col: COLUMN_MAPPING.get(col.strip(), col.strip()) in wanted
+
+    try:
+        return _read_csv(path, 'utf-8', usecols, departement)
+    except UnicodeDecodeError:
+        return _read_csv(path, 'latin-1', usecols, departement)
+
+
+def departement_mask(series, code=CODE_DEPARTEMENT):
+    """
+    Masque des lignes d'un département, que le code soit lu comme nombre ou texte ('974', 974, '2A')
+    """
+    codes = series.astype(str).str.strip().str.removesuffix('.0')
+    return codes == str(code)
+
+
+def clean_dataset(df, departement=CODE_DEPARTEMENT):
+    """
+    Nettoie le fichier brut : noms de colonnes, types numériques, indicateurs texte
+    et filtre départemental (None pour conserver le fichier national)
+    """
+    df.columns = df.columns.str.strip()
+
+    # Renommer les colonnes existantes
+    existing_columns = {old: new for old, new in COLUMN_MAPPING.items() if old in df.columns}
+    df = df.rename(columns=existing_columns)
+
+    # Conversion des colonnes numériques avec gestion des erreurs
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Nettoyage des colonnes texte
+    for col in TEXT_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip().str.upper()
+
+    # Filtre départemental (La Réunion par défaut)
+    if departement is not None and 'Code_Departement' in df.columns:
+        df = df[departement_mask(df['Code_Departement'], departement)]
+
+    return df.reset_index(drop=True)
+
+
+def load_dataset(path=SOURCE_PATH, departement=CODE_DEPARTEMENT, columns=None):
+    """
+    Lit et nettoie le fichier OFGL
+    """
+    return clean_dataset(read_source(path, columns, departement), departement)
+
+
+def source_version(path=SOURCE_PATH):
+    """
+    Identité du fichier source (taille, date de modification, inode), None s'il est absent
+    """
+    try:
+        stat = os.stat(find_source(path))
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_size}-{stat.st_mtime_ns}-{stat.st_ino}"
+
+
+# Matérialisation Arrow IPC
+def _to_arrow_table(df):
+    """
+    Convertit le DataFrame en table Arrow. Les colonnes numériques gardent leurs NaN
+    (pas de masque de validité) pour être relues sans copie depuis le fichier mappé.
+    """
+    arrays = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            arrays[col] = pa.array(series.to_numpy(), from_pandas=False)
+        else:
+            arrays[col] = pa.array(series, from_pandas=True)
+    return pa.table(arrays)
+
+
+def write_arrow(df, arrow_path, version=None):
+    """
+    Écrit le jeu nettoyé au format Arrow IPC (non compressé, donc mappable).
+    L'écriture passe par un fichier temporaire renommé atomiquement : un processus
+    lecteur ne voit jamais de fichier partiel.
+    """
+    table = _to_arrow_table(df)
+    if version is not None:
+        table = table.replace_schema_metadata({ARROW_VERSION_KEY: version.encode()})
+
+    tmp_path = f"{arrow_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, arrow_path)
+
+
+def arrow_version(arrow_path):
+    """
+    Version du fichier source enregistrée dans le fichier Arrow, None s'il est absent
+    """
+    if not os.path.exists(arrow_path):
+        return None
+    with pa.memory_map(arrow_path, 'r') as source:
+        metadata = ipc.open_file(source).schema.metadata or {}
+    version = metadata.get(ARROW_VERSION_KEY)
+    return version.decode() if version else None
+
+
+def read_arrow(arrow_path):
+    """
+    Ouvre le fichier Arrow par memory-mapping. Les colonnes numériques du DataFrame
+    pointent directement sur les pages du fichier : le cache du système les partage
+    entre tous les processus qui l'ouvrent. Les colonnes texte ne sont partagées
+    qu'avec pandas >= 3 (chaînes stockées en Arrow) ; avec pandas 2, elles sont
+    converties en objets Python, copiés dans chaque processus.
+    """
+    source = pa.memory_map(arrow_path, 'r')
+    table = ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def shared_table_path(arrow_path, name):
+    """
+    Chemin d'une table dérivée matérialisée à côté du fichier Arrow principal
+    """
+    root, ext = os.path.splitext(arrow_path)
+    return f"{root}-{name}{ext or '.arrow'}"
+
+
+@contextmanager
+def _build_lock(arrow_path):
+    """
+    Verrou exclusif entre processus pendant la reconstruction d'un fichier Arrow
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{arrow_path}.lock", 'w') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _is_stale(arrow_path, version):
+    stored_version = arrow_version(arrow_path)
+    return stored_version is None or (version is not None and stored_version != version)
+
+
+def load_shared_table(arrow_path, build, path=SOURCE_PATH):
+    """
+    Table dérivée partagée entre processus : construite par build() une seule fois
+    par version du fichier source, puis mappée en mémoire comme le jeu principal.
+    Un seul processus reconstruit ; les autres attendent le verrou puis relisent.
+    """
+    version = source_version(path)
+
+    if _is_stale(arrow_path, version):
+        with _build_lock(arrow_path):
+            if _is_stale(arrow_path, version):
+                write_arrow(build(), arrow_path, version)
+
+    return read_arrow(arrow_path)
+
+
+def load_shared_dataset(arrow_path, path=SOURCE_PATH):
+    """
+    Mode partagé : matérialise le jeu nettoyé une seule fois puis le mappe en mémoire.
+    Le fichier Arrow est reconstruit seulement si le CSV source a changé ; sans CSV,
+    le fichier Arrow existant est utilisé tel quel.
+    """
+    return load_shared_table(arrow_path, lambda: load_dataset(path), path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matérialise le jeu OFGL nettoyé au format Arrow IPC")
+    parser.add_argument('--source', default=SOURCE_PATH, help="Fichier OFGL (CSV, .csv.gz, .csv.zst, .csv.bz2 ou .zip)")
+    parser.add_argument('--output', default=os.environ.get(ARROW_ENV_VAR, 'ofgl-communes.arrow'),
+                        help="Fichier Arrow à produire")
+    args = parser.parse_args()
+
+    df = load_dataset(args.source)
+    write_arrow(df, args.output, source_version(args.source))
+    print(f"{len(df):,} lignes écrites dans {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# peers.py - Positionnement des communes dans leur groupe de pairs national
+import pandas as pd
+
+import analyses
+import ofgl_data
+
+# Définition des groupes de pairs : colonnes dont les valeurs doivent être identiques
+PEER_GROUPS = {
+    'Strate et tranche de revenu': ['Strate_population', 'Tranche_revenu'],
+    'Strate de population': ['Strate_population'],
+    'Tranche de revenu': ['Tranche_revenu'],
+    'Strate et commune rurale': ['Strate_population', 'Commune_rurale'],
+    'Strate et commune de montagne': ['Strate_population', 'Commune_montagne'],
+    'Strate et commune touristique': ['Strate_population', 'Commune_touristique'],
+    'Strate et présence QPV': ['Strate_population', 'Presence_QPV'],
+}
+
+PEER_LABELS = {
+    'Strate_population': 'Strate',
+    'Tranche_revenu': 'Tranche revenu',
+    'Commune_rurale': 'Rurale',
+    'Commune_montagne': 'Montagne',
+    'Commune_touristique': 'Touristique',
+    'Presence_QPV': 'QPV',
+}
+
+QUANTILES = {'P10': 0.10, 'P25': 0.25, 'Mediane': 0.50, 'P75': 0.75, 'P90': 0.90}
+
+# Colonnes lues dans le fichier national (projection)
+NATIONAL_COLUMNS = ['Exercice', 'Code_Departement', 'Code_Commune', 'Commune', 'Type_budget',
+                    'Agregat', 'Montant_par_habitant'] + list(PEER_LABELS)
+
+INDEX_KEYS = ['Groupe', 'Agregat', 'Exercice', 'Code_Commune']
+
+
+def load_national(path=ofgl_data.SOURCE_PATH):
+    """
+    Fichier national réduit aux colonnes utiles aux groupes de pairs
+    """
+    return ofgl_data.load_dataset(path, departement=None, columns=NATIONAL_COLUMNS)
+
+
+def build_peer_table(national_df, departement=ofgl_data.CODE_DEPARTEMENT):
+    """
+    Table des positions des communes du département dans leur groupe de pairs national.
+    Pour chaque groupe de pairs, agrégat et exercice, les quantiles du montant par habitant
+    et le rang centile de chaque commune sont calculés une fois sur tout le fichier
+    (budget principal), puis seules les lignes du département sont conservées.
+    """
+    base = national_df[national_df['Type_budget'] == analyses.BUDGET_PRINCIPAL]
+    base = base.dropna(subset=['Montant_par_habitant', 'Agregat'])
+    local_mask = ofgl_data.departement_mask(base['Code_Departement'], departement)
+
+    tables = []
+    for groupe, keys in PEER_GROUPS.items():
+        if any(key not in base.columns for key in keys):
+            continue
+        rows = base.dropna(subset=keys)
+        group_cols = keys + ['Agregat', 'Exercice']
+        grouped = rows.groupby(group_cols, sort=False)['Montant_par_habitant']
+
+        # Quantiles du groupe de pairs (une ligne par groupe x agrégat x exercice)
+        quantiles = grouped.quantile(list(QUANTILES.values())).unstack()
+        quantiles.columns = list(QUANTILES)
+        quantiles['Nb_pairs'] = grouped.size()
+
+        # Rang centile de chaque commune dans son groupe
+        percentile = grouped.rank(pct=True) * 100
+
+        local = rows[local_mask.reindex(rows.index)]
+        table = local[['Code_Commune', 'Commune'] + group_cols + ['Montant_par_habitant']].copy()
+        table['Percentile'] = percentile.reindex(local.index)
+        table = table.merge(quantiles, left_on=group_cols, right_index=True, how='left')
+
+        table['Cle_pairs'] = table[keys[0]].map(lambda value, key=keys[0]: f"{PEER_LABELS[key]} {_format_key(value)}")
+        for key in keys[1:]:
+            table['Cle_pairs'] += table[key].map(lambda value, key=key: f" · {PEER_LABELS[key]} {_format_key(value)}")
+
+        table['Groupe'] = groupe
+        tables.append(table.drop(columns=keys))
+
+    if not tables:
+        return pd.DataFrame(columns=INDEX_KEYS + ['Commune', 'Cle_pairs', 'Montant_par_habitant',
+                                                  'Percentile', 'Nb_pairs'] + list(QUANTILES))
+    return pd.concat(tables, ignore_index=True)
+
+
+def _format_key(value):
+    """
+    Libellé lisible d'une valeur de clé de groupe (3.0 -> 3)
+    """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class PeerIndex:
+    """
+    Table des positions indexée par (Groupe, Agrégat, Exercice, Code commune) :
+    la position d'une commune est une lecture indexée, sans groupby à la requête.
+    """
+
+    def __init__(self, table):
+        self.table = table.set_index(INDEX_KEYS).sort_index()
+
+    @property
+    def agregats(self):
+        return self.table.index.get_level_values('Agregat').unique().tolist()
+
+    def exercices(self, agregat):
+        if agregat not in self.agregats:
+            return []
+        return sorted(self.table.xs(agregat, level='Agregat').index.get_level_values('Exercice').unique().tolist())
+
+    def positions(self, groupe, agregat, exercice, communes=None):
+        """
+        Positions de toutes les communes (ou de codes communes donnés) pour un groupe de pairs
+        """
+        try:
+            view = self.table.loc[(groupe, agregat, exercice)]
+        except KeyError:
+            return self.table.iloc[0:0].reset_index()
+        if communes is not None:
+            view = view[view.index.isin(communes)]
+        return view.reset_index()
+
+    def lookup(self, groupe, agregat, exercice, code_commune):
+        """
+        Position d'une commune dans son groupe de pairs (None si absente)
+        """
+        try:
+            row = self.table.loc[(groupe, agregat, exercice, code_commune)]
+        except KeyError:
+            return None
+        if isinstance(row, pd.DataFrame):
+            row = row.iloc[0]
+        return row.to_dict()
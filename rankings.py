@@ -0,0 +1,116 @@
+# rankings.py - Index de classement précalculé pour les vues Top-N / Bottom-N
+import numpy as np
+import pandas as pd
+
+
+def _walk(order, mask, n):
+    """
+    Parcourt un ordre précalculé et retient les positions présentes dans le masque.
+    Pour un Top-N, le parcours s'arrête dès que n positions ont été trouvées.
+    """
+    if n is None:
+        return order[mask[order]]
+
+    found = []
+    count = 0
+    start = 0
+    step = max(4 * n, 64)
+    while start < len(order) and count < n:
+        chunk = order[start:start + step]
+        chunk = chunk[mask[chunk]]
+        found.append(chunk)
+        count += len(chunk)
+        start += step
+        step *= 2
+
+    if not found:
+        return order[:0]
+    return np.concatenate(found)[:n]
+
+
+class RankingIndex:
+    """
+    Ordres de tri (valeur décroissante et croissante) précalculés par (groupe, métrique,
+    exercice), construits une fois par version du jeu de données. L'exercice None regroupe
+    tous les exercices. Les valeurs manquantes sont exclues des classements ; les égalités
+    gardent l'ordre d'origine dans les deux sens.
+    """
+
+    def __init__(self, df, metrics, group_col=None, exercice_col='Exercice'):
+        self._index = df.index
+        self._orders = {}
+
+        if group_col is not None:
+            group_codes, group_values = pd.factorize(df[group_col])
+        else:
+            group_codes, group_values = np.zeros(len(df), dtype=np.intp), [None]
+
+        if exercice_col in df.columns:
+            exercice_codes, exercice_values = pd.factorize(df[exercice_col], use_na_sentinel=False)
+        else:
+            exercice_codes, exercice_values = np.zeros(len(df), dtype=np.intp), [None]
+
+        group_values = list(group_values)
+        exercice_values = list(exercice_values)
+
+        for metric in metrics:
+            if metric not in df.columns:
+                continue
+            values = pd.to_numeric(df[metric], errors='coerce').to_numpy(dtype=float)
+            positions = np.flatnonzero(~np.isnan(values) & (group_codes >= 0))
+            groups = group_codes[positions]
+            exercices = exercice_codes[positions]
+
+            for ascending in (False, True):
+                ranked = values[positions] if ascending else -values[positions]
+
+                # Tous exercices confondus (lexsort est stable : ordre d'origine en cas d'égalité)
+                order = positions[np.lexsort((ranked, groups))]
+                for key, chunk in self._split(order, group_codes[order]):
+                    self._orders[(group_values[key], metric, None, ascending)] = chunk
+
+                # Par exercice
+                order = positions[np.lexsort((ranked, exercices, groups))]
+                keys = group_codes[order] * len(exercice_values) + exercice_codes[order]
+                for key, chunk in self._split(order, keys):
+                    group, exercice = divmod(key, len(exercice_values))
+                    self._orders[(group_values[group], metric, exercice_values[exercice], ascending)] = chunk
+
+    @staticmethod
+    def _split(order, keys):
+        """
+        Découpe un ordre trié par clé en blocs contigus (clé, positions)
+        """
+        if len(order) == 0:
+            return []
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        starts = np.concatenate(([0], bounds))
+        return zip(keys[starts].tolist(), np.split(order, bounds))
+
+    def order(self, frame, metric, group=None, exercice=None, ascending=False, n=None):
+        """
+        Lignes de `frame` (sous-ensemble filtré du jeu indexé) dans l'ordre de classement.
+        n limite le résultat aux n premières lignes (Top-N, ou Bottom-N avec ascending=True).
+        """
+        order = self._orders.get((group, metric, exercice, ascending))
+        if order is None or frame.empty:
+            return frame.iloc[0:0]
+
+        positions = self._index.get_indexer(frame.index)
+        mask = np.zeros(len(self._index), dtype=bool)
+        mask[positions[positions >= 0]] = True
+
+        selected = _walk(order, mask, n)
+        return frame.loc[self._index[selected]]
+
+    def top(self, frame, metric, n, group=None, exercice=None):
+        """
+        Top-N de `frame` selon `metric`
+        """
+        return self.order(frame, metric, group=group, exercice=exercice, n=n)
+
+    def bottom(self, frame, metric, n, group=None, exercice=None):
+        """
+        Bottom-N de `frame` selon `metric`
+        """
+        return self.order(frame, metric, group=group, exercice=exercice, ascending=True, n=n)
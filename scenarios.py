@@ -0,0 +1,185 @@
+# scenarios.py - Simulation d'emprunts : trajectoires d'encours, d'épargne et de désendettement
+import numpy as np
+import pandas as pd
+
+import debt
+
+# Horizon de projection (années après l'exercice de départ)
+HORIZON = 15
+
+# Taux moyen supposé de la dette existante (l'OFGL ne sépare pas intérêts et capital)
+TAUX_DETTE_EXISTANTE = 0.02
+
+# Durée résiduelle supposée quand l'annuité de la dette existante est inconnue
+DUREE_RESIDUELLE = 15
+
+SCENARIO_COLUMNS = ['Montant_par_habitant', 'Taux', 'Duree']
+
+SUMMARY_COLUMNS = ['Commune', 'Exercice', 'Emprunt', 'Annuite_supplementaire', 'Capacite_initiale',
+                   'Capacite_max', 'Annee_max', 'Annees_au_dela_seuil', 'Encours_final']
+
+
+class Simulation:
+    """
+    Résultat d'un lot de scénarios : tableaux commune x scénario x année
+    (année 0 = exercice de départ, puis 1..horizon)
+    """
+
+    def __init__(self, communes, scenarios, years, emprunt, encours, epargne, annuite):
+        self.communes = communes
+        self.scenarios = scenarios
+        self.years = years
+        self.emprunt = emprunt
+        self.encours = encours
+        self.epargne = epargne
+        self.annuite = annuite
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.capacite = np.where(epargne > 0, encours / epargne, np.nan)
+
+    def trajectory(self):
+        """
+        Trajectoire agrégée de l'ensemble des communes, une ligne par scénario et année :
+        encours, épargne brute, annuité et capacité de désendettement (encours total / épargne totale)
+        """
+        encours = np.nansum(self.encours, axis=0)
+        epargne = np.nansum(self.epargne, axis=0)
+        annuite = np.nansum(self.annuite, axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            capacite = np.where(epargne > 0, encours / epargne, np.nan)
+
+        n_scenarios, n_years = encours.shape
+        frame = self.scenarios.loc[np.repeat(np.arange(n_scenarios), n_years)].reset_index(drop=True)
+        frame['Exercice'] = np.tile(self.years, n_scenarios)
+        frame['Encours'] = encours.ravel()
+        frame['Epargne_brute'] = epargne.ravel()
+        frame['Annuite'] = annuite.ravel()
+        frame['Capacite_desendettement'] = capacite.ravel()
+        return frame
+
+    def summary(self, scenario=0, seuil=debt.SEUIL_DESENDETTEMENT):
+        """
+        Effet d'un scénario par commune : capacité de départ, pic de capacité sur l'horizon,
+        nombre d'années au-delà du seuil (ou d'épargne négative) et encours final
+        """
+        capacite = self.capacite[:, scenario, :]
+        projetee = np.where(np.isnan(capacite[:, 1:]), -np.inf, capacite[:, 1:])
+        with np.errstate(invalid='ignore'):
+            depassement = (projetee > seuil) | (self.epargne[:, scenario, 1:] <= 0)
+
+        pic = projetee.max(axis=1)
+        annee_pic = self.years[1:][projetee.argmax(axis=1)]
+        pic = np.where(np.isinf(pic), np.nan, pic)
+
+        frame = self.communes.copy()
+        frame['Emprunt'] = self.emprunt[:, scenario]
+        frame['Annuite_supplementaire'] = self.annuite[:, scenario, 1] - self.annuite[:, scenario, 0]
+        frame['Capacite_initiale'] = capacite[:, 0]
+        frame['Capacite_max'] = pic
+        frame['Annee_max'] = np.where(np.isnan(pic), np.nan, annee_pic)
+        frame['Annees_au_dela_seuil'] = depassement.sum(axis=1)
+        frame['Encours_final'] = self.encours[:, scenario, -1]
+        return frame.reindex(columns=SUMMARY_COLUMNS)
+
+
+def loan_schedule(taux, duree, horizon=HORIZON):
+    """
+    Échéancier d'un emprunt de 1 € à annuités constantes, mobilisé en année 1,
+    pour chaque scénario (taux, durée) : encours restant, intérêts et annuité par année (scénario x année)
+    """
+    taux = np.asarray(taux, dtype=float)[:, None]
+    duree = np.asarray(duree, dtype=float)[:, None]
+    annees = np.arange(horizon + 1, dtype=float)[None, :]
+    facteur = 1 + taux
+
+    def restant(k):
+        # Capital restant dû après k annuités
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valeur = np.where(taux > 0, (facteur ** duree - facteur ** k) / (facteur ** duree - 1), 1 - k / duree)
+        return np.clip(np.where(k >= duree, 0.0, valeur), 0.0, 1.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuite = np.where(taux > 0, taux / (1 - facteur ** -duree), 1 / duree)
+
+    mobilise = annees >= 1
+    encours = np.where(mobilise, restant(annees), 0.0)
+    interets = np.where(mobilise, taux * restant(np.maximum(annees - 1, 0)), 0.0)
+    annuites = np.where(mobilise & (annees <= duree), annuite, 0.0)
+    return encours, interets, annuites
+
+
+class ScenarioBase:
+    """
+    Situation de départ de chaque commune et exercice (encours, épargne brute, annuité),
+    avec l'extinction de la dette existante projetée une fois par version des données.
+    Un lot de scénarios ne calcule plus que l'échéancier des nouveaux emprunts, en
+    formules fermées diffusées sur commune x scénario x année : quelques millisecondes.
+    """
+
+    def __init__(self, panel, taux_existant=TAUX_DETTE_EXISTANTE, horizon=HORIZON):
+        panel = panel.dropna(subset=['Encours'])
+        keys = [col for col in ['Commune', 'Exercice'] if col in panel.columns]
+        self.keys = panel[keys].reset_index(drop=True)
+        self.horizon = horizon
+        self.taux_existant = taux_existant
+
+        encours = panel['Encours'].to_numpy(dtype=float)
+        self.epargne = panel['Epargne_brute'].to_numpy(dtype=float)
+        self.population = np.nan_to_num(panel['Population'].to_numpy(dtype=float))
+        annuite = panel['Annuite'].to_numpy(dtype=float)
+        annuite = np.where(np.isfinite(annuite) & (annuite > 0), annuite,
+                           encours / DUREE_RESIDUELLE + encours * taux_existant)
+
+        # Extinction de la dette existante à annuité constante (récurrence sur l'horizon seulement)
+        self.encours_existant = np.empty((len(encours), horizon + 1))
+        self.interets_existants = np.empty((len(encours), horizon + 1))
+        self.annuite_existante = np.empty((len(encours), horizon + 1))
+        self.encours_existant[:, 0] = encours
+        self.interets_existants[:, 0] = encours * taux_existant
+        self.annuite_existante[:, 0] = annuite
+        for annee in range(1, horizon + 1):
+            du = self.encours_existant[:, annee - 1] * (1 + taux_existant)
+            self.interets_existants[:, annee] = self.encours_existant[:, annee - 1] * taux_existant
+            self.annuite_existante[:, annee] = np.minimum(annuite, du)
+            self.encours_existant[:, annee] = du - self.annuite_existante[:, annee]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rows(self, communes=None, exercice=None):
+        """
+        Positions des situations de départ retenues (communes sélectionnées, exercice)
+        """
+        mask = np.ones(len(self.keys), dtype=bool)
+        if communes is not None:
+            mask &= self.keys['Commune'].isin(communes).to_numpy()
+        if exercice is not None and 'Exercice' in self.keys.columns:
+            mask &= (self.keys['Exercice'] == exercice).to_numpy()
+        return np.flatnonzero(mask)
+
+    def simulate(self, montant_par_habitant, taux, duree, rows=None):
+        """
+        Projette chaque commune sous chaque scénario. Les paramètres (emprunt en € par habitant,
+        taux annuel en fraction, durée en années) sont des scalaires ou des tableaux diffusés
+        ensemble : un scénario par combinaison. L'épargne brute de départ ne varie que par
+        les intérêts (extinction de la dette existante, intérêts des nouveaux emprunts).
+        """
+        montant, taux, duree = (np.ravel(param) for param in
+                                np.broadcast_arrays(montant_par_habitant, taux, duree))
+        rows = np.arange(len(self.keys)) if rows is None else np.asarray(rows)
+        scenarios = pd.DataFrame(dict(zip(SCENARIO_COLUMNS, (montant, taux, duree))))
+
+        unit_encours, unit_interets, unit_annuite = loan_schedule(taux, np.maximum(duree, 1), self.horizon)
+        emprunt = self.population[rows, None] * montant[None, :]
+
+        encours = self.encours_existant[rows, None, :] + emprunt[:, :, None] * unit_encours[None]
+        interets_existants = self.interets_existants[rows]
+        epargne = (self.epargne[rows, None] + interets_existants[:, :1] - interets_existants)[:, None, :] \
+            - emprunt[:, :, None] * unit_interets[None]
+        annuite = self.annuite_existante[rows, None, :] + emprunt[:, :, None] * unit_annuite[None]
+
+        start = self.keys['Exercice'].to_numpy()[rows] if 'Exercice' in self.keys.columns else np.zeros(len(rows))
+        base_year = int(np.nanmax(start)) if len(rows) else 0
+        years = base_year + np.arange(self.horizon + 1)
+
+        return Simulation(self.keys.iloc[rows].reset_index(drop=True), scenarios, years,
+                          emprunt, encours, epargne, annuite)
@@ -0,0 +1,74 @@
+# search.py - Index de recherche par préfixe (noms et codes) pour les sélecteurs de la sidebar
+import unicodedata
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+# Nombre maximal de propositions envoyées au navigateur
+MAX_RESULTS = 50
+
+_END = '\U0010ffff'
+
+
+def normalize(text):
+    """
+    Forme de recherche : sans accents ni casse, ponctuation remplacée par des espaces
+    ("L'Étang-Salé" -> "l etang sale")
+    """
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    letters = ''.join(c if c.isalnum() else ' ' for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(letters.casefold().split())
+
+
+def code_key(value):
+    # Codes lus comme nombres ou comme texte (97411, '97411', 97411.0, '2A004')
+    return str(value).strip().removesuffix('.0')
+
+
+class SearchIndex:
+    """
+    Index trié des clés de recherche d'une liste d'entités (communes, EPCI) :
+    le nom normalisé à partir de chacun de ses mots ("denis" trouve Saint-Denis)
+    et le code (INSEE, SIREN). Une recherche est une bisection sur le préfixe
+    normalisé, en O(log n) plus le nombre de résultats.
+    """
+
+    def __init__(self, df, name_col, code_col=None):
+        columns = [name_col] + ([code_col] if code_col in df.columns else [])
+        entities = df[columns].dropna(subset=[name_col]).drop_duplicates(name_col)
+        normalized = [normalize(name) for name in entities[name_col]]
+
+        # Entités dans l'ordre alphabétique sans accents
+        order = np.argsort(np.array(normalized, dtype=object), kind='stable')
+        self.names = np.array(entities[name_col].tolist(), dtype=object)[order]
+        codes = entities[code_col].tolist() if len(columns) == 2 else [None] * len(entities)
+
+        keys, ids = [], []
+        for entity, position in enumerate(order):
+            words = normalized[position].split()
+            for start in range(len(words)):
+                keys.append(' '.join(words[start:]))
+                ids.append(entity)
+            code = codes[position]
+            if code is not None and code == code:
+                keys.append(normalize(code_key(code)))
+                ids.append(entity)
+
+        key_order = np.argsort(np.array(keys, dtype=object), kind='stable')
+        self._keys = [keys[i] for i in key_order]
+        self._ids = np.array(ids, dtype=np.int64)[key_order]
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query, limit=MAX_RESULTS):
+        """
+        Entités dont le nom, un mot du nom ou le code commence par `query`
+        (ordre alphabétique, au plus `limit`). Requête vide : les premières entités.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return self.names[:limit].tolist()
+        start = bisect_left(self._keys, prefix)
+        stop = bisect_right(self._keys, prefix + _END, lo=start)
+        return self.names[np.unique(self._ids[start:stop])[:limit]].tolist()
@@ -0,0 +1,204 @@
+# sections.py - Calculs de données des sections du dashboard, exécutables en parallèle
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import analyses
+import deltas
+
+# Nombre de threads du pool des sections (0 : calcul séquentiel, dans l'ordre du script)
+WORKERS_ENV_VAR = 'OFGL_SECTION_WORKERS'
+
+SERVICES_FOCUS = ['Eau', 'Assainissement']
+
+
+class SectionContext:
+    """
+    Entrées communes à toutes les sections pour une exécution du script
+    """
+
+    def __init__(self, dataset, filters, filtered_df, df_principal, selection_totals):
+        self.dataset = dataset
+        self.filters = filters
+        self.filtered_df = filtered_df
+        self.df_principal = df_principal
+        self.selection_totals = selection_totals
+
+
+def kpi_section(ctx):
+    if ctx.df_principal.empty:
+        return {}
+    return {
+        'kpis': analyses.compute_kpis(ctx.selection_totals, ctx.filters),
+        'evolution': deltas.kpi_evolution(ctx.selection_totals, ctx.filters),
+    }
+
+
+def sante_section(ctx):
+    df_principal = ctx.df_principal
+    df_financement = df_principal[df_principal['Agregat'] == analyses.AGREGAT_CAPACITE]
+    if df_financement.empty:
+        return {'financement': df_financement}
+
+    classement = analyses.capacite_ranking(df_principal, ctx.dataset.derived('rankings'))
+    delta_index = ctx.dataset.derived('deltas')
+    top_5 = classement.head(5)
+    bottom_5 = classement.iloc[::-1].head(5)
+    return {
+        'financement': df_financement,
+        'classement': classement,
+        'top_5': top_5,
+        'top_5_evol': delta_index.for_rows(top_5)['Montant_par_habitant_evol'],
+        'bottom_5': bottom_5,
+        'bottom_5_evol': delta_index.for_rows(bottom_5)['Montant_par_habitant_evol'],
+    }
+
+
+def epci_section(ctx):
+    return {'epci': analyses.epci_table(ctx.selection_totals, ctx.filters)}
+
+
+def annexes_section(ctx):
+    df = ctx.filtered_df
+    df_annexes = df[df['Type_budget'] == analyses.BUDGET_ANNEXE]
+    if df_annexes.empty or 'Libelle_Budget' not in df_annexes.columns:
+        return {'annexes': df_annexes}
+
+    # Classification simplifiée des budgets annexes (une fois par libellé distinct)
+    libelles = df_annexes['Libelle_Budget']
+    services = {libelle: analyses.classify_service(libelle) for libelle in libelles.unique()}
+    df_annexes = df_annexes.assign(Type_service=libelles.map(services))
+    service_counts = df_annexes['Type_service'].value_counts().reset_index()
+    service_counts.columns = ['Service', 'Nombre']
+
+    result = {'annexes': df_annexes, 'service_counts': service_counts}
+    if 'Montant' in df_annexes.columns:
+        service_amounts = df_annexes.groupby('Type_service')['Montant'].sum().reset_index()
+        result['service_amounts'] = service_amounts.sort_values('Montant', ascending=False)
+
+    # Eau et assainissement : une ligne par commune, une colonne par service
+    df_focus = df_annexes[df_annexes['Type_service'].isin(SERVICES_FOCUS)]
+    result['focus'] = df_focus
+    if 'Commune' in df_focus.columns and not df_focus.empty:
+        pivot = df_focus.groupby(['Commune', 'Type_service'], sort=False)['Montant'].sum().unstack('Type_service')
+        pivot = pivot.reindex(columns=SERVICES_FOCUS).fillna(0)
+        result['pivot'] = pivot.rename_axis(columns=None).reset_index()
+    else:
+        result['pivot'] = pd.DataFrame()
+    return result
+
+
+def epargne_section(ctx):
+    df_principal = ctx.df_principal
+    if 'Agregat' not in df_principal.columns:
+        return {}
+    df_epargne = df_principal[df_principal['Agregat'] == analyses.AGREGAT_EPARGNE]
+    result = {'epargne': df_epargne}
+    if df_epargne.empty:
+        return result
+
+    if 'Montant_par_habitant' in df_epargne.columns:
+        result['histogramme'] = df_epargne.dropna(subset=['Montant_par_habitant'])
+    if 'Commune' in df_epargne.columns and 'Montant' in df_epargne.columns:
+        result['top'] = ctx.dataset.derived('rankings').top(df_epargne, 'Montant', 10, group=analyses.AGREGAT_EPARGNE)
+    if 'Strate_population' in df_epargne.columns:
+        df_strates = df_epargne.dropna(subset=['Strate_population', 'Montant_par_habitant'])
+        result['strates'] = df_strates.assign(Strate=df_strates['Strate_population'].astype(str))
+
+    display_cols = ['Commune', 'Nom_EPCI', 'Exercice', 'Montant', 'Montant_par_habitant', 'Population']
+    available_cols = [col for col in display_cols if col in df_epargne.columns]
+    if available_cols:
+        result['table'] = df_epargne[available_cols].join(
+            ctx.dataset.derived('deltas').for_rows(df_epargne)[['Montant_evol_pct', 'Montant_tcam']]
+        )
+    return result
+
+
+def depenses_section(ctx):
+    df_principal = ctx.df_principal
+    if 'Agregat' not in df_principal.columns or 'Montant' not in df_principal.columns:
+        return {}
+
+    ranking_index = ctx.dataset.derived('rankings')
+    df_recettes = df_principal[df_principal['Agregat'] == analyses.AGREGAT_RECETTES]
+    df_epargne = df_principal[df_principal['Agregat'] == analyses.AGREGAT_EPARGNE]
+    result = {'recettes': df_recettes, 'epargne': df_epargne}
+    if not df_recettes.empty:
+        result['top_recettes'] = ranking_index.top(df_recettes, 'Montant', 10, group=analyses.AGREGAT_RECETTES)
+        result['top_recettes_hab'] = ranking_index.top(
+            df_recettes, 'Montant_par_habitant', 10, group=analyses.AGREGAT_RECETTES
+        )
+    if df_recettes.empty or df_epargne.empty:
+        return result
+
+    # Panel Dépenses/Recettes précalculé pour tout le jeu, restreint aux lignes filtrées
+    depenses_ranking = ctx.dataset.derived('depenses_rankings')
+    df_depenses = analyses.depenses_view(ctx.dataset.derived('depenses_panel'), df_principal)
+    result['depenses'] = df_depenses
+    if not df_depenses.empty:
+        result.update({
+            'top_depenses': depenses_ranking.top(df_depenses, 'Dépenses', 10),
+            'top_depenses_hab': depenses_ranking.top(df_depenses, 'Dépenses_par_habitant', 10),
+            'comparaison': depenses_ranking.top(df_depenses, 'Recettes', 15),
+            'solde_positif': depenses_ranking.top(df_depenses, 'Solde', 10),
+            'solde_negatif': depenses_ranking.bottom(df_depenses, 'Solde', 10),
+            'comparaison_hab': depenses_ranking.top(df_depenses, 'Dépenses_par_habitant', 15),
+        })
+    return result
+
+
+def synthese_section(ctx):
+    return {'synthese': analyses.export_synthese(ctx.dataset.derived('cube'), ctx.filters)}
+
+
+# Sections dans l'ordre du script
+SECTIONS = {
+    'kpis': kpi_section,
+    'sante': sante_section,
+    'epci': epci_section,
+    'annexes': annexes_section,
+    'epargne': epargne_section,
+    'depenses': depenses_section,
+    'synthese': synthese_section,
+}
+
+
+class SectionResults:
+    """
+    Résultats des sections d'une exécution. Avec un pool, toutes les sections sont soumises
+    dès la création et le rendu ne fait que récupérer les résultats : la latence tend vers
+    celle de la section la plus lente. Sans pool, chaque section est calculée à sa première
+    lecture, dans l'ordre du script. Une erreur de calcul est relevée à la lecture.
+    """
+
+    def __init__(self, ctx, executor=None, sections=SECTIONS):
+        self.ctx = ctx
+        self._sections = sections
+        self._results = {}
+        self._futures = {}
+        if executor is not None:
+            self._futures = {name: executor.submit(section, ctx) for name, section in sections.items()}
+
+    def get(self, name):
+        if name in self._futures:
+            return self._futures[name].result()
+        if name not in self._results:
+            self._results[name] = self._sections[name](self.ctx)
+        return self._results[name]
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+
+def executor_from_env():
+    """
+    Pool de threads des sections si OFGL_SECTION_WORKERS > 0, sinon None (calcul séquentiel)
+    """
+    try:
+        workers = int(os.environ.get(WORKERS_ENV_VAR, '0'))
+    except ValueError:
+        workers = 0
+    if workers <= 0:
+        return None
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ofgl-section')
@@ -0,0 +1,123 @@
+# similarity.py - Communes au profil financier le plus proche (plus proches voisins sur le fichier national)
+import numpy as np
+import pandas as pd
+
+import analyses
+
+# Profil financier : montants par habitant (budget principal) du dernier exercice de chaque commune
+FEATURE_AGREGATS = {
+    'Epargne brute': 'Epargne_hab',
+    'Recettes totales hors emprunts': 'Recettes_hab',
+    'Impôts et taxes': 'Impots_hab',
+    'Capacité ou besoin de financement': 'Capacite_hab',
+    'Encours de dette': 'Dette_hab',
+}
+
+# Caractéristiques de la commune, ordinales
+PROFILE_COLUMNS = ['Strate_population', 'Tranche_revenu']
+
+FEATURES = list(FEATURE_AGREGATS.values()) + PROFILE_COLUMNS
+
+FEATURE_LABELS = {
+    'Epargne_hab': 'Épargne brute/hab',
+    'Recettes_hab': 'Recettes/hab',
+    'Impots_hab': 'Impôts et taxes/hab',
+    'Capacite_hab': 'Capacité de financement/hab',
+    'Dette_hab': 'Encours de dette/hab',
+    'Strate_population': 'Strate',
+    'Tranche_revenu': 'Tranche revenu',
+}
+
+TABLE_KEYS = ['Code_Commune', 'Commune', 'Code_Departement', 'Exercice']
+
+DEFAULT_K = 10
+
+
+def build_feature_table(national_df):
+    """
+    Une ligne par commune du fichier national : profil financier de son dernier exercice
+    (montants par habitant du budget principal, strate et tranche de revenu)
+    """
+    base = national_df[(national_df['Type_budget'] == analyses.BUDGET_PRINCIPAL)
+                       & national_df['Agregat'].isin(list(FEATURE_AGREGATS))]
+    base = base.dropna(subset=['Code_Commune', 'Exercice'])
+    if base.empty:
+        return pd.DataFrame(columns=TABLE_KEYS + FEATURES)
+
+    keys = ['Code_Commune', 'Exercice']
+    table = base.groupby(keys + ['Agregat'])['Montant_par_habitant'].sum(min_count=1).unstack('Agregat')
+    table = table.rename(columns=FEATURE_AGREGATS).reindex(columns=list(FEATURE_AGREGATS.values()))
+
+    descriptions = base.groupby(keys)[['Commune', 'Code_Departement']
+                                      + [col for col in PROFILE_COLUMNS if col in base.columns]].first()
+    table = descriptions.join(table).reset_index()
+
+    # Dernier exercice disponible de chaque commune
+    table = table.sort_values(keys, kind='stable').drop_duplicates('Code_Commune', keep='last')
+    return table.reindex(columns=TABLE_KEYS + FEATURES).reset_index(drop=True)
+
+
+class SimilarityIndex:
+    """
+    Matrice des profils normalisée une fois : chaque indicateur est centré sur sa médiane
+    nationale et divisé par son écart interquartile (robuste aux valeurs extrêmes), les
+    valeurs manquantes valent la médiane. Les k plus proches voisins d'une commune sont
+    obtenus par un produit matrice-vecteur (distance euclidienne) et une sélection
+    partielle : recherche exacte, quelques millisecondes sur les ~35 000 communes.
+    """
+
+    def __init__(self, table, features=FEATURES):
+        self.table = table.reset_index(drop=True)
+        self.features = [col for col in features if col in table.columns]
+        values = self.table[self.features].to_numpy(dtype=float)
+
+        with np.errstate(invalid='ignore'):
+            median = np.nanmedian(values, axis=0) if len(values) else np.zeros(len(self.features))
+            spread = np.nanpercentile(values, 75, axis=0) - np.nanpercentile(values, 25, axis=0) \
+                if len(values) else np.ones(len(self.features))
+        median = np.nan_to_num(median)
+        spread = np.where(np.isfinite(spread) & (spread > 0), spread, 1.0)
+
+        matrix = (values - median) / spread
+        self.matrix = np.ascontiguousarray(np.nan_to_num(matrix), dtype=np.float64)
+        self._norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        self._positions = {code: position for position, code in enumerate(self.table['Code_Commune'])}
+        self._departements = self.table['Code_Departement'].astype(str).str.strip().str.removesuffix('.0').to_numpy()
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, code_commune):
+        return code_commune in self._positions
+
+    def neighbours(self, code_commune, k=DEFAULT_K, departement=None):
+        """
+        k communes les plus proches (hors la commune elle-même), triées par distance.
+        departement restreint les voisins à un département. Vide si la commune est inconnue.
+        """
+        position = self._positions.get(code_commune)
+        if position is None:
+            return self.table.iloc[0:0].assign(Distance=pd.Series(dtype=float))
+
+        query = self.matrix[position]
+        distances = self._norms - 2 * (self.matrix @ query) + self._norms[position]
+        distances[position] = np.inf
+        if departement is not None:
+            distances[self._departements != str(departement)] = np.inf
+
+        k = min(k, int(np.isfinite(distances).sum()))
+        if k <= 0:
+            return self.table.iloc[0:0].assign(Distance=pd.Series(dtype=float))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+
+        result = self.table.iloc[nearest].copy()
+        result['Distance'] = np.sqrt(np.maximum(distances[nearest], 0))
+        return result.reset_index(drop=True)
+
+    def profile(self, code_commune):
+        """
+        Ligne de la table pour une commune (None si absente)
+        """
+        position = self._positions.get(code_commune)
+        return None if position is None else self.table.iloc[position]
@@ -0,0 +1,297 @@
+# static_site.py - Export statique du dashboard : vue par défaut, une page par EPCI et par commune
+import argparse
+import html
+import os
+import time
+
+import pandas as pd
+import plotly.express as px
+from plotly.offline import get_plotlyjs
+
+import alerts
+import analyses
+import dataset_store
+import debt
+import deltas
+import fiches
+import ofgl_data
+
+OUTPUT_DIR = 'site'
+PLOTLY_JS = 'plotly.min.js'
+
+# Index dérivés utiles au site : ceux des fiches, plus ceux des vues (pas de groupes de pairs
+# nationaux ni d'index de recherche)
+SITE_BUILDERS = dict(fiches.FICHE_BUILDERS, **{name: dataset_store.DERIVED_BUILDERS[name]
+                                               for name in ('depenses_rankings', 'cube', 'deltas', 'debt', 'alerts')})
+
+# Filtres de la vue par défaut du dashboard
+DEFAULT_AGREGATS = [analyses.AGREGAT_EPARGNE, analyses.AGREGAT_CAPACITE, analyses.AGREGAT_IMPOTS,
+                    analyses.AGREGAT_RECETTES]
+
+SITE_STYLE = """
+<style>
+    nav { font-size: .9rem; margin-bottom: 1rem; }
+    nav a, .liens a { color: #1E3A8A; }
+    .liens { columns: 3; }
+    .liens li { break-inside: avoid; }
+    .kpi-evol { font-size: .9rem; }
+</style>
+"""
+
+
+def default_filters(epci=None):
+    return dict(epci=[epci] if epci else [], communes=[], budget_types=[], agregats=DEFAULT_AGREGATS)
+
+
+def epci_filename(epci):
+    return f"{fiches.slugify(epci)}.html"
+
+
+def _link(href, label):
+    return f'<a href="{html.escape(href)}">{html.escape(str(label))}</a>'
+
+
+def _links(items):
+    return '<ul class="liens">' + ''.join(f"<li>{_link(href, label)}</li>" for label, href in items) + '</ul>'
+
+
+def _nav(prefix):
+    return f'<nav>{_link(prefix + "index.html", "← Vue d’ensemble (La Réunion)")}</nav>\n'
+
+
+def _format_pct(value):
+    return f"{value:+.1f}%" if pd.notna(value) else "-"
+
+
+class _Figures:
+    """
+    Graphiques d'une page : identifiants stables (pages régénérées à l'identique),
+    plotly.js chargé une seule fois depuis le fichier partagé du site
+    """
+
+    def __init__(self, plotlyjs):
+        self.plotlyjs = plotlyjs
+        self.count = 0
+
+    def render(self, fig):
+        self.count += 1
+        include_js = self.plotlyjs if self.count == 1 else False
+        return fiches.figure_html(fig, include_js, f"graphique-{self.count}")
+
+
+def render_view(dataset, filters, title, prefix='', intro='', communes_links=None):
+    """
+    Vue du dashboard pour des filtres donnés : KPI, évolution N-1 puis une section par
+    onglet (dernier exercice). prefix est le chemin relatif vers la racine du site.
+    """
+    df_principal = analyses.budget_principal(analyses.apply_filters(dataset.df, **filters))
+    data_cube = dataset.derived('cube')
+    figures = _Figures(prefix + PLOTLY_JS)
+    communes_links = communes_links or {}
+    sections = []
+
+    kpis = analyses.compute_kpis(data_cube, filters)
+    cards = ''.join([
+        fiches.kpi_card(f"{kpis['epargne_brute'] / 1_000_000:,.1f} M€", "Épargne brute totale"),
+        fiches.kpi_card(f"{kpis['communes']}", "Communes analysées"),
+        fiches.kpi_card(f"{kpis['population']:,.0f}", "Population totale"),
+        fiches.kpi_card(f"{kpis['recettes'] / 1_000_000:,.1f} M€", "Recettes totales"),
+    ])
+    sections.append(f'<h2>📈 Vue d\'ensemble - Santé Financière</h2><div class="kpis">{cards}</div>')
+
+    evolution = deltas.kpi_evolution(data_cube, filters)
+    if not evolution.empty:
+        cards = ''.join(
+            fiches.kpi_card(f"{row['Montant'] / 1_000_000:,.1f} M€ ({_format_pct(row['Montant_evol_pct'])})", agregat,
+                            '' if pd.isna(row['Montant_evol_pct']) else 'positive' if row['Montant_evol_pct'] > 0 else 'negative')
+            for agregat, row in evolution.iterrows()
+        )
+        sections.append(f"<h3>Évolution {evolution['Exercice'].iloc[0]} / {evolution['Exercice_precedent'].iloc[0]}</h3>"
+                        f'<div class="kpis kpi-evol">{cards}</div>')
+
+    if df_principal.empty:
+        sections.append("<p>Aucune donnée de budget principal.</p>")
+        return _page(title, intro + ''.join(sections), prefix)
+
+    exercice = df_principal['Exercice'].max()
+    dernier = df_principal[df_principal['Exercice'] == exercice]
+    communes = dernier['Commune'].dropna().unique()
+
+    def commune_cell(commune):
+        href = communes_links.get(commune)
+        return _link(prefix + href, commune) if href else html.escape(str(commune))
+
+    def linked_table(frame):
+        # Noms de communes liés à leur fiche (valeurs déjà formatées et échappées)
+        frame = frame.copy()
+        for col in frame.columns:
+            if col != 'Commune':
+                frame[col] = frame[col].map(lambda value: html.escape(str(value)))
+        if 'Commune' in frame.columns:
+            frame['Commune'] = frame['Commune'].map(commune_cell)
+        return frame.to_html(index=False, border=0, na_rep='-', escape=False)
+
+    # Santé financière : capacité de financement par habitant
+    capacite = analyses.capacite_ranking(dernier, dataset.derived('rankings'))
+    if not capacite.empty:
+        fig = px.bar(capacite, x='Commune', y='Montant_par_habitant', color='Montant_par_habitant',
+                     color_continuous_scale='RdYlGn', title=f"Capacité (+) / besoin (-) de financement par habitant ({exercice})",
+                     labels={'Montant_par_habitant': '€ par habitant'})
+        fig.update_layout(xaxis_tickangle=45)
+        sections.append("<h2>🏛️ Santé Financière</h2>" + figures.render(fig))
+
+    # Comparaison EPCI
+    epci_df = analyses.epci_table(data_cube, filters)
+    if len(epci_df) > 1:
+        table = epci_df[['EPCI', 'Nombre_communes', 'Population_totale']].assign(
+            Population_totale=epci_df['Population_totale'].map(lambda x: f"{x:,.0f}")
+        )
+        for agregat in analyses.EPCI_AGREGATS:
+            if f'{agregat}_M€' in epci_df.columns:
+                table[agregat] = epci_df[f'{agregat}_M€'].map(lambda x: f"{x:,.1f} M€")
+        table['EPCI'] = [_link(prefix + 'epci/' + epci_filename(name), name) for name in epci_df['EPCI']]
+        sections.append("<h2>📊 Comparaison EPCI</h2>"
+                        + table.rename(columns={'Nombre_communes': 'Communes', 'Population_totale': 'Population'})
+                        .to_html(index=False, border=0, escape=False))
+
+    # Budgets annexes par type de service
+    annexes = dataset.df[(dataset.df['Type_budget'] == analyses.BUDGET_ANNEXE)
+                         & dataset.df['Commune'].isin(communes) & (dataset.df['Exercice'] == exercice)]
+    if not annexes.empty:
+        services = annexes.drop_duplicates('Libelle_Budget')['Libelle_Budget'].map(analyses.classify_service)
+        services = services.value_counts().rename_axis('Service').reset_index(name='Budgets')
+        sections.append(f"<h2>💧 Budgets Annexes ({exercice})</h2>" + fiches.html_table(services))
+
+    # Focus épargne
+    epargne = dernier[dernier['Agregat'] == analyses.AGREGAT_EPARGNE]
+    epargne = dataset.derived('rankings').order(epargne, 'Montant', group=analyses.AGREGAT_EPARGNE)
+    if not epargne.empty:
+        fig = px.bar(epargne, x='Commune', y='Montant', title=f"Épargne brute par commune ({exercice})",
+                     color_discrete_sequence=['#3B82F6'])
+        fig.update_layout(xaxis_tickangle=45)
+        table = epargne[['Commune', 'Montant', 'Montant_par_habitant']].assign(
+            Montant=epargne['Montant'].map(fiches.format_euros),
+            Montant_par_habitant=epargne['Montant_par_habitant'].map(fiches.format_euros),
+        ).rename(columns={'Montant_par_habitant': 'Montant/hab'})
+        sections.append("<h2>💰 Focus Épargne</h2>" + figures.render(fig) + linked_table(table))
+
+    # Dépenses / recettes
+    depenses = analyses.depenses_view(dataset.derived('depenses_panel'), dernier)
+    depenses = dataset.derived('depenses_rankings').order(depenses, 'Recettes')
+    if not depenses.empty:
+        table = depenses[['Commune', 'Recettes', 'Dépenses', 'Solde', 'Taux_depenses_recettes']].assign(
+            Recettes=depenses['Recettes'].map(fiches.format_euros),
+            Dépenses=depenses['Dépenses'].map(fiches.format_euros),
+            Solde=depenses['Solde'].map(fiches.format_euros),
+            Taux_depenses_recettes=depenses['Taux_depenses_recettes'].map(lambda x: f"{x:.1f}%"),
+        ).rename(columns={'Taux_depenses_recettes': 'Taux dépenses/recettes'})
+        sections.append(f"<h2>📈 Analyse Dépenses/Recettes ({exercice})</h2>" + linked_table(table))
+
+    # Endettement
+    dette = debt.debt_view(dataset.derived('debt'), communes, exercice)
+    if not dette.empty:
+        dette = dette.sort_values('Capacite_desendettement', ascending=False)
+        table = dette[['Commune', 'Encours', 'Dette_par_habitant', 'Capacite_desendettement', 'Poids_annuite']].assign(
+            Encours=dette['Encours'].map(fiches.format_euros),
+            Dette_par_habitant=dette['Dette_par_habitant'].map(fiches.format_euros),
+            Capacite_desendettement=dette['Capacite_desendettement'].map(lambda x: f"{x:.1f}" if pd.notna(x) else "N/A"),
+            Poids_annuite=dette['Poids_annuite'].map(lambda x: f"{x:.1f}%" if pd.notna(x) else "N/A"),
+        ).rename(columns={'Dette_par_habitant': 'Dette/hab', 'Capacite_desendettement': 'Désendettement (ans)',
+                          'Poids_annuite': 'Annuité / recettes'})
+        sections.append(f"<h2>🏦 Endettement ({exercice})</h2>" + linked_table(table))
+
+    # Alertes
+    alertes = alerts.alert_view(dataset.derived('alerts'), communes, exercice)
+    if not alertes.empty:
+        table = alertes.sort_values(['Niveau', 'Commune'])[['Commune', 'Alerte', 'Niveau']]
+        sections.append(f"<h2>🚨 Alertes ({exercice})</h2>" + linked_table(table))
+
+    # Fiches des communes de la vue
+    if communes_links:
+        items = [(commune, prefix + communes_links[commune]) for commune in sorted(communes) if commune in communes_links]
+        sections.append("<h2>Fiches communales</h2>" + _links(items))
+
+    footer = f"<footer>Données OFGL - version du fichier source : {html.escape(str(dataset.version or 'inconnue'))}</footer>"
+    return _page(title, intro + ''.join(sections) + footer, prefix)
+
+
+def _page(title, body, prefix):
+    nav = _nav(prefix) if prefix else ''
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+{fiches.STYLE}{SITE_STYLE}
+</head>
+<body>
+{nav}<h1>📊 {html.escape(title)}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+def _write(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return len(content)
+
+
+def build_site(source_path=ofgl_data.SOURCE_PATH, output_dir=OUTPUT_DIR, departement=ofgl_data.CODE_DEPARTEMENT):
+    """
+    Écrit le site statique : index.html (vue par défaut), epci/*.html, communes/*.html
+    et un unique plotly.min.js partagé par toutes les pages. Renvoie les statistiques.
+    """
+    start = time.perf_counter()
+    source_path = ofgl_data.find_source(source_path)
+    df = ofgl_data.load_dataset(source_path, departement)
+    dataset = dataset_store.Dataset(df, ofgl_data.source_version(source_path), source_path, builders=SITE_BUILDERS)
+    dataset.warm()
+
+    for sub_dir in ('epci', 'communes'):
+        os.makedirs(os.path.join(output_dir, sub_dir), exist_ok=True)
+    sizes = [_write(os.path.join(output_dir, PLOTLY_JS), get_plotlyjs())]
+
+    codes = df.dropna(subset=['Commune']).drop_duplicates('Commune').set_index('Commune')['Code_Commune']
+    communes_links = {commune: 'communes/' + fiches.fiche_filename(code, commune) for commune, code in codes.items()}
+    epcis = sorted(df['Nom_EPCI'].dropna().unique())
+
+    intro = "<h2>Intercommunalités</h2>" + _links([(epci, 'epci/' + epci_filename(epci)) for epci in epcis])
+    sizes.append(_write(os.path.join(output_dir, 'index.html'),
+                        render_view(dataset, default_filters(), "Analyse Financière des Communes de La Réunion",
+                                    intro=intro, communes_links=communes_links)))
+
+    for epci in epcis:
+        sizes.append(_write(os.path.join(output_dir, 'epci', epci_filename(epci)),
+                            render_view(dataset, default_filters(epci), epci, prefix='../',
+                                        communes_links=communes_links)))
+
+    for commune, href in communes_links.items():
+        content = fiches.render_fiche(dataset, commune, plotlyjs='../' + PLOTLY_JS, header=_nav('../'))
+        sizes.append(_write(os.path.join(output_dir, href), content))
+
+    total_seconds = time.perf_counter() - start
+    return {
+        'pages': len(sizes) - 1,
+        'epci': len(epcis),
+        'communes': len(communes_links),
+        'octets': sum(sizes),
+        'total_s': total_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporte la vue par défaut du dashboard en site HTML statique")
+    parser.add_argument('--source', default=ofgl_data.SOURCE_PATH, help="Fichier OFGL (CSV ou compressé)")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="Répertoire du site")
+    parser.add_argument('--departement', default=ofgl_data.CODE_DEPARTEMENT, help="Code du département")
+    args = parser.parse_args()
+
+    stats = build_site(args.source, args.output, args.departement)
+    print(f"{stats['pages']} pages ({stats['epci']} EPCI, {stats['communes']} communes) écrites dans {args.output} "
+          f"({stats['octets'] / 1_000_000:,.1f} Mo) en {stats['total_s']:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
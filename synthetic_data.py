@@ -0,0 +1,268 @@
+# synthetic_data.py - Jeu OFGL synthétique (même format que le CSV source) pour les tests hors ligne
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import extracts
+import ofgl_data
+
+# EPCI et communes de La Réunion (montants et populations sont aléatoires)
+EPCI_REUNION = {
+    'CA Intercommunale du Nord de la Réunion (CINOR)': ('249740119', ['Saint-Denis', 'Sainte-Marie', 'Sainte-Suzanne']),
+    'CA Intercommunale de la Réunion Est (CIREST)': ('249740085', ['Saint-André', 'Bras-Panon', 'Saint-Benoît', 'Salazie',
+                                                                    'La Plaine-des-Palmistes', 'Sainte-Rose']),
+    'CA Territoire de la Côte Ouest (TCO)': ('249740077', ['Le Port', 'La Possession', 'Saint-Paul', 'Les Trois-Bassins',
+                                                            'Saint-Leu']),
+    'CA Intercommunale Civis': ('249740101', ['Saint-Pierre', 'Saint-Louis', 'Petite-Île', "L'Étang-Salé", 'Cilaos',
+                                              'Les Avirons']),
+    'CA du Sud (CASUD)': ('249740093', ['Le Tampon', 'Entre-Deux', 'Saint-Joseph', 'Saint-Philippe']),
+}
+
+# Autres départements (groupes de pairs nationaux)
+AUTRES_DEPARTEMENTS = ['13', '2A', '33']
+
+AGREGATS = ['Epargne brute', 'Capacité ou besoin de financement', 'Impôts et taxes',
+            'Recettes totales hors emprunts', 'Encours de dette', 'Annuité de la dette']
+
+BUDGETS_ANNEXES = ['EAU POTABLE', 'ASSAINISSEMENT', 'POMPES FUNEBRES', 'ZAC']
+
+EXERCICES = [2017, 2018, 2019]
+
+# Syndicats de La Réunion (extrait syndicats) : SIREN, libellé
+SYNDICATS_REUNION = [
+    ('200040715', 'SYNDICAT INTERCOMMUNAL D ELECTRICITE DE LA REUNION'),
+    ('259740123', 'SYNDICAT MIXTE DE TRAITEMENT DES DECHETS DU NORD ET DE L EST'),
+    ('259740131', 'SYNDICAT MIXTE ILEVA'),
+]
+
+# Agrégats des extraits EPCI et syndicats (part des montants cumulés des communes membres)
+AGREGATS_GROUPEMENTS = ['Recettes totales hors emprunts', 'Epargne brute', 'Encours de dette', 'Annuité de la dette']
+
+# Emprise des géométries synthétiques (lon/lat) : grille 6 x 4 de communes aux frontières irrégulières
+EMPRISE = (55.21, -21.39, 55.84, -20.87)
+GRILLE = (6, 4)
+POINTS_PAR_FRONTIERE = 60
+
+
+def _commune_rows(rng, departement, epci, siren_epci, commune, code, exercices):
+    population = int(rng.integers(2000, 150000))
+    strate = int(np.digitize(population, [3500, 10000, 20000, 50000, 100000])) + 1
+    tranche = int(rng.integers(1, 6))
+    reunion = departement == ofgl_data.CODE_DEPARTEMENT
+
+    budgets = [('Budget principal', f'{code}00010', f'COMMUNE DE {commune.upper()}')]
+    for libelle in rng.choice(BUDGETS_ANNEXES, size=int(rng.integers(0, 3)), replace=False):
+        budgets.append(('Budget annexe', f'{code}{rng.integers(10000, 99999)}', f'{libelle} {commune.upper()}'))
+
+    rows = []
+    for exercice in exercices:
+        pop = population * (1 + 0.01 * (exercice - exercices[0]))
+        for type_budget, siret, libelle in budgets:
+            scale = 1 if type_budget == 'Budget principal' else 0.1
+            recettes = pop * rng.normal(1600, 300) * scale
+            epargne = recettes * rng.normal(0.12, 0.08)
+            montants = {
+                'Recettes totales hors emprunts': recettes,
+                'Epargne brute': epargne,
+                'Capacité ou besoin de financement': epargne - recettes * rng.normal(0.12, 0.1),
+                'Impôts et taxes': recettes * 0.4,
+                'Encours de dette': recettes * rng.uniform(0.3, 1.5),
+                'Annuité de la dette': recettes * rng.uniform(0.03, 0.12),
+            }
+            for ordre, agregat in enumerate(AGREGATS):
+                montant = montants[agregat]
+                rows.append({
+                    'Exercice': exercice,
+                    'Outre-mer': 'Oui' if reunion else 'Non',
+                    'Code Insee 2024 Région': '04' if reunion else '93',
+                    'Nom 2024 Région': 'La Réunion' if reunion else 'Autre région',
+                    'Code Insee 2024 Département': departement,
+                    'Nom 2024 Département': 'La Réunion' if reunion else 'Autre département',
+                    'Code Siren 2024 EPCI': siren_epci,
+                    'Nom 2024 EPCI': epci,
+                    'Strate population 2024': strate,
+                    'Commune rurale': 'Non',
+                    'Commune de montagne': 'Oui' if commune in ('Cilaos', 'Salazie') else 'Non',
+                    'Commune touristique': 'Non',
+                    'Tranche revenu par habitant': tranche,
+                    'Présence QPV': 'Oui',
+                    'Code Insee 2024 Commune': code,
+                    'Nom 2024 Commune': commune,
+                    'Catégorie': 'Commune',
+                    'Code Siren Collectivité': f'2{code}0',
+                    'Code Insee Collectivité': code,
+                    'Siret Budget': siret,
+                    'Libellé Budget': libelle,
+                    'Type de budget': type_budget,
+                    'Nomenclature': 'M14',
+                    'Agrégat': agregat,
+                    'Montant': round(montant, 2),
+                    'Montant en millions': round(montant / 1e6, 4),
+                    'Population totale': round(pop),
+                    'Montant en € par habitant': round(montant / pop, 2),
+                    'Compte 2024 Disponible': 'Oui',
+                    'code_type_budget': 1 if type_budget == 'Budget principal' else 2,
+                    'ordre_analyse1_section1': ordre,
+                    'Population totale du dernier exercice': population,
+                })
+    return rows
+
+
+def generate(communes_par_departement=60, exercices=EXERCICES, seed=0):
+    """
+    Jeu synthétique au format du CSV OFGL : les 24 communes de La Réunion
+    et `communes_par_departement` communes dans chacun des autres départements
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    numero = 1
+    for epci, (siren, communes) in EPCI_REUNION.items():
+        for commune in communes:
+            code = f'{ofgl_data.CODE_DEPARTEMENT}{numero:02d}'
+            rows.extend(_commune_rows(rng, ofgl_data.CODE_DEPARTEMENT, epci, siren, commune, code, exercices))
+            numero += 1
+
+    for departement in AUTRES_DEPARTEMENTS:
+        for k in range(communes_par_departement):
+            rows.extend(_commune_rows(rng, departement, f'CC Test {departement}-{k % 5}', f'2{departement}00000{k % 5}',
+                                      f'Commune {departement}-{k}', f'{departement}{k:03d}', exercices))
+
+    return pd.DataFrame(rows)
+
+
+def _groupement_rows(exercice, siren, libelle, categorie, departement, montants, population, epci=None):
+    rows = []
+    for agregat, montant in montants.items():
+        rows.append({
+            'Exercice': exercice,
+            'Code Insee 2024 Département': departement,
+            'Code Siren 2024 EPCI': siren if epci else None,
+            'Nom 2024 EPCI': epci,
+            'Catégorie': categorie,
+            'Code Siren Collectivité': siren,
+            'Siret Budget': f'{siren}00010',
+            'Libellé Budget': libelle,
+            'Type de budget': 'Budget principal',
+            'Agrégat': agregat,
+            'Montant': round(montant, 2),
+            'Population totale': round(population) if population else None,
+            'Montant en € par habitant': round(montant / population, 2) if population else None,
+        })
+    return rows
+
+
+def generate_groupements(communes_df, seed=0):
+    """
+    Extraits EPCI à fiscalité propre et syndicats au format OFGL, dérivés du jeu des communes :
+    chaque EPCI porte une fraction des montants de ses communes, chaque syndicat une fraction
+    de ceux de La Réunion
+    """
+    rng = np.random.default_rng(seed + 1)
+    principal = communes_df[(communes_df['Type de budget'] == 'Budget principal')
+                            & communes_df['Agrégat'].isin(AGREGATS_GROUPEMENTS)]
+    keys = ['Exercice', 'Code Insee 2024 Département', 'Code Siren 2024 EPCI', 'Nom 2024 EPCI']
+    sums = principal.groupby(keys + ['Agrégat'])['Montant'].sum().unstack('Agrégat')
+    populations = principal.drop_duplicates(['Exercice', 'Code Insee 2024 Commune']).groupby(keys)['Population totale'].sum()
+
+    gfp = []
+    for (exercice, departement, siren, epci), montants in sums.iterrows():
+        part = rng.uniform(0.15, 0.35)
+        gfp.extend(_groupement_rows(exercice, siren, epci.upper(), 'GFP', departement,
+                                    (montants * part).to_dict(), populations[(exercice, departement, siren, epci)], epci))
+
+    syndicats = []
+    reunion = sums.xs(ofgl_data.CODE_DEPARTEMENT, level='Code Insee 2024 Département').groupby(level='Exercice').sum()
+    for exercice, montants in reunion.iterrows():
+        for siren, libelle in SYNDICATS_REUNION:
+            part = rng.uniform(0.01, 0.05)
+            syndicats.extend(_groupement_rows(exercice, siren, libelle, 'SYND', ofgl_data.CODE_DEPARTEMENT,
+                                              (montants * part).to_dict(), None))
+    return pd.DataFrame(gfp), pd.DataFrame(syndicats)
+
+
+def _frontiere(rng, a, b):
+    # Frontière irrégulière entre deux nœuds de la grille, partagée à l'identique par les deux communes
+    t = np.linspace(0, 1, POINTS_PAR_FRONTIERE)[:, None]
+    points = a + (b - a) * t
+    normal = np.array([-(b - a)[1], (b - a)[0]])
+    bruit = np.cumsum(rng.normal(0, 0.004, POINTS_PAR_FRONTIERE))
+    bruit -= np.linspace(bruit[0], bruit[-1], POINTS_PAR_FRONTIERE)
+    return points + bruit[:, None] * normal / np.linalg.norm(normal) * 0.5
+
+
+def generate_geojson(seed=0):
+    """
+    GeoJSON synthétique des 24 communes de La Réunion (propriétés code et nom, comme les
+    fichiers de l'IGN) : frontières partagées sommet pour sommet entre communes voisines
+    """
+    rng = np.random.default_rng(seed)
+    colonnes, lignes = GRILLE
+    lon = np.linspace(EMPRISE[0], EMPRISE[2], colonnes + 1)
+    lat = np.linspace(EMPRISE[1], EMPRISE[3], lignes + 1)
+    noeud = lambda i, j: np.array([lon[i], lat[j]])
+
+    frontieres = {}
+
+    def frontiere(p, q):
+        if (q, p) in frontieres:
+            return frontieres[(q, p)][::-1]
+        if (p, q) not in frontieres:
+            frontieres[(p, q)] = _frontiere(rng, noeud(*p), noeud(*q))
+        return frontieres[(p, q)]
+
+    communes = [commune for _, (_, noms) in EPCI_REUNION.items() for commune in noms]
+    features = []
+    for numero, commune in enumerate(communes, start=1):
+        i, j = (numero - 1) % colonnes, (numero - 1) // colonnes
+        coins = [(i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1), (i, j)]
+        anneau = np.vstack([frontiere(p, q)[:-1] for p, q in zip(coins[:-1], coins[1:])])
+        anneau = np.vstack([anneau, anneau[:1]])
+        features.append({
+            'type': 'Feature',
+            'properties': {'code': f'{ofgl_data.CODE_DEPARTEMENT}{numero:02d}', 'nom': commune},
+            'geometry': {'type': 'Polygon', 'coordinates': [np.round(anneau, 6).tolist()]},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def write_geojson(path, seed=0):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(generate_geojson(seed), f)
+
+
+def write(path=ofgl_data.SOURCE_PATH, communes_par_departement=60, exercices=EXERCICES, seed=0):
+    df = generate(communes_par_departement, exercices, seed)
+    df.to_csv(path, sep=';', index=False)
+    return len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un fichier OFGL synthétique")
+    parser.add_argument('--output', default=ofgl_data.SOURCE_PATH)
+    parser.add_argument('--communes', type=int, default=60, help="Communes par département hors Réunion")
+    parser.add_argument('--exercices', type=int, nargs='+', default=EXERCICES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--geojson', help="Écrit aussi un GeoJSON synthétique des communes de La Réunion")
+    parser.add_argument('--groupements', action='store_true',
+                        help="Écrit aussi les extraits EPCI et syndicats à côté du fichier des communes")
+    args = parser.parse_args()
+
+    rows = write(args.output, args.communes, sorted(args.exercices), args.seed)
+    print(f"{rows:,} lignes écrites dans {args.output}")
+    if args.groupements:
+        communes_df = generate(args.communes, sorted(args.exercices), args.seed)
+        directory = os.path.dirname(args.output)
+        for frame, filename in zip(generate_groupements(communes_df, args.seed),
+                                   [extracts.EXTRACT_FILES[extracts.EPCI], extracts.EXTRACT_FILES[extracts.SYNDICATS]]):
+            frame.to_csv(os.path.join(directory, filename), sep=';', index=False)
+            print(f"{len(frame):,} lignes écrites dans {os.path.join(directory, filename)}")
+    if args.geojson:
+        write_geojson(args.geojson, args.seed)
+        print(f"Géométries écrites dans {args.geojson}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# tables.py - Tableaux paginés : tri et découpage côté serveur
+import math
+
+import streamlit as st
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+# Les interactions dans un fragment ne relancent que le fragment, pas tout le script
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', lambda func: func)
+
+
+def _state(key, name, default):
+    state_key = f"{key}_{name}"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = default
+    return state_key
+
+
+def _format_page(page, formatters, column_names):
+    page = page.copy()
+    for col, formatter in (formatters or {}).items():
+        if col in page.columns:
+            page[col] = page[col].map(formatter)
+    return page.rename(columns=column_names or {})
+
+
+@fragment
+def paged_table(df, key, formatters=None, column_names=None, sort_by=None, descending=True, height=400):
+    """
+    Affiche un tableau paginé. Le tri s'applique aux valeurs brutes, puis seule la page
+    visible est formatée (formatters : {colonne: fonction}) et envoyée au navigateur.
+    Tri, sens et page sont conservés dans st.session_state sous la clé `key`.
+    """
+    if df.empty:
+        st.info("Aucune donnée à afficher")
+        return
+
+    columns = list(df.columns)
+    labels = column_names or {}
+    sort_key = _state(key, 'sort', sort_by if sort_by in columns else columns[0])
+    desc_key = _state(key, 'desc', descending)
+    size_key = _state(key, 'page_size', PAGE_SIZES[0])
+    page_key = _state(key, 'page', 1)
+
+    if st.session_state[sort_key] not in columns:
+        st.session_state[sort_key] = columns[0]
+
+    col_sort, col_desc, col_size, col_page = st.columns([3, 1, 1, 1])
+    with col_sort:
+        sort_col = st.selectbox("Trier par", columns, key=sort_key, format_func=lambda col: labels.get(col, col))
+    with col_desc:
+        desc = st.toggle("Décroissant", key=desc_key)
+    with col_size:
+        page_size = st.selectbox("Lignes", PAGE_SIZES, key=size_key)
+
+    page_count = max(1, math.ceil(len(df) / page_size))
+    if st.session_state[page_key] > page_count:
+        st.session_state[page_key] = page_count
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key=page_key)
+
+    ordered = df.sort_values(sort_col, ascending=not desc, na_position='last', kind='stable')
+    start = (int(page) - 1) * page_size
+    visible = ordered.iloc[start:start + page_size]
+
+    st.dataframe(
+        _format_page(visible, formatters, column_names),
+        use_container_width=True,
+        height=height,
+        hide_index=True
+    )
+    st.caption(f"Lignes {start + 1:,} à {start + len(visible):,} sur {len(df):,}")
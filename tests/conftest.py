@@ -0,0 +1,18 @@
+# conftest.py - Modules du dashboard importables depuis les tests (disposition à plat à la racine)
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ofgl_data
+import synthetic_data
+
+
+@pytest.fixture(scope='session')
+def communes():
+    """
+    Jeu synthétique nettoyé : communes de La Réunion, budgets principaux et annexes, trois exercices
+    """
+    return ofgl_data.clean_dataset(synthetic_data.generate(2))
@@ -0,0 +1,20 @@
+import numpy as np
+
+import alerts
+
+
+def test_streaks_count_consecutive_years():
+    condition = np.array([True, True, False, True, True, True])
+    previous = np.array([False, True, True, True, True, True])
+    assert alerts._streaks(condition, previous).tolist() == [1, 2, 0, 1, 2, 3]
+
+
+def test_streaks_restart_on_new_commune_or_missing_year():
+    # Lignes 0-1 : commune A (2017, 2018) ; ligne 2 : commune B ; ligne 4 : exercice manquant avant
+    condition = np.array([True, True, True, True, True])
+    previous = np.array([False, True, False, True, False])
+    assert alerts._streaks(condition, previous).tolist() == [1, 2, 1, 2, 1]
+
+
+def test_streaks_empty():
+    assert alerts._streaks(np.array([], dtype=bool), np.array([], dtype=bool)).tolist() == []
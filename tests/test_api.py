@@ -0,0 +1,79 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import api
+import dataset_store
+import synthetic_data
+
+BUILDERS = {name: dataset_store.DERIVED_BUILDERS[name] for name in ('cube', 'rankings')}
+
+
+@pytest.fixture
+def server(tmp_path):
+    source = tmp_path / 'ofgl.csv'
+    synthetic_data.write(str(source), communes_par_departement=1, exercices=[2019])
+    server = api.make_server(port=0, store=dataset_store.DatasetStore(str(source), builders=BUILDERS))
+    server.source = source
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, path, **headers):
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}{path}", headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_etag_and_last_modified_give_304(server):
+    status, headers, body = _get(server, '/api/kpis?commune=Cilaos')
+    assert status == 200 and headers['X-Cache'] == 'MISS'
+    assert json.loads(body)['communes'] == 1
+    etag = headers['ETag']
+
+    status, headers, body = _get(server, '/api/kpis?commune=Cilaos', **{'If-None-Match': etag})
+    assert status == 304 and body == b'' and headers['X-Cache'] == 'HIT'
+    status, _, _ = _get(server, '/api/kpis?commune=Cilaos', **{'If-Modified-Since': headers['Last-Modified']})
+    assert status == 304
+
+    # Autres filtres ou ETag périmé : réponse complète
+    status, headers, _ = _get(server, '/api/kpis?commune=Salazie', **{'If-None-Match': etag})
+    assert status == 200 and headers['ETag'] != etag
+    status, _, _ = _get(server, '/api/kpis?commune=Cilaos', **{'If-None-Match': '"ancien"'})
+    assert status == 200
+
+
+def test_new_version_changes_etag(server):
+    _, headers, _ = _get(server, '/api/kpis')
+    synthetic_data.write(str(server.source), communes_par_departement=2, exercices=[2019])
+    server.store.check()
+    assert server.store.check()
+
+    status, new_headers, _ = _get(server, '/api/kpis', **{'If-None-Match': headers['ETag']})
+    assert status == 200 and new_headers['X-Cache'] == 'MISS'
+    assert new_headers['ETag'] != headers['ETag']
+
+
+def test_unknown_endpoint_and_version(server):
+    status, _, body = _get(server, '/api/inconnu')
+    assert status == 404 and '/api/kpis' in json.loads(body)['points_acces']
+    status, _, body = _get(server, '/api/version')
+    assert json.loads(body)['version'] == server.store.current.version
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = api.ResponseCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1 and cache.get('c') == 3
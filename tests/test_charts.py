@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+import charts
+
+
+def _frame(n):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'Strate': rng.choice(['A', 'B', 'C'], n), 'Montant': rng.normal(100, 30, n),
+                         'Population': rng.integers(1_000, 50_000, n)})
+
+
+def test_large_histogram_sends_bin_counts():
+    df = _frame(charts.ROW_THRESHOLD + 1)
+    df.loc[0, 'Montant'] = np.nan
+    fig = charts.histogram(df, 'Montant', nbins=15)
+    counts, edges = np.histogram(df['Montant'].dropna(), bins=15)
+    np.testing.assert_array_equal(fig.data[0].y, counts)
+    np.testing.assert_allclose(fig.data[0].x, (edges[:-1] + edges[1:]) / 2)
+
+
+def test_large_box_matches_quartiles_by_category():
+    df = _frame(charts.ROW_THRESHOLD + 1)
+    fig = charts.box(df, 'Strate', 'Montant')
+    assert [trace.name for trace in fig.data] == ['A', 'B', 'C']
+    for trace in fig.data:
+        values = df.loc[df['Strate'] == trace.name, 'Montant']
+        assert trace.median[0] == values.median()
+        assert trace.q1[0] == values.quantile(0.25)
+        assert trace.q3[0] == values.quantile(0.75)
+        assert values.min() <= trace.lowerfence[0] and trace.upperfence[0] <= values.max()
+        assert trace.boxpoints is False
+
+
+def test_small_frames_keep_plotly_express_figures():
+    df = _frame(100)
+    assert charts.histogram(df, 'Montant').data[0].type == 'histogram'
+    assert len(charts.box(df, 'Strate', 'Montant').data[0].y) > 0
+
+
+def test_large_scatter_is_sampled_in_webgl():
+    df = _frame(charts.SCATTER_MAX_POINTS + 10)
+    fig = charts.scatter(df, 'Population', 'Montant')
+    assert fig.data[0].type == 'scattergl'
+    assert len(fig.data[0].x) == charts.SCATTER_MAX_POINTS
+    pd.testing.assert_frame_equal(charts.sample_points(df), charts.sample_points(df))
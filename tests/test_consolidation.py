@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+import analyses
+import consolidation
+import debt
+
+
+def _frame():
+    rows = []
+    for code, commune, population in [('97401', 'A', 1000), ('97402', 'B', 500)]:
+        budgets = [('Budget principal', f'{code}1', 'COMMUNE'), ('Budget annexe', f'{code}2', 'EAU')]
+        if commune == 'A':
+            budgets.append(('Budget annexe', f'{code}3', 'ASSAINISSEMENT'))
+        for type_budget, siret, libelle in budgets:
+            for agregat, montant in [('Encours de dette', 300.0), ('Epargne brute', 40.0)]:
+                rows.append({'Code_Commune': code, 'Commune': commune, 'Nom_EPCI': 'EPCI', 'Exercice': 2019,
+                             'Agregat': agregat, 'Type_budget': type_budget, 'Siret_Budget': siret,
+                             'Libelle_Budget': libelle, 'Montant': montant,
+                             'Montant_par_habitant': montant / population,
+                             'Population': population if type_budget == 'Budget principal' else 0})
+    return pd.DataFrame(rows)
+
+
+def test_consolidated_sums_all_budgets_per_commune():
+    df = _frame()
+    budget_index = consolidation.BudgetIndex(df)
+    consolidated = consolidation.build_consolidated(df, budget_index)
+
+    assert len(consolidated) == 4
+    assert (consolidated['Type_budget'] == analyses.BUDGET_CONSOLIDE).all()
+    expected = df.groupby(['Code_Commune', 'Agregat'])['Montant'].sum()
+    got = consolidated.set_index(['Code_Commune', 'Agregat'])['Montant']
+    pd.testing.assert_series_equal(got.sort_index(), expected.sort_index(), check_names=False)
+
+    # Population et montant par habitant du budget principal
+    a = consolidated[consolidated['Commune'] == 'A'].set_index('Agregat')
+    assert (a['Population'] == 1000).all()
+    assert a.loc['Epargne brute', 'Montant_par_habitant'] == 0.12
+    assert consolidated.groupby('Commune')['Nombre_budgets'].first().to_dict() == {'A': 3, 'B': 2}
+
+
+def test_budget_index_lists_principal_first():
+    budgets = consolidation.BudgetIndex(_frame()).budgets('97401')
+    assert budgets['Type_budget'].tolist() == ['Budget principal', 'Budget annexe', 'Budget annexe']
+    assert consolidation.BudgetIndex(_frame()).budgets('inconnue').empty
+
+
+def test_consolidated_debt_panel_matches_all_budgets_panel():
+    df = _frame()
+    consolidated = consolidation.build_consolidated(df, consolidation.BudgetIndex(df))
+    expected = debt.build_debt_panel(df, type_budget=None)
+    got = debt.build_debt_panel(consolidated, type_budget=analyses.BUDGET_CONSOLIDE)
+    for col in ['Encours', 'Epargne_brute', 'Population', 'Dette_par_habitant']:
+        np.testing.assert_allclose(got[col], expected[col])
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analyses
+import cube
+
+FILTERS = [
+    {},
+    {'agregats': ['Epargne brute'], 'budget_types': ['Budget principal']},
+    {'epci': ['CA Intercommunale de la Réunion Est (CIREST)'], 'communes': ['Bras-Panon', 'Saint-André']},
+]
+
+
+@pytest.fixture(scope='module')
+def df(communes):
+    # Une commune sans EPCI : les valeurs manquantes sont des clés du cube
+    df = communes.copy()
+    df.loc[df['Commune'] == 'Cilaos', 'Nom_EPCI'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('by', [['Agregat'], ['Nom_EPCI', 'Exercice'], ['Commune', 'Type_budget'],
+                                ['Siret_Budget', 'Agregat']])
+def test_totals_match_groupby_on_raw_rows(df, by, filters):
+    data_cube = cube.Cube(df)
+    got = data_cube.totals(by, measures=('Montant', 'Population'), **filters).sort_index()
+    expected = analyses.apply_filters(df, **filters).groupby(by, dropna=False)[['Montant', 'Population']].sum()
+    pd.testing.assert_frame_equal(got, expected.sort_index(), check_dtype=False)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_cells_count_raw_rows(df, filters):
+    cells = cube.Cube(df).cells(['Commune'], **filters)
+    assert cells['Lignes'].sum() == len(analyses.apply_filters(df, **filters))
+
+
+def test_commune_counts_and_drilldown(df):
+    data_cube = cube.Cube(df)
+    counts = data_cube.commune_counts(['Nom_EPCI'], type_budgets=['Budget annexe'])
+    annexes = df[df['Type_budget'] == 'Budget annexe']
+    pd.testing.assert_series_equal(counts.sort_index(), annexes.groupby('Nom_EPCI')['Commune'].nunique(),
+                                   check_names=False)
+
+    epci = 'CA Intercommunale de la Réunion Est (CIREST)'
+    table = data_cube.drilldown(epci=epci).set_index('Commune').sort_index()
+    expected = df[df['Nom_EPCI'] == epci].pivot_table(index='Commune', columns='Agregat', values='Montant',
+                                                      aggfunc='sum')
+    pd.testing.assert_frame_equal(table[expected.columns], expected, check_names=False)
+
+
+def test_missing_dimension_raises(df):
+    with pytest.raises(KeyError):
+        cube.Cube(df.drop(columns='Siret_Budget')).cells(['Siret_Budget'])
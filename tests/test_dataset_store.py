@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+import cube
+import dataset_store
+import synthetic_data
+
+
+def _builders(calls, fail):
+    # Index obligatoire qui échoue à la demande et compte ses constructions
+    def build(dataset):
+        calls.append(dataset.version)
+        if fail:
+            raise ValueError("index cassé")
+        return cube.Cube(dataset.df)
+    return {'cube': build}
+
+
+def _rewrite(path, communes, seed=0):
+    synthetic_data.write(str(path), communes_par_departement=communes, exercices=[2019], seed=seed)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'ofgl.csv'
+    _rewrite(path, 1)
+    return path
+
+
+def test_new_version_needs_two_observations(source):
+    store = dataset_store.DatasetStore(str(source), builders=_builders([], []))
+    first = store.current
+    assert not store.check()
+
+    _rewrite(source, 2)
+    assert not store.check()
+    assert store.current is first
+    assert store.check()
+    assert store.current is not first
+    assert store.current.version == dataset_store.ofgl_data.source_version(str(source))
+
+
+def test_compressed_replacement_is_picked_up(source):
+    store = dataset_store.DatasetStore(str(source), builders=_builders([], []))
+    df = store.current.df
+
+    # Le .csv est remplacé par un .csv.gz : le chemin demandé reste le même
+    gz_path = str(source) + '.gz'
+    synthetic_data.generate(1, [2019]).to_csv(gz_path, sep=';', index=False)
+    os.remove(source)
+    assert not store.check()
+    assert store.check()
+    assert store.source_path == gz_path
+    assert len(store.current.df) == len(df)
+
+
+def test_failed_rebuild_keeps_previous_version_without_retrying(source):
+    calls, fail = [], []
+    store = dataset_store.DatasetStore(str(source), builders=_builders(calls, fail))
+    first = store.current
+
+    fail.append(True)
+    _rewrite(source, 2)
+    store.check()
+    assert not store.check()
+    assert store.current is first
+    assert isinstance(store.last_error, RuntimeError)
+    failed = len(calls)
+
+    # La même identité n'est pas reconstruite à chaque vérification
+    for _ in range(3):
+        assert not store.check()
+    assert len(calls) == failed
+
+    # Un nouveau fichier est retenté (et publié s'il se construit)
+    fail.clear()
+    _rewrite(source, 3)
+    store.check()
+    assert store.check()
+    assert store.current is not first
+    assert store.last_error is None
+
+
+def test_failed_optional_index_is_not_rebuilt(source):
+    calls = []
+
+    def build(dataset):
+        calls.append(dataset.version)
+        raise ValueError("GeoJSON illisible")
+
+    df = dataset_store.ofgl_data.load_dataset(str(source))
+    dataset = dataset_store.Dataset(df, 'v1', str(source), builders={'geo': build})
+    assert dataset.optional('geo') is None
+    assert dataset.optional('geo') is None
+    assert len(calls) == 1
+    assert isinstance(dataset.errors['geo'], ValueError)
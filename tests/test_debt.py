@@ -0,0 +1,52 @@
+import numpy as np
+
+import analyses
+import debt
+
+
+def _reference(df):
+    # Même panel calculé commune par commune, avec pivot et décalage par groupe
+    rows = df[df['Type_budget'] == analyses.BUDGET_PRINCIPAL]
+    panel = rows.pivot_table(index=['Commune', 'Exercice'], columns='Agregat', values='Montant', aggfunc='sum')
+    panel['Population'] = rows.groupby(['Commune', 'Exercice'])['Population'].first()
+    panel['Capacite_desendettement'] = (panel[debt.AGREGAT_ENCOURS] / panel[analyses.AGREGAT_EPARGNE]).where(
+        panel[analyses.AGREGAT_EPARGNE] > 0)
+    panel['Dette_par_habitant'] = panel[debt.AGREGAT_ENCOURS] / panel['Population']
+    panel['Poids_annuite'] = panel[debt.AGREGAT_ANNUITE] / panel[analyses.AGREGAT_RECETTES] * 100
+    panel = panel.reset_index()
+
+    previous = panel.groupby('Commune').shift(1)
+    consecutive = previous['Exercice'] == panel['Exercice'] - 1
+    panel['Encours_evol'] = (panel[debt.AGREGAT_ENCOURS] - previous[debt.AGREGAT_ENCOURS]).where(consecutive)
+    for metric in debt.DEBT_METRICS:
+        panel[f'{metric}_evol'] = (panel[metric] - previous[metric]).where(consecutive)
+    return panel.rename(columns=debt.DEBT_AGREGATS)
+
+
+def _check(df):
+    got = debt.build_debt_panel(df).set_index(['Commune', 'Exercice']).sort_index()
+    expected = _reference(df).set_index(['Commune', 'Exercice']).sort_index()
+    columns = ['Encours', 'Annuite', 'Epargne_brute', 'Recettes', 'Population'] + debt.DEBT_METRICS + \
+        ['Encours_evol'] + [f'{metric}_evol' for metric in debt.DEBT_METRICS]
+    for col in columns:
+        np.testing.assert_allclose(got[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float), err_msg=col)
+
+
+def test_debt_panel_matches_groupby_reference(communes):
+    _check(communes)
+
+
+def test_evolution_needs_consecutive_exercices(communes):
+    # Sans l'exercice 2018 d'une commune, son évolution 2019 n'est pas calculée
+    commune = communes['Commune'].iloc[0]
+    df = communes[~((communes['Commune'] == commune) & (communes['Exercice'] == 2018))]
+    _check(df)
+    panel = debt.build_debt_panel(df)
+    assert panel.loc[panel['Commune'] == commune, 'Encours_evol'].isna().all()
+
+
+def test_panel_without_debt_agregats_is_empty(communes):
+    panel = debt.build_debt_panel(communes[communes['Agregat'] != debt.AGREGAT_ENCOURS])
+    assert panel.empty
+    assert set(debt.DEBT_METRICS) <= set(panel.columns)
+    assert debt.debt_view(debt.build_debt_panel(communes), ['Inconnue']).empty
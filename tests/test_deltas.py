@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+import cube
+import deltas
+
+
+def _reference(df, col):
+    # Mêmes évolutions avec groupby / shift sur les séries triées par exercice
+    ordered = df.sort_values('Exercice', kind='stable')
+    series = ordered.groupby(deltas.SERIES_KEYS, dropna=False, sort=False)
+    previous = series[[col, 'Exercice']].shift(1)
+    first = series[[col, 'Exercice']].transform('first')
+
+    consecutive = previous['Exercice'] == ordered['Exercice'] - 1
+    evol = (ordered[col] - previous[col]).where(consecutive)
+    evol_pct = (evol / previous[col].abs() * 100).where(previous[col] != 0)
+    years = ordered['Exercice'] - first['Exercice']
+    growth = (ordered[col] / first[col]) ** (1 / years.clip(lower=1)) - 1
+    tcam = (growth * 100).where((years > 0) & (first[col] > 0) & (ordered[col] > 0))
+    return pd.DataFrame({f'{col}_evol': evol, f'{col}_evol_pct': evol_pct, f'{col}_tcam': tcam}).reindex(df.index)
+
+
+def test_delta_index_matches_groupby_shift(communes):
+    # Un exercice manquant interrompt l'écart N-1 mais pas le TCAM
+    df = communes.drop(communes.index[(communes['Exercice'] == 2018) & (communes['Commune'] == 'Cilaos')])
+    table = deltas.DeltaIndex(df).table
+    for col in deltas.VALUE_COLS:
+        expected = _reference(df, col)
+        for name in expected.columns:
+            np.testing.assert_allclose(table[name], expected[name], err_msg=name)
+
+    cilaos = df[(df['Commune'] == 'Cilaos') & (df['Exercice'] == 2019)].index
+    assert table.loc[cilaos, 'Montant_evol'].isna().all()
+    assert table.loc[cilaos, 'Montant_tcam'].notna().any()
+
+
+def test_for_rows_aligns_on_frame_index(communes):
+    index = deltas.DeltaIndex(communes)
+    frame = communes.sample(20, random_state=0)
+    pd.testing.assert_frame_equal(index.for_rows(frame), index.table.loc[frame.index])
+
+
+def test_kpi_evolution_matches_yearly_totals(communes):
+    table = deltas.kpi_evolution(cube.Cube(communes), {})
+    principal = communes[communes['Type_budget'] == 'Budget principal']
+    totals = principal.groupby(['Agregat', 'Exercice'])['Montant'].sum().unstack('Exercice')
+    assert list(table.index) == deltas.DELTA_AGREGATS
+    for agregat, row in table.iterrows():
+        assert np.isclose(row['Montant'], totals.loc[agregat, 2019])
+        assert np.isclose(row['Montant_evol'], totals.loc[agregat, 2019] - totals.loc[agregat, 2018])
+    assert deltas.kpi_evolution(cube.Cube(communes[communes['Exercice'] == 2019]), {}).empty
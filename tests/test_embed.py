@@ -0,0 +1,68 @@
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import embed
+import synthetic_data
+
+
+class _Params(dict):
+    # Même interface que st.query_params : get() renvoie la dernière valeur, get_all() toutes
+    def get(self, key, default=None):
+        values = super().get(key)
+        return values[-1] if values else default
+
+    def get_all(self, key):
+        return list(super().get(key, []))
+
+
+def test_requested_section():
+    assert embed.requested(_Params(section=['capacite'])) == 'capacite'
+    assert embed.requested(_Params(section=[''])) is None
+    assert embed.requested(_Params()) is None
+
+
+def test_filters_from_repeated_params():
+    params = _Params(commune=['Salazie', 'Cilaos'], agregat=['Epargne brute'], section=['kpis'])
+    assert embed.filters_from_params(params) == {
+        'epci': [], 'communes': ['Cilaos', 'Salazie'], 'budget_types': [], 'agregats': ['Epargne brute'],
+    }
+
+
+def _app(source):
+    import streamlit as st
+
+    import dataset_store
+    import embed
+    import ofgl_data
+
+    dataset = dataset_store.Dataset(ofgl_data.load_dataset(source), 'v1', source)
+    embed.render(dataset, embed.requested(st.query_params), st.query_params)
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    path = tmp_path_factory.mktemp('embed') / 'ofgl.csv'
+    synthetic_data.write(str(path), communes_par_departement=1, exercices=[2018, 2019])
+    return str(path)
+
+
+def _run(source, **params):
+    at = AppTest.from_function(_app, args=(source,), default_timeout=60)
+    for name, value in params.items():
+        at.query_params[name] = value
+    return at.run()
+
+
+def test_render_single_section_from_url(source):
+    at = _run(source, section='capacite', commune=['Cilaos', 'Salazie'])
+    assert not at.exception
+    figure = at.get('plotly_chart')
+    assert len(figure) == 1 and '"Cilaos"' in figure[0].proto.spec and '"Saint-Denis"' not in figure[0].proto.spec
+
+    at = _run(source, section='kpis', perimetre=embed.PERIMETRE_CONSOLIDE)
+    assert not at.exception and 'Communes analysées' in at.markdown[0].value
+
+
+def test_unknown_section_lists_available_ones(source):
+    at = _run(source, section='inconnue')
+    assert 'kpis' in at.error[0].value and 'capacite' in at.error[0].value
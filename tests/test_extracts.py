@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+import extracts
+
+
+def _store():
+    communes = pd.DataFrame({'Code_Commune': ['1', '2'], 'Code_Siren_Collectivite': ['s1', 's2'],
+                             'Code_EPCI': ['e1', 'e2'], 'Agregat': ['Epargne brute'] * 2, 'Exercice': [2019, 2019],
+                             'Type_budget': ['Budget principal'] * 2, 'Montant_par_habitant': [1.0, 2.0]})
+    epci = pd.DataFrame({'Code_Siren_Collectivite': ['e1', 'e1', 'e1'],
+                         'Agregat': ['Epargne brute', 'Epargne brute', np.nan], 'Exercice': [2019, 2018, 2019],
+                         'Type_budget': ['Budget principal'] * 3, 'Montant_par_habitant': [10.0, 8.0, 99.0],
+                         'Montant': [1.0, 2.0, 3.0]})
+    return extracts.ExtractStore({extracts.COMMUNES: communes, extracts.EPCI: epci})
+
+
+def test_epci_values_join_by_integer_codes():
+    store = _store()
+    frame = pd.DataFrame({'Code_Commune': ['1', '2', '1'], 'Exercice': [2019, 2019, 2018]})
+    np.testing.assert_array_equal(store.epci_values(frame, 'Epargne brute'), [10.0, np.nan, 8.0])
+
+
+def test_unknown_values_match_nothing():
+    store = _store()
+    # Un code inconnu (-1) ne doit pas désigner les lignes où l'agrégat manque
+    assert store.indicator(extracts.EPCI, 'Agrégat inconnu').empty
+    assert store.entities(extracts.EPCI, 'Agrégat inconnu').empty
+    assert store.entities(extracts.EPCI, 'Epargne brute', exercice=1990).empty
+    assert store.entities(extracts.EPCI, 'Epargne brute', type_budget='Budget inconnu').empty
+    siren = store.encode('siren', ['e1'])
+    exercice = store.encode('exercice', [2019])
+    assert np.isnan(store.lookup(extracts.EPCI, 'Agrégat inconnu', siren, exercice)).all()
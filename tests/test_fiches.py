@@ -0,0 +1,31 @@
+import os
+
+import dataset_store
+import fiches
+import ofgl_data
+import synthetic_data
+
+
+def test_slugify_and_filename():
+    assert fiches.slugify("L'Étang-Salé") == 'l-etang-sale'
+    assert fiches.fiche_filename('97415', 'Saint-Paul') == '97415-saint-paul.html'
+
+
+def test_generate_fiches_in_worker_processes(tmp_path):
+    source = str(tmp_path / 'ofgl.csv')
+    synthetic_data.write(source, communes_par_departement=1, exercices=[2018, 2019])
+    output = tmp_path / 'fiches'
+
+    stats = fiches.generate_fiches(source, str(output), communes=['Cilaos', "L'Étang-Salé"], workers=2,
+                                   plotlyjs='cdn')
+    assert stats['fiches'] == 2 and stats['workers'] == 2
+    assert sorted(os.listdir(output)) == ['97418-l-etang-sale.html', '97419-cilaos.html']
+
+    # Même rang de capacité de financement que le classement du jeu complet
+    df = ofgl_data.load_dataset(source)
+    dataset = dataset_store.Dataset(df, ofgl_data.source_version(source), source, builders=fiches.FICHE_BUILDERS)
+    classement = dataset.derived('capacite_classements')[2019]
+    rang = classement.index[classement['Commune'] == 'Cilaos'][0] + 1
+    content = (output / '97419-cilaos.html').read_text(encoding='utf-8')
+    assert f"{rang} / {len(classement)}" in content
+    assert content == fiches.render_fiche(dataset, 'Cilaos', plotlyjs='cdn')
@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+import pytest
+
+import cube
+import geo
+import synthetic_data
+
+
+def _douglas_peucker(points, tolerance):
+    # Version récursive de référence
+    if len(points) <= 2:
+        return points
+    a, b = points[0].astype(float), points[-1].astype(float)
+    direction = b - a
+    segment = points[1:-1] - a
+    norm = np.hypot(*direction)
+    if norm == 0:
+        distances = np.hypot(segment[:, 0], segment[:, 1])
+    else:
+        distances = np.abs(direction[0] * segment[:, 1] - direction[1] * segment[:, 0]) / norm
+    farthest = int(np.argmax(distances)) + 1
+    if distances[farthest - 1] <= tolerance:
+        return points[[0, -1]]
+    left = _douglas_peucker(points[:farthest + 1], tolerance)
+    return np.vstack([left[:-1], _douglas_peucker(points[farthest:], tolerance)])
+
+
+def _area(ring):
+    x, y = np.asarray(ring, dtype=float).T
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+def _layer_areas(layer):
+    return {feature['id']: sum(_area(polygon[0]) - sum(_area(hole) for hole in polygon[1:])
+                               for polygon in feature['geometry']['coordinates'])
+            for feature in layer['features']}
+
+
+@pytest.mark.parametrize('tolerance', [0.5, 2.0, 10.0])
+def test_simplify_line_matches_recursive_douglas_peucker(tolerance):
+    rng = np.random.default_rng(1)
+    points = np.cumsum(rng.normal(size=(300, 2)) * 3, axis=0).round().astype(np.int64)
+    np.testing.assert_array_equal(geo.simplify_line(points, tolerance), _douglas_peucker(points, tolerance))
+
+    line = np.column_stack([np.arange(10), np.arange(10)])
+    np.testing.assert_array_equal(geo.simplify_line(line, 0.1), line[[0, -1]])
+
+
+@pytest.fixture(scope='module')
+def geo_index(communes, tmp_path_factory):
+    path = tmp_path_factory.mktemp('geo') / 'communes.geojson'
+    path.write_text(json.dumps(synthetic_data.generate_geojson()), encoding='utf-8')
+    return geo.load_geo_index(communes, str(path))
+
+
+def test_every_commune_and_epci_is_mapped(communes, geo_index):
+    assert geo_index.communes == sorted(communes['Commune'].unique())
+    assert geo_index.epcis == sorted(communes['Nom_EPCI'].unique())
+    assert geo.load_geo_index(communes, 'absent.geojson') is None
+
+
+@pytest.mark.parametrize('resolution', list(geo.TOLERANCES))
+def test_shared_arcs_leave_no_gaps_and_epci_dissolve_keeps_area(communes, geo_index, resolution):
+    commune_areas = _layer_areas(geo_index.layer(geo.NIVEAU_COMMUNES, resolution))
+    epci_areas = _layer_areas(geo_index.layer(geo.NIVEAU_EPCI, resolution))
+    commune_epci = communes.drop_duplicates('Commune').set_index('Commune')['Nom_EPCI']
+
+    # Frontières simplifiées une seule fois : chaque EPCI couvre exactement ses communes
+    for epci, area in epci_areas.items():
+        members = commune_epci.index[commune_epci == epci]
+        assert area == pytest.approx(sum(commune_areas[commune] for commune in members), rel=1e-6)
+
+    # Surface totale proche de celle du GeoJSON d'origine (la simplification déplace peu les frontières)
+    original = sum(_area(feature['geometry']['coordinates'][0])
+                   for feature in synthetic_data.generate_geojson()['features'])
+    assert sum(commune_areas.values()) == pytest.approx(original, rel=0.05)
+
+
+def test_coarser_resolution_has_fewer_vertices(geo_index):
+    sommets = {(row['niveau'], row['resolution']): row['sommets'] for row in geo_index.stats}
+    assert sommets[(geo.NIVEAU_COMMUNES, 'Détaillée')] > sommets[(geo.NIVEAU_COMMUNES, 'Légère')]
+    assert sommets[(geo.NIVEAU_EPCI, 'Standard')] < sommets[(geo.NIVEAU_COMMUNES, 'Standard')]
+
+
+def test_map_values_per_capita_by_epci(communes):
+    values = geo.map_values(cube.Cube(communes), {}, 'Epargne brute', 2019, geo.NIVEAU_EPCI).set_index('Cle')
+    rows = communes[(communes['Type_budget'] == 'Budget principal') & (communes['Agregat'] == 'Epargne brute')
+                    & (communes['Exercice'] == 2019)]
+    totals = rows.groupby('Nom_EPCI')[['Montant', 'Population']].sum()
+    np.testing.assert_allclose(values.loc[totals.index, 'Montant_par_habitant'],
+                               totals['Montant'] / totals['Population'])
@@ -0,0 +1,62 @@
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+
+import cube
+import incremental
+
+
+def _frame():
+    rows = []
+    communes = {'EPCI 1': ['A', 'B', 'C'], 'EPCI 2': ['D', 'E'], None: ['F']}
+    for (epci, names), budget, agregat, exercice in itertools.product(
+            communes.items(), ['Budget principal', 'Budget annexe'], ['Epargne brute', 'Impôts et taxes'], [2018, 2019]):
+        for i, commune in enumerate(names):
+            if budget == 'Budget annexe' and i % 2:
+                continue
+            rows.append({'Nom_EPCI': epci, 'Commune': commune, 'Type_budget': budget, 'Agregat': agregat,
+                         'Exercice': exercice, 'Montant': float(len(rows) * 7 % 101), 'Population': 100 + i})
+    return pd.DataFrame(rows)
+
+
+def _totals(frame, dims):
+    # Les cellules du cube gardent les dimensions filtrées : totaux par dimensions demandées
+    keys = list(dims) + ['Type_budget', 'Agregat', 'Exercice']
+    return frame.groupby(keys, dropna=False)[['Montant', 'Lignes']].sum().sort_index()
+
+
+def test_incremental_totals_match_full_recompute():
+    df = _frame()
+    data_cube = cube.Cube(df)
+    totals = incremental.IncrementalTotals(incremental.PartialAggregates(data_cube))
+    rng = random.Random(0)
+    communes, epci = sorted(df['Commune'].unique()), ['EPCI 1', 'EPCI 2']
+
+    for _ in range(100):
+        filters = {
+            'epci': rng.sample(epci, rng.randint(0, 2)),
+            'communes': rng.sample(communes, rng.randint(0, len(communes))),
+            'budget_types': rng.choice([[], ['Budget principal']]),
+            'agregats': [],
+        }
+        for dims in ([], ['Nom_EPCI']):
+            expected = data_cube.cells(dims + ['Type_budget', 'Agregat', 'Exercice'], **filters)
+            got = totals.cells(dims + ['Type_budget', 'Agregat', 'Exercice'], **filters)
+            expected, got = _totals(expected, dims), _totals(got, dims)
+            assert got.index.equals(expected.index)
+            np.testing.assert_allclose(got['Montant'], expected['Montant'])
+            np.testing.assert_array_equal(got['Lignes'], expected['Lignes'])
+
+        expected_counts = data_cube.commune_counts(['Nom_EPCI'], type_budgets=['Budget principal'], **filters)
+        got_counts = totals.commune_counts(['Nom_EPCI'], type_budgets=['Budget principal'], **filters)
+        assert got_counts.sort_index().to_dict() == expected_counts[expected_counts > 0].sort_index().to_dict()
+        assert totals.commune_counts(**filters) == data_cube.commune_counts(**filters)
+
+
+def test_incremental_update_is_by_difference():
+    totals = incremental.IncrementalTotals(incremental.PartialAggregates(cube.Cube(_frame())))
+    totals.update({'communes': ['A', 'B', 'C', 'D']})
+    totals.update({'communes': ['A', 'B', 'C']})
+    assert totals.updates == 1
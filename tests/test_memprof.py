@@ -0,0 +1,57 @@
+import json
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import dataset_store
+import memprof
+
+
+def test_deep_size_counts_shared_objects_once():
+    array = np.zeros(1_000)
+    frame = pd.DataFrame({'a': np.arange(100)})
+    assert memprof.deep_size(array) == array.nbytes
+    assert memprof.deep_size(frame) == frame.memory_usage(deep=True, index=True).sum()
+    assert memprof.deep_size([array, array]) == memprof.deep_size([array]) + 8
+
+
+def test_report_accounts_sections_dataset_and_session(monkeypatch):
+    monkeypatch.delenv(memprof.ENV_VAR, raising=False)
+    assert not memprof.is_enabled()
+    monkeypatch.setenv(memprof.ENV_VAR, 'oui')
+    assert memprof.is_enabled()
+
+    assert not tracemalloc.is_tracing()
+    profiler = memprof.MemoryProfiler(True)
+    kept = [bytearray(1_000_000)]
+    profiler.checkpoint("Allocation")
+    kept.clear()
+    profiler.checkpoint("Libération")
+
+    df = pd.DataFrame({'Valeur': np.arange(1_000, dtype=float)})
+    dataset = dataset_store.Dataset(df, 'v1', builders={'double': lambda dataset: dataset.df * 2})
+    dataset.derived('double')
+    namespace = {'df': df, 'vue': df.head(500), 'texte': 'x' * 10_000, 'court': 'x', '_prive': df.copy()}
+    profiler.track_namespace(namespace, shared=[df])
+    report = profiler.report(dataset)
+
+    # Le traçage démarré par le profileur est arrêté par le rapport
+    assert not tracemalloc.is_tracing()
+    json.dumps(report)
+    allocation, liberation = report['sections']
+    assert allocation['net_octets'] >= 1_000_000 and allocation['pic_octets'] >= 1_000_000
+    assert liberation['net_octets'] < -900_000
+    assert [row['objet'] for row in report['jeu_de_donnees']] == ['df', "derived['double']"]
+    assert report['jeu_de_donnees'][0]['lignes'] == 1_000
+    assert [row['objet'] for row in report['session']] == ['texte', 'vue']
+    assert report['version'] == 'v1'
+
+
+def test_disabled_profiler_does_nothing():
+    profiler = memprof.MemoryProfiler(False)
+    profiler.checkpoint("Section")
+    profiler.track('objet', object())
+    report = profiler.report()
+    assert report['sections'] == [] and report['session'] == [] and report['sites'] == []
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,89 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import ofgl_data
+import synthetic_data
+
+
+def _frame():
+    return pd.DataFrame({'Commune': ['Cilaos', 'Salazie', None], 'Exercice': [2018, 2019, 2019],
+                         'Montant': [1.5, np.nan, 3.0]})
+
+
+def test_read_arrow_maps_numeric_columns(tmp_path):
+    arrow_path = str(tmp_path / 'ofgl.arrow')
+    ofgl_data.write_arrow(_frame(), arrow_path, 'v1')
+    df = ofgl_data.read_arrow(arrow_path)
+
+    pd.testing.assert_frame_equal(df, _frame(), check_dtype=False)
+    assert ofgl_data.arrow_version(arrow_path) == 'v1'
+    # Pas de copie : les valeurs numériques sont lues dans les pages du fichier
+    assert not df['Montant'].to_numpy().flags.owndata
+    assert not df['Montant'].to_numpy().flags.writeable
+
+
+@pytest.mark.skipif(int(pd.__version__.split('.')[0]) < 3, reason="chaînes converties en objets avant pandas 3")
+def test_read_arrow_maps_string_columns(tmp_path):
+    arrow_path = str(tmp_path / 'ofgl.arrow')
+    communes = pd.DataFrame({'Commune': [f"Commune {i}" for i in range(100_000)]})
+    ofgl_data.write_arrow(communes, arrow_path)
+
+    # Aucune allocation Arrow à la lecture : les chaînes restent dans le fichier mappé
+    allocated = pa.total_allocated_bytes()
+    df = ofgl_data.read_arrow(arrow_path)
+    assert pa.total_allocated_bytes() - allocated < 100_000
+    assert df['Commune'].iloc[-1] == "Commune 99999"
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return synthetic_data.generate(2, [2018, 2019])
+
+
+@pytest.fixture(scope='module')
+def reference(raw, tmp_path_factory):
+    path = tmp_path_factory.mktemp('csv') / 'ofgl-base-communes.csv'
+    raw.to_csv(path, sep=';', index=False)
+    return ofgl_data.load_dataset(str(path))
+
+
+@pytest.mark.parametrize('suffix', ['.gz', '.bz2'])
+def test_compressed_csv_found_and_read(raw, reference, tmp_path, suffix):
+    path = tmp_path / 'ofgl-base-communes.csv'
+    raw.to_csv(str(path) + suffix, sep=';', index=False)
+
+    # Le chemin du CSV désigne sa version compressée quand il est absent
+    assert ofgl_data.find_source(str(path)) == str(path) + suffix
+    pd.testing.assert_frame_equal(ofgl_data.load_dataset(str(path)), reference)
+
+
+def test_zip_archive_reads_its_csv_member(raw, reference, tmp_path):
+    archive = tmp_path / 'ofgl-base-communes.zip'
+    with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED) as handle:
+        handle.writestr('LISEZMOI.txt', "Extrait OFGL")
+        handle.writestr('ofgl-base-communes.csv', raw.to_csv(sep=';', index=False))
+
+    path = str(tmp_path / 'ofgl-base-communes.csv')
+    assert ofgl_data.find_source(path) == str(archive)
+    pd.testing.assert_frame_equal(ofgl_data.load_dataset(path), reference)
+
+    empty = tmp_path / 'vide.zip'
+    with zipfile.ZipFile(empty, 'w') as handle:
+        handle.writestr('LISEZMOI.txt', "")
+    with pytest.raises(ValueError):
+        ofgl_data.read_source(str(empty))
+
+
+def test_chunked_read_with_projection(raw, reference, tmp_path, monkeypatch):
+    path = tmp_path / 'ofgl-base-communes.csv.gz'
+    raw.to_csv(path, sep=';', index=False)
+    monkeypatch.setattr(ofgl_data, 'CHUNK_ROWS', 100)
+
+    columns = ['Commune', 'Agregat', 'Exercice', 'Montant']
+    df = ofgl_data.load_dataset(str(path), columns=columns)
+    assert set(df.columns) == set(columns) | {'Code_Departement'}
+    pd.testing.assert_frame_equal(df[columns], reference[columns])
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import analyses
+import ofgl_data
+import peers
+import synthetic_data
+
+
+@pytest.fixture(scope='module')
+def national():
+    return ofgl_data.clean_dataset(synthetic_data.generate(5), departement=None)
+
+
+def test_percentiles_match_brute_force(national):
+    index = peers.PeerIndex(peers.build_peer_table(national))
+    base = national[national['Type_budget'] == analyses.BUDGET_PRINCIPAL].dropna(subset=['Montant_par_habitant'])
+    locales = base.loc[ofgl_data.departement_mask(base['Code_Departement']), 'Code_Commune'].nunique()
+    annee = (base['Agregat'] == 'Epargne brute') & (base['Exercice'] == 2019)
+
+    for groupe, keys in peers.PEER_GROUPS.items():
+        positions = index.positions(groupe, 'Epargne brute', 2019)
+        # Seules les communes du département, placées parmi toutes les communes du fichier
+        assert len(positions) == locales
+        for row in positions.itertuples():
+            commune = base[annee & (base['Code_Commune'] == row.Code_Commune)].iloc[0]
+            mask = annee.copy()
+            for key in keys:
+                mask &= base[key] == commune[key]
+            values = base.loc[mask, 'Montant_par_habitant'].to_numpy()
+            value = commune['Montant_par_habitant']
+
+            # Rang centile moyen (égalités au rang moyen), comme rank(pct=True)
+            expected = ((values < value).sum() + ((values == value).sum() + 1) / 2) / len(values) * 100
+            assert row.Percentile == pytest.approx(expected)
+            assert row.Nb_pairs == len(values)
+            assert row.Mediane == pytest.approx(np.median(values))
+
+
+def test_lookup_and_unknown_keys(national):
+    index = peers.PeerIndex(peers.build_peer_table(national))
+    position = index.lookup('Strate de population', 'Epargne brute', 2019, '97401')
+    assert position is not None and 0 < position['Percentile'] <= 100
+    assert index.lookup('Strate de population', 'Epargne brute', 2019, '00000') is None
+    assert index.positions('Strate de population', 'Agrégat inconnu', 2019).empty
+    assert index.exercices('Agrégat inconnu') == []
+    assert index.exercices('Epargne brute') == [2017, 2018, 2019]
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+import rankings
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    n = 400
+    # Valeurs entières peu nombreuses : beaucoup d'égalités
+    return pd.DataFrame({
+        'Commune': [f"C{i}" for i in range(n)],
+        'Agregat': rng.choice(['Epargne brute', 'Impôts et taxes'], n),
+        'Exercice': rng.choice([2017, 2018, 2019], n),
+        'Montant': np.where(rng.random(n) < 0.1, np.nan, rng.integers(0, 10, n).astype(float)),
+    }, index=rng.permutation(n) * 3)
+
+
+def _expected(frame, ascending, n):
+    return frame.dropna(subset=['Montant']).sort_values('Montant', ascending=ascending, kind='stable').head(n)
+
+
+def test_top_and_bottom_match_stable_sort_with_ties():
+    df = _frame()
+    index = rankings.RankingIndex(df, ['Montant'], group_col='Agregat')
+    subset = df[df['Commune'].str.endswith(('1', '4', '7'))]
+
+    for exercice in (None, 2018):
+        frame = subset[subset['Agregat'] == 'Epargne brute']
+        if exercice is not None:
+            frame = frame[frame['Exercice'] == exercice]
+        for n in (1, 5, 50, None):
+            top = index.order(subset, 'Montant', group='Epargne brute', exercice=exercice, n=n)
+            bottom = index.order(subset, 'Montant', group='Epargne brute', exercice=exercice, ascending=True, n=n)
+            pd.testing.assert_frame_equal(top, _expected(frame, False, n))
+            pd.testing.assert_frame_equal(bottom, _expected(frame, True, n))
+
+
+def test_unknown_key_or_empty_frame_gives_empty_result():
+    df = _frame()
+    index = rankings.RankingIndex(df, ['Montant'])
+    assert index.top(df, 'Population', 5).empty
+    assert index.bottom(df.iloc[0:0], 'Montant', 5).empty
+    assert index.top(df, 'Montant', 5, exercice=1990).empty
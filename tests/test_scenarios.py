@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+import scenarios
+
+
+def _reference_schedule(taux, duree, horizon):
+    # Échéancier année par année d'un emprunt de 1 € à annuités constantes, mobilisé en année 1
+    annuite = taux / (1 - (1 + taux) ** -duree) if taux > 0 else 1 / duree
+    encours, interets, annuites = np.zeros(horizon + 1), np.zeros(horizon + 1), np.zeros(horizon + 1)
+    restant = 1.0
+    for annee in range(1, horizon + 1):
+        interets[annee] = restant * taux
+        if annee <= duree:
+            annuites[annee] = annuite
+            restant = max(restant * (1 + taux) - annuite, 0.0)
+        encours[annee] = restant
+    return encours, interets, annuites
+
+
+def test_loan_schedule_matches_year_by_year_loop():
+    taux, duree, horizon = [0.0, 0.02, 0.05], [10, 15, 20], 15
+    encours, interets, annuites = scenarios.loan_schedule(taux, duree, horizon)
+    for i, (t, d) in enumerate(zip(taux, duree)):
+        expected = _reference_schedule(t, d, horizon)
+        np.testing.assert_allclose(encours[i], expected[0], atol=1e-12)
+        np.testing.assert_allclose(interets[i], expected[1], atol=1e-12)
+        np.testing.assert_allclose(annuites[i], expected[2], atol=1e-12)
+
+
+def test_loan_schedule_repays_capital():
+    encours, interets, annuites = scenarios.loan_schedule([0.03], [10], horizon=12)
+    assert encours[0, 0] == 0 and encours[0, 10] == 0
+    # Annuités = capital + intérêts
+    np.testing.assert_allclose(annuites.sum(), 1 + interets.sum())
+
+
+def test_simulation_without_loan_keeps_existing_debt_trajectory():
+    panel = pd.DataFrame({'Commune': ['A', 'B'], 'Exercice': [2019, 2019], 'Encours': [1000.0, 500.0],
+                          'Epargne_brute': [100.0, 50.0], 'Annuite': [120.0, np.nan], 'Population': [10, 5]})
+    base = scenarios.ScenarioBase(panel, horizon=5)
+    simulation = base.simulate([0.0, 100.0], 0.02, 10)
+    np.testing.assert_allclose(simulation.encours[:, 0, :], base.encours_existant)
+    np.testing.assert_allclose(simulation.emprunt[:, 1], [1000.0, 500.0])
+    assert (simulation.encours[:, 1, 1:] > simulation.encours[:, 0, 1:]).all()
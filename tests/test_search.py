@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+import search
+
+
+def _brute_force(names, codes, query):
+    # Nom, un mot du nom ou code commençant par la requête, en ordre alphabétique sans accents
+    prefix = search.normalize(query)
+    found = []
+    for name, code in zip(names, codes):
+        words = search.normalize(name).split()
+        keys = [' '.join(words[start:]) for start in range(len(words))] + [search.normalize(search.code_key(code))]
+        if any(key.startswith(prefix) for key in keys):
+            found.append(name)
+    return sorted(found, key=search.normalize)
+
+
+@pytest.fixture(scope='module')
+def index(communes):
+    return search.SearchIndex(communes, 'Commune', 'Code_Commune')
+
+
+def test_normalize_folds_accents_case_and_punctuation():
+    assert search.normalize("L'Étang-Salé") == 'l etang sale'
+    assert search.normalize("  SAINT-PIERRE ") == 'saint pierre'
+    assert search.code_key(97411.0) == search.code_key('97411') == '97411'
+
+
+@pytest.mark.parametrize('query', ['saint', 'SAINT-', 'denis', 'etang', 'Étang Salé', 'l e', '974', '97411',
+                                   'pierre', 'zzz', 's'])
+def test_search_matches_brute_force(communes, index, query):
+    entities = communes.drop_duplicates('Commune')
+    expected = _brute_force(entities['Commune'], entities['Code_Commune'], query)
+    assert index.search(query, limit=1_000) == expected
+    assert index.search(query, limit=3) == expected[:3]
+
+
+def test_empty_query_lists_first_entities(communes, index):
+    assert len(index) == communes['Commune'].nunique()
+    assert index.search('') == sorted(communes['Commune'].unique(), key=search.normalize)[:search.MAX_RESULTS]
+
+
+def test_index_without_codes():
+    index = search.SearchIndex(pd.DataFrame({'Nom_EPCI': ['CA Sud', 'CA Nord', None, 'CA Sud']}), 'Nom_EPCI', 'Code')
+    assert index.search('ca') == ['CA Nord', 'CA Sud']
+    assert index.search('sud') == ['CA Sud']
@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import analyses
+import dataset_store
+import sections
+
+
+@pytest.mark.parametrize('value, workers', [(None, None), ('0', None), ('-2', None), ('quatre', None), ('3', 3)])
+def test_executor_from_env(monkeypatch, value, workers):
+    if value is None:
+        monkeypatch.delenv(sections.WORKERS_ENV_VAR, raising=False)
+    else:
+        monkeypatch.setenv(sections.WORKERS_ENV_VAR, value)
+    executor = sections.executor_from_env()
+    if workers is None:
+        assert executor is None
+    else:
+        assert isinstance(executor, ThreadPoolExecutor) and executor._max_workers == workers
+        executor.shutdown()
+
+
+def _assert_same(got, expected):
+    if isinstance(expected, dict):
+        assert got.keys() == expected.keys()
+        for key in expected:
+            _assert_same(got[key], expected[key])
+    elif isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(got, expected)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(got, expected)
+    else:
+        assert got == expected
+
+
+def _context(communes):
+    dataset = dataset_store.Dataset(communes, 'v1')
+    filters = dict(epci=[], communes=[], budget_types=[], agregats=[])
+    filtered_df = analyses.apply_filters(communes, **filters)
+    return sections.SectionContext(dataset, filters, filtered_df, analyses.budget_principal(filtered_df),
+                                   dataset.derived('cube'))
+
+
+def test_parallel_sections_match_sequential(communes):
+    ctx = _context(communes)
+    sequential = sections.SectionResults(ctx)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        parallel = sections.SectionResults(ctx, executor)
+        for name in sections.SECTIONS:
+            _assert_same(parallel[name], sequential[name])
+
+
+def test_section_error_is_raised_when_read(communes):
+    threads = set()
+
+    def failing(ctx):
+        threads.add(threading.current_thread().name)
+        raise ValueError("section cassée")
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='essai') as executor:
+        results = sections.SectionResults(_context(communes), executor, sections={'ko': failing})
+        with pytest.raises(ValueError):
+            results['ko']
+    assert all(name.startswith('essai') for name in threads)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ofgl_data
+import similarity
+import synthetic_data
+
+
+@pytest.fixture(scope='module')
+def index():
+    national = ofgl_data.clean_dataset(synthetic_data.generate(30), departement=None)
+    return similarity.SimilarityIndex(similarity.build_feature_table(national))
+
+
+def _brute_force(index, code, k, departement=None):
+    # Distances euclidiennes de tous les profils normalisés, tri complet
+    values = index.table[index.features].to_numpy(dtype=float)
+    median = np.nanmedian(values, axis=0)
+    spread = np.nanpercentile(values, 75, axis=0) - np.nanpercentile(values, 25, axis=0)
+    spread = np.where(spread > 0, spread, 1.0)
+    matrix = np.nan_to_num((values - median) / spread)
+
+    position = index.table.index[index.table['Code_Commune'] == code][0]
+    distances = pd.Series(np.sqrt(((matrix - matrix[position]) ** 2).sum(axis=1)), index=index.table.index)
+    candidates = distances.drop(position)
+    if departement is not None:
+        candidates = candidates[index.table.loc[candidates.index, 'Code_Departement'] == departement]
+    return candidates.sort_values(kind='stable').head(k)
+
+
+@pytest.mark.parametrize('departement', [None, '974', '2A'])
+def test_neighbours_match_brute_force(index, departement):
+    for code in index.table['Code_Commune'].iloc[::7]:
+        expected = _brute_force(index, code, 10, departement)
+        got = index.neighbours(code, 10, departement=departement)
+        np.testing.assert_allclose(got['Distance'], expected.to_numpy(), atol=1e-9)
+        assert got['Code_Commune'].tolist() == index.table.loc[expected.index, 'Code_Commune'].tolist()
+
+
+def test_feature_table_keeps_last_exercice_per_commune(index):
+    assert index.table['Code_Commune'].is_unique
+    assert (index.table['Exercice'] == max(synthetic_data.EXERCICES)).all()
+
+
+def test_unknown_commune_and_small_departement(index):
+    assert index.neighbours('00000').empty
+    assert '00000' not in index and index.profile('00000') is None
+    code = index.table.loc[index.table['Code_Departement'] == '974', 'Code_Commune'].iloc[0]
+    locales = (index.table['Code_Departement'] == '974').sum()
+    assert len(index.neighbours(code, 1_000, departement='974')) == locales - 1
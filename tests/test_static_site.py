@@ -0,0 +1,40 @@
+import os
+import re
+
+import static_site
+import synthetic_data
+
+
+def _build(tmp_path):
+    source = tmp_path / 'ofgl.csv'
+    synthetic_data.write(str(source), communes_par_departement=2, exercices=[2018, 2019])
+    output = tmp_path / 'site'
+    return static_site.build_site(str(source), str(output)), output
+
+
+def test_build_site_writes_every_page(tmp_path):
+    stats, output = _build(tmp_path)
+
+    # Une page par EPCI et par commune, plus la vue par défaut
+    assert stats['communes'] > 0 and stats['epci'] > 0
+    assert stats['pages'] == 1 + stats['epci'] + stats['communes']
+    assert len(os.listdir(output / 'communes')) == stats['communes']
+    assert len(os.listdir(output / 'epci')) == stats['epci']
+    assert (output / static_site.PLOTLY_JS).exists()
+    # Toutes les fiches ont leurs index dérivés
+    assert set(static_site.SITE_BUILDERS) >= set(static_site.fiches.FICHE_BUILDERS)
+
+
+def test_site_links_resolve_and_pages_are_reproducible(tmp_path):
+    _, output = _build(tmp_path)
+    pages = {path: path.read_bytes() for path in output.rglob('*.html')}
+
+    for path, content in pages.items():
+        for href in re.findall(r'href="([^"#]+\.html)"', content.decode('utf-8')):
+            assert (path.parent / href).resolve().exists(), (path, href)
+        # plotly.js chargé depuis le fichier partagé du site, jamais embarqué
+        assert len(content) < 1_000_000
+
+    # Régénération à l'identique (identifiants de graphiques stables)
+    static_site.build_site(str(tmp_path / 'ofgl.csv'), str(output))
+    assert all(path.read_bytes() == content for path, content in pages.items())
@@ -0,0 +1,38 @@
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+import tables
+
+
+def _app():
+    import pandas as pd
+
+    import tables
+
+    df = pd.DataFrame({'Commune': [f"C{i:02d}" for i in range(60)], 'Montant': [float(i % 7) for i in range(60)]})
+    tables.paged_table(df, key='essai', formatters={'Montant': lambda x: f"{x:.1f} €"},
+                       column_names={'Montant': 'Montant (€)'}, sort_by='Montant')
+
+
+def test_format_page_formats_and_renames_only_the_page():
+    page = pd.DataFrame({'Montant': [1.0, 2.5], 'Autre': [1, 2]})
+    formatted = tables._format_page(page, {'Montant': lambda x: f"{x:.1f}", 'Absente': str}, {'Montant': 'M'})
+    assert formatted['M'].tolist() == ['1.0', '2.5']
+    assert page['Montant'].tolist() == [1.0, 2.5]
+
+
+def test_paged_table_sorts_raw_values_then_pages():
+    at = AppTest.from_function(_app).run()
+    expected = pd.DataFrame({'Commune': [f"C{i:02d}" for i in range(60)], 'Montant': [float(i % 7) for i in range(60)]})
+    expected = expected.sort_values('Montant', ascending=False, kind='stable')
+
+    page = at.dataframe[0].value
+    assert len(page) == tables.PAGE_SIZES[0]
+    assert page['Commune'].tolist() == expected['Commune'].tolist()[:25]
+    assert page['Montant (€)'].iloc[0] == "6.0 €"
+
+    # Dernière page : les 10 lignes restantes
+    at.number_input[0].set_value(3).run()
+    page = at.dataframe[0].value
+    assert page['Commune'].tolist() == expected['Commune'].tolist()[50:]
+    assert at.caption[0].value == "Lignes 51 à 60 sur 60"